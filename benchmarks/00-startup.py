@@ -0,0 +1,61 @@
+# Benchmarks for startup/00-startup.py. Not loaded at startup: from the
+# profile (their startup files must be loaded), run
+#   %run -i benchmarks/00-startup.py
+#   test_tiled_inserter()
+
+import random
+import time
+
+
+class TiledStandIn:
+    """
+    Local stand-in for a Tiled writing client, to exercise TiledInserter
+    without a server. Each post sleeps for latency (s) and fails with
+    probability failure_rate.
+    """
+
+    def __init__(self, latency=0.0, failure_rate=0.0, seed=None):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.documents = []
+        self._uids = set()
+        self._random = random.Random(seed)
+
+    def post_document(self, name, doc):
+        if self.latency > 0:
+            time.sleep(self.latency)
+        if self._random.random() < self.failure_rate:
+            raise ConnectionError("TiledStandIn: injected failure")
+        uid = doc.get('uid')
+        if uid is not None:
+            if uid in self._uids:
+                raise ValueError("TiledStandIn: document {} already exists".format(uid))
+            self._uids.add(uid)
+        self.documents.append((name, doc))
+
+
+def test_tiled_inserter(num_docs=1000, latency=0.005, failure_rate=0.1, seed=0, spool_directory=None):
+    """Push a fake run of num_docs events through a TiledInserter backed by a
+    TiledStandIn and report the time spent in insert() vs. delivery."""
+    server = TiledStandIn(latency=latency, failure_rate=failure_rate, seed=seed)
+    spool = DocumentSpool(directory=spool_directory) if spool_directory is not None else None
+    inserter = TiledInserter(client=server, spool=spool, backoff_base=0.01, backoff_max=0.1, verbosity=1)
+
+    t0 = time.monotonic()
+    inserter.insert('start', {'uid': 'test-run', 'time': time.time()})
+    inserter.insert('descriptor', {'uid': 'test-desc', 'run_start': 'test-run'})
+    for i in range(num_docs):
+        inserter.insert('event', {'descriptor': 'test-desc', 'seq_num': i + 1})
+    inserter.insert('stop', {'uid': 'test-stop', 'run_start': 'test-run'})
+    t_insert = time.monotonic() - t0
+    stats = inserter.stats()
+    inserter.flush()
+    t_total = time.monotonic() - t0
+    inserter.close()
+
+    seq = [doc['seq_num'] for name, doc in server.documents if name == 'event']
+    print("insert(): {:.3f} ms/doc; delivered {}/{} docs in {:.2f} s (in order: {})".format(
+        1e3 * t_insert / num_docs, len(seq), num_docs, t_total, seq == sorted(seq)))
+    print("queue depth after inserting {}, oldest pending {:.2f} s, errors {}".format(
+        stats['queue_depth'], stats['oldest_pending_age'], inserter.counters['errors']))
+    return inserter
@@ -0,0 +1,113 @@
+# Benchmarks for startup/02-tiled-writer.py. Not loaded at startup: from the
+# profile (their startup files must be loaded), run
+#   %run -i benchmarks/02-tiled-writer.py
+#   benchmark_tiled_patches(load_document_stream(uid))
+
+import copy
+import time
+import uuid
+
+import numpy
+from bluesky.callbacks.buffer import BufferingWrapper
+from bluesky_tiled_plugins import TiledWriter
+
+
+def patch_descriptor_reference(doc):
+    '''Uncached descriptor patch, kept to check and benchmark patch_descriptor against.'''
+    for desc in doc['data_keys'].values():
+        if len(desc["shape"]) < 3:
+            desc["shape"] = [1]*(3-len(desc["shape"])) + desc["shape"]
+
+    if 'pilatus800_image' in doc['data_keys']:
+        desc = doc['data_keys']['pilatus800_image']
+        desc.setdefault("dtype_str", "<i4")
+        shape = desc['shape']
+        if shape[-1] == 0:
+            shape[-1] = 1
+            desc['shape'] = shape[::-1]
+
+    # Ensure dtype_str has the proper numpy format (to pass the EventModel validator)
+    for key, val in doc["data_keys"].items():
+        if "dtype_str" in val:
+            val["dtype_str"] = numpy.dtype(val["dtype_str"]).str
+        val["shape"] = tuple(map(lambda x: max(x, 0), val.get("shape", [])))
+
+    return doc
+
+
+##### Micro-benchmark of the TiledWriter pipeline #####
+
+def load_document_stream(uid):
+    '''Recorded (name, doc) stream of a run, e.g. a long series_measure or a fly scan.'''
+    return [(name, copy.deepcopy(doc)) for name, doc in db[uid].documents()]
+
+
+def _renamed_document_stream(documents):
+    '''Copy of a document stream with fresh uids (so that it can be written
+    again), keeping every cross-reference (and datum_id) consistent.'''
+    mapping = {doc['uid']: str(uuid.uuid4()) for name, doc in documents if 'uid' in doc}
+
+    def rename(obj):
+        if isinstance(obj, dict):
+            return {key: rename(val) for key, val in obj.items()}
+        if isinstance(obj, list):
+            return [rename(val) for val in obj]
+        if isinstance(obj, str):
+            if obj in mapping:
+                return mapping[obj]
+            head, sep, tail = obj.partition('/')
+            if sep and head in mapping:
+                return mapping[head] + sep + tail
+        return obj
+
+    return [(name, rename(doc)) for name, doc in documents]
+
+
+def benchmark_tiled_patches(documents, client=None, repeat=5, verbosity=3):
+    '''
+    Replay a recorded document stream (see load_document_stream) and report
+    docs/s with the uncached (patch_descriptor_reference) and cached
+    (patch_descriptor) descriptor patch.
+
+    Without a client only the patch stage is timed. With a client (use a
+    scratch container!) the stream is pushed through BufferingWrapper(TiledWriter)
+    with fresh uids, once per mode.
+    '''
+    results = {}
+    modes = {'uncached': patch_descriptor_reference, 'cached': patch_descriptor}
+    patchers = {'resource': patch_resource}
+
+    for mode, descriptor_patch in modes.items():
+        patchers['descriptor'] = descriptor_patch
+        _normalized_data_keys.cache_clear()
+        _patched_resource_path.cache_clear()
+
+        if client is None:
+            streams = [copy.deepcopy(documents) for _ in range(repeat)]
+            t0 = time.perf_counter()
+            for stream in streams:
+                for name, doc in stream:
+                    if name in patchers:
+                        patchers[name](doc)
+            elapsed = time.perf_counter() - t0
+            num_docs = repeat*len(documents)
+        else:
+            stream = _renamed_document_stream(documents)
+            writer = BufferingWrapper(TiledWriter(client=client,
+                                                  patches=dict(patchers),
+                                                  spec_to_mimetype=MIMETYPE_LOOKUP,
+                                                  batch_size=10000))
+            t0 = time.perf_counter()
+            for name, doc in stream:
+                writer(name, doc)
+            writer.shutdown(wait=True)
+            elapsed = time.perf_counter() - t0
+            num_docs = len(stream)
+
+        results[mode] = num_docs/elapsed
+        if verbosity >= 3:
+            print("{:10s} {:10.0f} docs/s ({} docs in {:.3f} s)".format(mode, results[mode], num_docs, elapsed))
+
+    if verbosity >= 3:
+        print("{:10s} {:10.2f}x".format('speedup', results['cached']/results['uncached']))
+    return results
@@ -0,0 +1,65 @@
+# Benchmarks for startup/05-connection-utilities.py. Not loaded at startup: from the
+# profile (their startup files must be loaded), run
+#   %run -i benchmarks/05-connection-utilities.py
+#   benchmark_connect_devices()
+
+import subprocess
+import sys
+import time
+
+
+##### Benchmark against a simulated IOC #####
+
+_BENCH_IOC_SCRIPT = """
+import sys
+from caproto import ChannelDouble
+from caproto.server import run
+prefix, num = sys.argv[1], int(sys.argv[2])
+run({'{}{}'.format(prefix, i): ChannelDouble(value=float(i)) for i in range(num)}, interfaces=['127.0.0.1'])
+"""
+
+
+def benchmark_connect_devices(num_pvs=200, dead_fraction=0.1, connection_timeout=2.0, serial=True,
+                              prefix='XF:11BM-BENCH{Sim}:PV'):
+    """
+    Compare serial and concurrent connection of num_pvs signals, of which a
+    fraction dead_fraction has no server. A caproto IOC serving the live PVs
+    is started on localhost for the duration of the benchmark.
+    """
+    from ophyd import EpicsSignalRO
+
+    num_live = int(round(num_pvs * (1 - dead_fraction)))
+    ioc = subprocess.Popen([sys.executable, '-c', _BENCH_IOC_SCRIPT, prefix, str(num_live)])
+    try:
+        time.sleep(2)  # let the IOC come up
+
+        results = {}
+        if serial:
+            signals = [EpicsSignalRO('{}{}'.format(prefix, i), name='bench_serial_{}'.format(i))
+                       for i in range(num_pvs)]
+            t0 = time.time()
+            for sig in signals:
+                try:
+                    sig.wait_for_connection(timeout=connection_timeout)
+                except TimeoutError:
+                    pass
+            results['serial'] = time.time() - t0
+            for sig in signals:
+                sig.destroy()
+
+        signals = [EpicsSignalRO('{}{}'.format(prefix, i), name='bench_bulk_{}'.format(i))
+                   for i in range(num_pvs)]
+        report = connect_devices(signals, timeout=connection_timeout, verbosity=0)
+        results['concurrent'] = report['elapsed']
+        results['disconnected'] = sum(len(sigs) for sigs in report['disconnected'].values())
+        for sig in signals:
+            sig.destroy()
+    finally:
+        ioc.terminate()
+        ioc.wait()
+
+    print("{} PVs ({} dead), connection timeout {} s".format(num_pvs, num_pvs - num_live, connection_timeout))
+    if serial:
+        print("  serial:     {:.2f} s".format(results['serial']))
+    print("  concurrent: {:.2f} s ({} disconnected)".format(results['concurrent'], results['disconnected']))
+    return results
@@ -0,0 +1,117 @@
+# Benchmarks for startup/23-detector-exposure.py. Not loaded at startup: from the
+# profile (their startup files must be loaded), run
+#   %run -i benchmarks/23-detector-exposure.py
+#   benchmark_exposure_setter()
+
+import subprocess
+import sys
+import time
+
+from ophyd import Device, Component as Cpt
+from ophyd.areadetector.base import EpicsSignalWithRBV
+
+
+##### Benchmark against simulated area detector IOCs #####
+
+_BENCH_AD_IOC_SCRIPT = """
+import asyncio
+import sys
+from caproto import ChannelDouble, ChannelInteger
+from caproto.server import run
+
+prefix, num, delay = sys.argv[1], int(sys.argv[2]), float(sys.argv[3])
+
+
+def with_rbv(channel_class):
+    class Setpoint(channel_class):
+        # Like the camserver, the readback only updates some time after the write
+        async def verify_value(self, value):
+            async def update():
+                await asyncio.sleep(delay)
+                await self.rbv.write(value)
+            asyncio.get_event_loop().create_task(update())
+            return value
+    return Setpoint
+
+
+pvdb = {}
+for i in range(num):
+    for field, channel_class, value in [('AcquireTime', ChannelDouble, 1.0),
+                                        ('AcquirePeriod', ChannelDouble, 1.1),
+                                        ('NumImages', ChannelInteger, 1)]:
+        name = '{}{}}}:cam1:{}'.format(prefix, i, field)
+        rbv = channel_class(value=value)
+        setpoint = with_rbv(channel_class)(value=value)
+        setpoint.rbv = rbv
+        pvdb[name] = setpoint
+        pvdb[name + '_RBV'] = rbv
+run(pvdb, interfaces=['127.0.0.1'])
+"""
+
+
+class _BenchCam(Device):
+    acquire_time = Cpt(EpicsSignalWithRBV, 'AcquireTime')
+    acquire_period = Cpt(EpicsSignalWithRBV, 'AcquirePeriod')
+    num_images = Cpt(EpicsSignalWithRBV, 'NumImages')
+
+
+class _BenchAreaDetector(Device):
+    cam = Cpt(_BenchCam, 'cam1:')
+
+
+def _set_exposure_polling(detector, exposure_time):
+    # What Pilatus2MV33.setExposureTime did: set, then poll every 0.1 s
+    detector.cam.acquire_time.set(exposure_time).wait()
+    while detector.cam.acquire_time.get() != exposure_time:
+        time.sleep(0.1)
+
+
+def benchmark_exposure_setter(num_detectors=3, num_exposures=10, ioc_delay=0.05,
+                              prefix='XF:11BM-BENCH{Det:Sim'):
+    """
+    Time per exposure to apply the exposure time to num_detectors simulated
+    area detectors (whose readbacks update ioc_delay s after a write), one
+    after the other with polling as before, and with exposure_setter.
+    Exposure times alternate between two values (every exposure is a change),
+    then stay constant (nothing to write).
+    """
+    ioc = subprocess.Popen([sys.executable, '-c', _BENCH_AD_IOC_SCRIPT, prefix, str(num_detectors), str(ioc_delay)])
+    try:
+        time.sleep(2)  # let the IOC come up
+        detectors = [_BenchAreaDetector('{}{}}}:'.format(prefix, i), name='bench_det{}'.format(i))
+                     for i in range(num_detectors)]
+        for detector in detectors:
+            detector.wait_for_connection(timeout=10)
+
+        setter = DetectorExposureSetter()
+        times = [0.5 + 0.25 * (i % 2) for i in range(num_exposures)]
+        results = {}
+
+        t0 = time.time()
+        for exposure_time in times:
+            for detector in detectors:
+                _set_exposure_polling(detector, exposure_time)
+        results['polling'] = (time.time() - t0) / num_exposures
+
+        t0 = time.time()
+        for exposure_time in times:
+            setter.set(detectors, acquire_time=exposure_time + 0.1, verbosity=0)
+        results['parallel'] = (time.time() - t0) / num_exposures
+
+        t0 = time.time()
+        for exposure_time in times:
+            setter.set(detectors, acquire_time=times[-1] + 0.1, verbosity=0)
+        results['unchanged'] = (time.time() - t0) / num_exposures
+
+        for detector in detectors:
+            detector.destroy()
+    finally:
+        ioc.terminate()
+        ioc.wait()
+
+    print("{} detectors, readback delay {} s, {} exposures".format(num_detectors, ioc_delay, num_exposures))
+    print("  per exposure, one detector after the other with polling: {:.3f} s".format(results['polling']))
+    print("  per exposure, exposure_setter:                           {:.3f} s".format(results['parallel']))
+    print("  per exposure, exposure_setter, value already set:        {:.3f} s".format(results['unchanged']))
+    print("  saved per exposure: {:.3f} s".format(results['polling'] - results['parallel']))
+    return results
@@ -0,0 +1,208 @@
+# Benchmarks for startup/91-fit_scan.py. Not loaded at startup: from the
+# profile (their startup files must be loaded), run
+#   %run -i benchmarks/91-fit_scan.py
+#   benchmark_fit_worker()
+#   benchmark_adaptive_scan()
+#   benchmark_fly_accumulator()
+
+import time
+
+import matplotlib.pyplot as plt
+import numpy as np
+from bluesky.plans import scan
+
+
+def benchmark_fit_worker(num=41, fit_interval=0.2, point_time=0.05, model="sigmoid_r", plot=True):
+    """
+    Dead time per point of the fit_scan fit callbacks (time spent in the
+    event callback instead of measuring), for a synthetic num-point edge scan
+    with point_time s of exposure per point: fitting after every point (as
+    before) vs. with a FitWorker. Both final fits (at stop) should agree.
+    """
+    import uuid
+
+    rng = np.random.default_rng(0)
+    x = np.linspace(-1.0, 1.0, num)
+    y = rng.poisson(1000.0 / (1 + np.exp((x - 0.1) / 0.05)) + 20.0).astype(float)
+    results = {}
+
+    for mode, interval in (("every point", None), ("worker", fit_interval)):
+        livefit = LiveFit_Custom(model, "det", {"x": "motor"}, scan_range=[-1.0, 1.0], fit_interval=interval)
+        if plot:
+            fig, ax = plt.subplots()
+            callback = LiveFitPlot_Custom(livefit, ax=ax, scan_range=[-1.0, 1.0])
+        else:
+            callback = livefit
+
+        run_uid, descriptor = str(uuid.uuid4()), str(uuid.uuid4())
+        callback("start", {"uid": run_uid, "time": time.time(), "scan_id": 0})
+        callback("descriptor", {"uid": descriptor, "run_start": run_uid, "name": "primary", "time": time.time(),
+                                "data_keys": {"motor": {"dtype": "number", "shape": [], "source": "sim"},
+                                              "det": {"dtype": "number", "shape": [], "source": "sim"}}})
+        dead_times = []
+        for i in range(num):
+            time.sleep(point_time)  # exposure
+            t0 = time.time()
+            callback("event", {"uid": str(uuid.uuid4()), "descriptor": descriptor, "seq_num": i + 1,
+                               "time": time.time(), "data": {"motor": x[i], "det": y[i]},
+                               "timestamps": {"motor": t0, "det": t0}})
+            dead_times.append(time.time() - t0)
+        t0 = time.time()
+        callback("stop", {"uid": str(uuid.uuid4()), "run_start": run_uid, "time": time.time(),
+                          "exit_status": "success"})
+        stop_time = time.time() - t0
+        if plot:
+            plt.close(fig)
+
+        results[mode] = {
+            "mean": np.mean(dead_times),
+            "max": np.max(dead_times),
+            "stop": stop_time,
+            "x0": livefit.result.values["x0"],
+            "fits": livefit.fit_worker.stats["fits"] if livefit.fit_worker is not None else num,
+        }
+
+    print("{} points, {} s per point, model {}, fit_interval {} s{}".format(
+        num, point_time, model, fit_interval, ", with plot" if plot else ""))
+    for mode, result in results.items():
+        print("  {:12s} dead time per point: mean {:.4f} s, max {:.4f} s; stop (final fit) {:.4f} s; "
+              "{} fits; x0 = {:.5f}".format(mode, result["mean"], result["max"], result["stop"], result["fits"],
+                                           result["x0"]))
+    return results
+
+
+def benchmark_adaptive_scan(span=0.6, edge=0.03, width=0.01, counts=20000, num_even=(11, 21, 41), num_coarse=7,
+                            x0_tolerance=0.0002, repeat=10):
+    """
+    Points needed, and error on x0, to locate a simulated (decreasing) edge
+    at edge, of the given width, with Poisson noise on counts: evenly spaced
+    scans of num_even points vs. adaptive_fit_plan starting from num_coarse
+    points. Runs a local RunEngine on ophyd.sim devices (nothing is saved).
+    """
+    from bluesky import RunEngine
+    from ophyd.sim import SynAxis, SynSignal
+
+    run_engine = RunEngine({})
+    rng = np.random.default_rng(0)
+    motor = SynAxis(name="bench_motor")
+    det = SynSignal(func=lambda: rng.poisson(counts / (1 + np.exp((motor.readback.get() - edge) / width))),
+                    name="bench_det")
+    start, stop = -span / 2.0, span / 2.0
+
+    def run(plan, livefit):
+        with np.errstate(all="ignore"):
+            run_engine(plan, [livefit])
+        return abs(livefit.result.values["x0"] - edge), len(livefit.ydata)
+
+    results = {}
+    for num in num_even:
+        livefit = LiveFit_Custom("sigmoid_r", det.name, {"x": motor.name}, scan_range=[start, stop])
+        errors = [run(scan([det], motor, start, stop, num), livefit)[0] for _ in range(repeat)]
+        results["even {}".format(num)] = (num, np.mean(errors))
+
+    livefit = LiveFit_Custom("sigmoid_r", det.name, {"x": motor.name}, scan_range=[start, stop])
+    errors, points = [], []
+    for _ in range(repeat):
+        error, n = run(adaptive_fit_plan([det], motor, start, stop, livefit, num=num_coarse,
+                                         x0_tolerance=x0_tolerance), livefit)
+        errors.append(error)
+        points.append(n)
+    results["adaptive {}".format(num_coarse)] = (np.mean(points), np.mean(errors))
+
+    print("edge at {}, width {}, span {}, {} counts, {} repeats".format(edge, width, span, counts, repeat))
+    for name, (n, error) in results.items():
+        print("  {:12s} {:5.1f} points, |x0 error| {:.5f}".format(name, n, error))
+    return results
+
+
+##### Benchmark with synthetic monitor streams #####
+
+def _flyscan_lists(updates, num, exp_time):
+    # What flyscan did: append to lists from the callbacks, then align and trim in Python
+    t0 = time.time()
+    frame_mtr_pos, frame_roi_ts, total_ts, total = [], {2: [], 3: [], 4: []}, {2: [], 3: [], 4: []}, {2: [], 3: [], 4: []}
+    for name, value, timestamp, position in updates:
+        if name == "frame":
+            frame_mtr_pos.append(position)
+        elif name.endswith("_total"):
+            total_ts[int(name[3])].append(timestamp)
+            total[int(name[3])].append(value)
+        else:
+            frame_roi_ts[int(name[3])].append(timestamp)
+    t1 = time.time()
+
+    def trim_list(v, num):
+        n_first = max(len(v) - num, 0)
+        return v[n_first:]
+
+    def set_total_values(frame_roi_ts, total_ts, total, dt=0.25 * exp_time):
+        total_ts = [_ - dt for _ in total_ts]
+        vals = [0] * len(frame_roi_ts)
+        n_current, v_current = 0, 0
+        for n in range(len(vals)):
+            if n_current < len(total_ts) and total_ts[n_current] < frame_roi_ts[n]:
+                v_current = total[n_current]
+                n_current += 1
+            vals[n] = v_current
+        return vals
+
+    _ = frame_mtr_pos
+    frame_mtr_pos = [_[0]] + [(_[n] + _[n - 1]) / 2 for n in range(1, len(_))]
+    totals = [set_total_values(frame_roi_ts[roi], total_ts[roi], total[roi]) for roi in (2, 3, 4)]
+    output = [trim_list(frame_mtr_pos, num - 1)] + [trim_list(t, num - 1) for t in totals]
+    return output, t1 - t0, time.time() - t1
+
+
+def _flyscan_accumulator(updates, num, exp_time):
+    t0 = time.time()
+    accumulator = FlyAccumulator(capacity=2 * num + 100)
+    position = [0.0]
+    accumulator.watch("frame", None, extra=lambda: position[0])
+    callbacks = {"frame": accumulator.callback("frame")}
+    for roi in (2, 3, 4):
+        for name in ("roi{}".format(roi), "roi{}_total".format(roi)):
+            accumulator.watch(name, None)
+            callbacks[name] = accumulator.callback(name)
+    for name, value, timestamp, pos in updates:
+        position[0] = pos
+        callbacks[name](value=value, timestamp=timestamp)
+    t1 = time.time()
+    frame_mtr_pos = FlyAccumulator.last(FlyAccumulator.midpoints(accumulator.extra("frame")), num - 1)
+    output = [frame_mtr_pos] + [FlyAccumulator.last(accumulator.roi_totals(roi, dt=0.25 * exp_time), num - 1)
+                                for roi in (2, 3, 4)]
+    return output, t1 - t0, time.time() - t1
+
+
+def benchmark_fly_accumulator(num_frames=10000, exp_time=0.1, repeat=3):
+    """
+    Time to accumulate (in the monitor callbacks, spread over the scan) and
+    to post-process (after the scan: dead time) the monitor updates of a
+    synthetic num_frames fly scan (frame counter with the motor position, and
+    the frame counter and total of ROIs 2-4, each frame), with Python lists as
+    flyscan did vs. FlyAccumulator.
+    """
+    rng = np.random.default_rng(0)
+    updates = [("frame", 0, -1.0, 0.0)]  # monitors also report their current value when subscribed
+    for roi in (2, 3, 4):
+        updates += [("roi{}".format(roi), 0, -1.0, 0.0), ("roi{}_total".format(roi), 0.0, -1.0, 0.0)]
+    for i in range(num_frames):
+        t, pos = i * exp_time, i * 0.001
+        updates.append(("frame", i + 1, t + rng.uniform(0, 0.002), pos))
+        for roi in (2, 3, 4):
+            updates.append(("roi{}".format(roi), i + 1, t + 0.01 + rng.uniform(0, 0.002), pos))
+            updates.append(("roi{}_total".format(roi), float(rng.poisson(1000)), t + 0.02 + rng.uniform(0, 0.002), pos))
+
+    results, outputs = {}, {}
+    for label, function in (("lists", _flyscan_lists), ("accumulator", _flyscan_accumulator)):
+        runs = [function(updates, num_frames + 1, exp_time) for _ in range(repeat)]
+        outputs[label] = runs[0][0]
+        results[label] = {"accumulate": min(run[1] for run in runs), "postprocess": min(run[2] for run in runs)}
+
+    for old, new in zip(outputs["lists"], outputs["accumulator"]):
+        assert np.allclose(old, new)
+
+    print("{} frames, {} monitor updates; accumulate (per update) / post-process".format(num_frames, len(updates)))
+    for label, title in (("lists", "Python lists + loop alignment"), ("accumulator", "FlyAccumulator + searchsorted")):
+        print("  {}: {:6.2f} µs / {:8.4f} s".format(title, 1e6 * results[label]["accumulate"] / len(updates),
+                                                   results[label]["postprocess"]))
+    return results
@@ -0,0 +1,41 @@
+# Benchmarks for startup/93-md-snapshot.py. Not loaded at startup: from the
+# profile (their startup files must be loaded), run
+#   %run -i benchmarks/93-md-snapshot.py
+#   benchmark_md_snapshot(sam)
+
+import time
+
+
+def benchmark_md_snapshot(sample, num_exposures=5, verbosity=3):
+    """
+    PV reads and time spent building the metadata of one exposure (what
+    measure_single and expose ask of the sample), without and with the snapshot.
+    """
+    enabled = md_snapshot.enabled
+    results = {}
+    try:
+        for mode in (False, True):
+            md_snapshot.enabled = mode
+            with count_pv_reads() as counts:
+                t0 = time.time()
+                for i in range(num_exposures):
+                    md_snapshot.clear()  # exposures are further apart than the ttl
+                    sample.get_savename()
+                    md_current = sample.get_md()
+                    md_current.update(sample.get_measurement_md())
+                    sample.get_savename()
+                elapsed = time.time() - t0
+            results['snapshot' if mode else 'direct'] = {
+                'time': elapsed / num_exposures,
+                'pv_reads': (counts['caget'] + counts['signal_get']) / num_exposures,
+                'batches': counts['batches'] / num_exposures,
+            }
+    finally:
+        md_snapshot.enabled = enabled
+
+    if verbosity >= 3:
+        print("Metadata for one exposure of '{}' ({} exposures):".format(sample.name, num_exposures))
+        for mode, res in results.items():
+            print("  {:10s} {:6.1f} PV reads ({:.0f} batches) {:8.3f} s".format(
+                mode, res['pv_reads'], res['batches'], res['time']))
+    return results
@@ -0,0 +1,80 @@
+# Benchmarks for startup/93-resource-index.py. Not loaded at startup: from the
+# profile (their startup files must be loaded), run
+#   %run -i benchmarks/93-resource-index.py
+#   benchmark_resource_index()
+
+import os
+import time
+import uuid
+
+
+##### Benchmark with a synthetic run #####
+
+class _SyntheticHeader:
+    """Stands for db[uid]: documents() costs fetch_latency (a Tiled request) each call."""
+
+    def __init__(self, num_frames, fetch_latency=0.005, detector='pilatus800k-1'):
+        self.fetch_latency = fetch_latency
+        run_uid, descriptor, resource = str(uuid.uuid4()), str(uuid.uuid4()), str(uuid.uuid4())
+        self.start = {'uid': run_uid, 'time': time.time(), 'detectors': [detector],
+                      'filename': 'synthetic', 'measure_series_num_frames': num_frames}
+        key = '{}_image'.format(detector.replace('-', '_'))
+        self._documents = [
+            ('start', self.start),
+            ('descriptor', {'uid': descriptor, 'run_start': run_uid, 'name': 'primary',
+                            'data_keys': {key: {'external': 'FILESTORE:', 'shape': [1, 619, 487], 'dtype': 'array'}},
+                            'object_keys': {detector: [key]}}),
+            ('resource', {'uid': resource, 'run_start': run_uid, 'spec': 'AD_TIFF', 'root': '/nsls2/data/cms',
+                          'resource_path': 'legacy/xf11bm/data/2025_3/synthetic',
+                          'resource_kwargs': {'template': '%s%s_%6.6d.tiff', 'filename': 'synthetic',
+                                              'frame_per_point': 1}}),
+        ]
+        for i in range(num_frames):
+            datum_id = '{}/{}'.format(resource, i)
+            self._documents.append(('datum', {'datum_id': datum_id, 'resource': resource,
+                                              'datum_kwargs': {'point_number': i}}))
+            self._documents.append(('event', {'uid': str(uuid.uuid4()), 'descriptor': descriptor, 'seq_num': i + 1,
+                                              'data': {key: datum_id}, 'timestamps': {key: 0}}))
+        self._documents.append(('stop', {'uid': str(uuid.uuid4()), 'run_start': run_uid, 'exit_status': 'success'}))
+
+    def documents(self):
+        time.sleep(self.fetch_latency)
+        yield from self._documents
+
+
+def benchmark_resource_index(num_frames=5000, fetch_latency=0.005):
+    """
+    Time to get the file name of every frame of a synthetic num_frames run,
+    scanning the documents for the resource at every frame (as
+    handlefiles_names did) vs. with a RunFileIndex (first build, then cached).
+    """
+    h = _SyntheticHeader(num_frames, fetch_latency=fetch_latency)
+    broker = {h.start['uid']: h}
+    results = {}
+
+    t0 = time.time()
+    old = []
+    for ii in range(num_frames):
+        for name, doc in h.documents():
+            if name == "resource":
+                rdoc = doc
+                break
+        old.append(rdoc['root'] + '/' + rdoc['resource_path'] + '/' + rdoc['resource_kwargs']['filename'] + '_' + f'{ii:06d}' + '.tiff')
+    results['scan'] = time.time() - t0
+
+    index = RunFileIndex(broker=broker)
+    t0 = time.time()
+    new = index.paths(h.start['uid'], 'waxs')
+    results['index'] = time.time() - t0
+
+    t0 = time.time()
+    index.paths(h.start['uid'], 'waxs')
+    results['cached'] = time.time() - t0
+
+    assert [os.path.normpath(f) for f in old] == [os.path.normpath(f) for f in new]
+
+    print("{} frames, {} documents, {} s per fetch".format(num_frames, len(h._documents), fetch_latency))
+    print("  document scan per frame: {:8.3f} s".format(results['scan']))
+    print("  index (build):           {:8.3f} s".format(results['index']))
+    print("  index (cached):          {:8.3f} s".format(results['cached']))
+    return results
@@ -0,0 +1,121 @@
+# Benchmarks for startup/94-sample.py. Not loaded at startup: from the
+# profile (their startup files must be loaded), run
+#   %run -i benchmarks/94-sample.py
+#   benchmark_expose_plan()
+
+import time
+import uuid
+
+import bluesky.preprocessors as bpp
+import numpy as np
+from bluesky.plans import count
+from ophyd import Component as Cpt, Device
+from ophyd.areadetector.filestore_mixins import FileStoreBase
+from ophyd.sim import SynSignal
+
+
+##### RE per exposure vs one composed plan #####
+
+
+class _SimFilePlugin(FileStoreBase, Device):
+    """Simulated file plugin: a new file name and resource document at each
+    stage(), stage_time per stage/unstage."""
+
+    filestore_spec = "AD_TIFF"
+
+    def __init__(self, *args, stage_time=0.02, **kwargs):
+        super().__init__(*args, write_path_template="/tmp/", root="/", **kwargs)
+        self.stage_time = stage_time
+
+    def stage(self):
+        time.sleep(self.stage_time)
+        super().stage()
+        self._fn = "/tmp/{}".format(uuid.uuid4())
+        self._generate_resource({})
+
+    def unstage(self):
+        time.sleep(self.stage_time)
+        return super().unstage()
+
+
+class _SimAreaDetector(Device):
+    """Simulated detector: exposure_time per trigger, stage_time per stage/unstage
+    of the detector (an area detector spends a noticeable time configuring its
+    cam and plugins), of which file_stage_time for its file plugin."""
+
+    image = Cpt(SynSignal, func=lambda: np.random.random(), kind="hinted")
+    tiff = Cpt(_SimFilePlugin, "TIFF1:")
+
+    def __init__(self, *args, exposure_time=0.1, stage_time=0.2, file_stage_time=0.02, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.image.exposure_time = exposure_time
+        self.tiff.stage_time = file_stage_time
+        self.stage_time = stage_time - file_stage_time
+
+    def stage(self):
+        time.sleep(self.stage_time)
+        return super().stage()
+
+    def unstage(self):
+        time.sleep(self.stage_time)
+        return super().unstage()
+
+    def trigger(self):
+        return self.image.trigger()
+
+    def collect_asset_docs(self):
+        yield from self.tiff.collect_asset_docs()
+
+
+def benchmark_expose_plan(num_samples=20, exposure_time=0.1, stage_time=0.2, file_stage_time=0.02, num_detectors=2,
+                          callbacks=()):
+    """
+    Per-exposure overhead of measuring num_samples samples with simulated
+    detectors, as done by expose() (one RE(count(...)) per sample), by a
+    composed plan of exposure_run() with the detectors staged around each run,
+    and by doSamples_plan() (detectors staged once, only the file plugins
+    restaged per run). Also checks that every run has its own resource
+    documents. A separate RunEngine is used, with optional callbacks subscribed
+    (e.g. a TiledWriter, to include document handling).
+    """
+    from bluesky import RunEngine
+
+    RE_bench = RunEngine({})
+    for cb in callbacks:
+        RE_bench.subscribe(cb)
+    resources = {}
+    RE_bench.subscribe(lambda name, doc: resources.setdefault(doc["run_start"], []).append(doc["uid"]), "resource")
+    detectors = [_SimAreaDetector(name="bench_det{}".format(i), exposure_time=exposure_time, stage_time=stage_time,
+                                  file_stage_time=file_stage_time)
+                 for i in range(num_detectors)]
+
+    def holder_plan():
+        for i in range(num_samples):
+            yield from exposure_run(detectors, md={"sample_name": "bench_{}".format(i)})
+
+    def run(mode):
+        resources.clear()
+        t0 = time.time()
+        if mode == "RE_per_exposure":
+            for i in range(num_samples):
+                RE_bench(count(detectors), sample_name="bench_{}".format(i))
+        elif mode == "staged_per_run":
+            RE_bench(holder_plan())
+        else:
+            RE_bench(bpp.stage_wrapper(holder_plan(), detectors))
+        elapsed = time.time() - t0
+        ok = len(resources) == num_samples and all(len(uids) == num_detectors for uids in resources.values())
+        return elapsed, ok
+
+    results = {}
+    print("{} samples, {} detectors, exposure {} s, stage/unstage {} s (file plugin {} s)".format(
+        num_samples, num_detectors, exposure_time, stage_time, file_stage_time))
+    print("  overhead per exposure:")
+    for mode, label in (("RE_per_exposure", "RE(count) per sample:"),
+                        ("staged_per_run", "composed, staged per run:"),
+                        ("staged_once", "composed, staged once:")):
+        elapsed, ok = run(mode)
+        results[mode] = (elapsed / num_samples) - exposure_time
+        print("    {:27s} {:.3f} s  (total {:.1f} s){}".format(
+            label, results[mode], elapsed, "" if ok else "  ERROR: resources not one set per run"))
+    return results
@@ -0,0 +1,80 @@
+# Benchmarks for startup/95-sample-custom.py. Not loaded at startup: from the
+# profile (their startup files must be loaded), run
+#   %run -i benchmarks/95-sample-custom.py
+#   benchmark_sample_order()
+
+import time
+
+import numpy as np
+
+
+##### Sample ordering benchmark #####
+
+class _WellSample(SampleTSAXS_Generic):
+    """Sample with the yy (smy2) axis that WellPlateHolder.addSampleSlot positions."""
+
+    def _set_axes_definitions(self):
+        super()._set_axes_definitions()
+        self._axes_definitions.append(
+            {"name": "yy", "motor": None, "enabled": True, "scaling": +1.0, "units": "mm", "hint": None}
+        )
+
+
+def _benchmark_layouts(seed=0):
+    """Holders filled as they are at the beamline (nothing moves)."""
+    rng = np.random.default_rng(seed)
+    layouts = {}
+
+    plate = WellPlateHolder(name="bench_wellplate")
+    for row in "ABCDEFGH":
+        for column in range(1, 13):
+            plate.addSampleSlot(_WellSample("bench_{}{}".format(row, column)), "{}{:02d}".format(row, column))
+    layouts["WellPlateHolder, 96 wells"] = plate
+
+    plate = WellPlateHolder(name="bench_wellplate_partial")
+    for well in sorted(rng.choice(96, size=30, replace=False)):
+        slot = "{}{:02d}".format("ABCDEFGH"[well // 12], well % 12 + 1)
+        plate.addSampleSlot(_WellSample("bench_" + slot), slot)
+    layouts["WellPlateHolder, 30 wells"] = plate
+
+    capillaries = CapillaryHolderThreeRows(name="bench_capillaries")
+    for slot in range(1, 46):
+        capillaries.addSampleSlot(SampleTSAXS_Generic("bench_{}".format(slot)), slot)
+    layouts["CapillaryHolderThreeRows, 45 slots"] = capillaries
+
+    bar = GIBar(name="bench_gibar")
+    for slot, position in enumerate(np.linspace(3, 105, 12), start=1):
+        sample = SampleGISAXS_Generic("bench_{}".format(slot))
+        bar.addSampleSlotPosition(sample, slot, position)
+        # As aligned: substrate height and tilt differ from sample to sample
+        sample.ysetOrigin(rng.normal(0, 0.3))
+        sample.thsetOrigin(rng.normal(0, 0.2))
+    layouts["GIBar, 12 aligned samples"] = bar
+
+    return layouts
+
+
+def benchmark_sample_order(holders=None, velocities=None, concurrent=False):
+    """
+    Predicted stage travel time to visit every sample of each holder, in
+    sample-number order vs. along the path of SamplePathPlanner (from the
+    first sample, as with the stage parked there). Offline: only the sample
+    positions and the motor velocities (VELO, or velocities={motor: mm/s})
+    are used.
+
+    holders: {label: holder}; default: typical well plate, capillary and GI bar layouts.
+    """
+    holders = _benchmark_layouts() if holders is None else holders
+    planner = SamplePathPlanner(velocities=velocities, concurrent=concurrent)
+    results = {}
+    print("{:40s} {:>8s} {:>10s} {:>10s} {:>8s} {:>8s}".format(
+        "holder", "samples", "number (s)", "path (s)", "saved", "plan (s)"))
+    for label, holder in holders.items():
+        t0 = time.time()
+        planner.order(holder.getSamples(verbosity=0), start={}, verbosity=0)
+        report = dict(planner.last_report, plan_time=time.time() - t0)
+        results[label] = report
+        print("{:40s} {:8d} {:10.1f} {:10.1f} {:7.0f}% {:8.3f}".format(
+            label, report["samples"], report["number_time"], report["path_time"],
+            100 * report["saved"] / report["number_time"] if report["number_time"] else 0, report["plan_time"]))
+    return results
@@ -0,0 +1,146 @@
+# Dry run of the robot region transitions of startup/96-automation.py. Not
+# loaded at startup, and needs no beamline (the robot classes are loaded with
+# simulated arm and stage motors; nothing moves):
+#   python benchmarks/96-automation.py
+# Checks that every stage approach (z leaving its retracted range) starts from
+# a commissioned pose, for pipelined and serial exchanges.
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+_STARTUP_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "startup", "96-automation.py")
+
+
+class _SimMotor:
+    def __init__(self, positions, name):
+        self.positions = positions
+        self.name = name
+
+    def move(self, value, **kwargs):
+        self.positions[self.name] = value
+
+    def set(self, value):
+        self.positions[self.name] = value
+        return _SimStatus()
+
+
+class _SimStatus:
+    def wait(self):
+        pass
+
+
+class _SimSettle:
+    def wait(self, *args, **kwargs):
+        return True
+
+
+def _dry_run_robot():
+    """A SampleExchangeRobot on simulated motors; returns (robot, positions, approaches)."""
+    positions = {"x": 0.0, "y": -104.9, "z": 0.0, "phi": 90.0}
+    approaches = []
+
+    class Stage:
+        def __init__(self, *args, **kwargs):
+            pass
+
+        def _move(self, axis, value):
+            if axis == "z" and value < -10:
+                approaches.append((self._region, self._sample, positions["y"], positions["phi"]))
+            positions[axis] = value
+
+        def xabs(self, value, verbosity=3):
+            self._move("x", value)
+
+        def yabs(self, value, verbosity=3):
+            self._move("y", value)
+
+        def zabs(self, value, verbosity=3):
+            self._move("z", value)
+
+        def phiabs(self, value, verbosity=3):
+            self._move("phi", value)
+
+        def yr(self, delta, verbosity=3):
+            self._move("y", positions["y"] + delta)
+
+        def xpos(self, verbosity=3):
+            return positions["x"]
+
+        def ypos(self, verbosity=3):
+            return positions["y"]
+
+        def zpos(self, verbosity=3):
+            return positions["z"]
+
+        def phipos(self, verbosity=3):
+            return positions["phi"]
+
+    ns = dict(Stage=Stage, time=time, ThreadPoolExecutor=ThreadPoolExecutor, readback_settle=_SimSettle())
+    for name, axis in (("armx", "x"), ("army", "y"), ("armz", "z"), ("armphi", "phi"),
+                       ("smx", "smx"), ("smy", "smy"), ("sth", "sth")):
+        ns[name] = _SimMotor(positions, axis)
+    with open(_STARTUP_FILE) as fin:
+        source = fin.read()
+    exec(source[source.index("class RobotSafetyModel"):source.index("class QueueJournal")], ns)
+
+    # Skip __init__ (axes definitions, beamline config): only the attributes the sequences use
+    robot = object.__new__(ns["SampleExchangeRobot"])
+    robot._sample = None
+    robot._region = "safe"
+    robot._status = "inGarage"
+    robot._prestage = None
+    robot._prestage_executor = ThreadPoolExecutor(max_workers=1)
+    robot.safety = ns["RobotSafetyModel"](robot)
+    robot._delta_y_hover = 7.0
+    robot._delta_y_slot = 4.0
+    robot._position_safe = [0, -104.9, 0.0, +90]
+    robot._position_sample_gripped = [-98, -103, -94.5, 91]
+    robot._position_hold = [0, -103, -94.5, 91]
+    robot._position_garage = [-18.1, -134.5, -50.0, 0.0]
+    robot._delta_garage_x = 30
+    robot._delta_garage_y = 20
+    robot._position_stg_exchange = [0, 0]
+    return robot, positions, approaches
+
+
+def check_robot_regions(cycles=2):
+    """Dry run of pipelined (with pre-staging) and serial exchanges; raises
+    AssertionError if a stage approach starts from an uncommissioned pose, or
+    if checkSafe accepts the 'retracted' region."""
+    robot, positions, approaches = _dry_run_robot()
+    x_safe, y_safe, z_safe, phi_safe = robot._position_safe
+    x_gripped, y_gripped, z_gripped, phi_gripped = robot._position_sample_gripped
+
+    for i in range(cycles):
+        robot.pickupHolder((2, 3), pipelined=True, verbosity=0)
+        assert robot._region == "retracted", robot._region
+        assert robot.prestageApproach(verbosity=0) is not None, "pre-staging refused after a pipelined pickup"
+        robot.waitPrestage()
+        robot.returnHolder((2, 3), pipelined=True, verbosity=0)
+    robot.pickupHolder((1, 1), pipelined=True, verbosity=0)
+    robot.returnHolder((1, 1), pipelined=False, verbosity=0)
+    assert robot._region == "safe", robot._region
+
+    robot._region = "retracted"
+    assert not robot.checkSafe(), "checkSafe accepted the 'retracted' region"
+    robot._region = "safe"
+
+    num_stage = 0
+    for region, sample, y, phi in approaches:
+        if region == "parking":
+            continue
+        num_stage += 1
+        # The stage sequences turn phi first, then approach in z from the safe y
+        # (or, with an empty gripper, from the pre-staged y)
+        prestaged = sample is None and y == y_gripped - robot._delta_y_slot
+        assert region == "safe" and phi == phi_gripped and (y == y_safe or prestaged), (region, sample, y, phi)
+
+    print("{} exchanges, {} stage approaches: all from the safe or pre-staged pose".format(
+        2 * cycles + 2, num_stage))
+    return approaches
+
+
+if __name__ == "__main__":
+    check_robot_regions()
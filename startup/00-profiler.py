@@ -0,0 +1,244 @@
+print(f'Loading {__file__}')
+
+# Startup profiler
+# Times every file in this startup directory (wall time, time spent in imports,
+# waiting for PV connections and constructing ophyd objects) and writes a
+# sorted report (text and JSON) once the last file has been loaded, or as soon
+# as a file fails (IPython stops loading there). If neither happens, the
+# profiler is removed (and the report written) after the first executed cell,
+# or at exit.
+#
+#   CMS_STARTUP_PROFILE=0                     disable the profiler
+#   CMS_STARTUP_BUDGET=1                      raise StartupBudgetExceeded at the end of
+#                                             loading if a file took longer than its budget
+#
+# Budgets (in s) are read from startup_budget.json next to this file, e.g.
+#   {"default": 10.0, "94-sample.py": 20.0}
+# startup_profiler.save_budget() writes one from the last load.
+#
+# Note that the categories overlap: PV connections waited on inside an ophyd
+# constructor count both as 'pv_connect' and 'construct'.
+
+import atexit
+import builtins
+import functools
+import glob
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+
+class StartupBudgetExceeded(RuntimeError):
+    pass
+
+
+class StartupProfiler:
+
+    CATEGORIES = ['import', 'pv_connect', 'construct']
+
+    def __init__(self, startup_dir, report_dir=None, enforce_budget=False, default_budget=10.0):
+        self.startup_dir = startup_dir
+        self.report_dir = tempfile.gettempdir() if report_dir is None else report_dir
+        self.budget_file = os.path.join(startup_dir, 'startup_budget.json')
+        self.enforce_budget = enforce_budget
+        self.default_budget = default_budget
+
+        # Same ordering as IPython uses to run the startup files
+        files = glob.glob(os.path.join(startup_dir, '*.py')) + glob.glob(os.path.join(startup_dir, '*.ipy'))
+        self.files = [os.path.basename(f) for f in sorted(files)]
+
+        self.records = {}
+        self._current = None
+        self._local = threading.local()
+        self._patches = []
+        self._ophyd_patched = False
+        self._finished = False
+        self._shell = None
+        self._t_start = time.perf_counter()
+
+    def _patch(self, obj, attr, value):
+        self._patches.append((obj, attr, obj.__dict__.get(attr)))
+        setattr(obj, attr, value)
+
+    def _timed(self, category, func):
+        '''Wrap func so that the time spent in its outermost calls (from the
+        main thread) is added to the current file's record.'''
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if threading.current_thread() is not threading.main_thread():
+                return func(*args, **kwargs)
+            depth = getattr(self._local, category, 0)
+            setattr(self._local, category, depth + 1)
+            t0 = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                setattr(self._local, category, depth)
+                if depth == 0 and self._current is not None:
+                    self._current[category] += time.perf_counter() - t0
+
+        wrapper._startup_profiled = True
+        return wrapper
+
+    def install(self, shell):
+        self._shell = shell
+        self._patch(shell, 'safe_execfile', self._execfile(shell.safe_execfile))
+        self._patch(builtins, '__import__', self._timed('import', builtins.__import__))
+        # Fallback, should loading stop without reaching (or failing in) a profiled file
+        shell.events.register('post_execute', self._fallback)
+        atexit.register(self._fallback)
+
+    def _fallback(self):
+        if self._shell is not None:
+            self._shell.events.unregister('post_execute', self._fallback)
+            self._shell = None
+        atexit.unregister(self._fallback)
+        if not self._finished:
+            self.finish(enforce=False)
+
+    def uninstall(self):
+        for obj, attr, original in reversed(self._patches):
+            if original is None:
+                delattr(obj, attr)
+            else:
+                setattr(obj, attr, original)
+        self._patches = []
+
+    def _wrap_init(self, cls):
+        init = cls.__dict__.get('__init__')
+        if init is not None and not getattr(init, '_startup_profiled', False):
+            self._patch(cls, '__init__', self._timed('construct', init))
+
+    def _patch_ophyd(self):
+        '''Once ophyd has been imported, time PV connection waits and ophyd
+        object construction (including classes defined later on).'''
+        if self._ophyd_patched or 'ophyd' not in sys.modules:
+            return
+        self._ophyd_patched = True
+
+        from ophyd.ophydobj import OphydObject
+        from ophyd.device import Device
+        from ophyd.signal import EpicsSignalBase
+
+        for cls in (EpicsSignalBase, Device):
+            self._patch(cls, 'wait_for_connection', self._timed('pv_connect', cls.wait_for_connection))
+
+        def walk(cls):
+            self._wrap_init(cls)
+            for sub in cls.__subclasses__():
+                walk(sub)
+
+        walk(OphydObject)
+
+        profiler = self
+        original = OphydObject.__dict__.get('__init_subclass__')
+
+        def __init_subclass__(cls, **kwargs):
+            if original is None:
+                super(OphydObject, cls).__init_subclass__(**kwargs)
+            else:
+                original.__get__(None, cls)(**kwargs)
+            profiler._wrap_init(cls)
+
+        self._patch(OphydObject, '__init_subclass__', classmethod(__init_subclass__))
+
+    def _execfile(self, safe_execfile):
+
+        @functools.wraps(safe_execfile)
+        def wrapper(fname, *args, **kwargs):
+            name = os.path.basename(fname)
+            record = dict.fromkeys(self.CATEGORIES, 0.0)
+            self._current = record
+            self._patch_ophyd()
+            t0 = time.perf_counter()
+            failed = True
+            try:
+                result = safe_execfile(fname, *args, **kwargs)
+                failed = False
+                return result
+            finally:
+                record['wall'] = time.perf_counter() - t0
+                self._current = None
+                self._patch_ophyd()
+                self.records[name] = record
+                if failed or name == self.files[-1]:
+                    # IPython stops loading at the first failing file. Never
+                    # mask the error raised by the file itself.
+                    self.finish(enforce=not failed)
+
+        return wrapper
+
+    def budget(self):
+        budget = {'default': self.default_budget}
+        if os.path.exists(self.budget_file):
+            with open(self.budget_file) as fin:
+                budget.update(json.load(fin))
+        return budget
+
+    def save_budget(self, margin=1.5, minimum=1.0):
+        '''Write budgets of margin × the last measured wall time for each file.'''
+        budget = {'default': self.default_budget}
+        for name, record in self.records.items():
+            budget[name] = round(max(minimum, margin * record['wall']), 1)
+        with open(self.budget_file, 'w') as fout:
+            json.dump(budget, fout, indent=4, sort_keys=True)
+        print("Saved startup budget to {}".format(self.budget_file))
+
+    def over_budget(self):
+        budget = self.budget()
+        return {name: (record['wall'], budget.get(name, budget['default']))
+                for name, record in self.records.items()
+                if record['wall'] > budget.get(name, budget['default'])}
+
+    def report(self, num=None, verbosity=3):
+        rows = sorted(self.records.items(), key=lambda item: item[1]['wall'], reverse=True)
+        over = self.over_budget()
+        total = time.perf_counter() - self._t_start
+
+        lines = ["Startup profile ({} files, {:.1f} s total)".format(len(rows), total),
+                 "{:28s} {:>8s} {:>8s} {:>10s} {:>10s} {:>8s}".format(
+                     'file', 'wall', 'import', 'pv_connect', 'construct', 'budget')]
+        for name, record in rows[:num]:
+            lines.append("{:28s} {:8.2f} {:8.2f} {:10.2f} {:10.2f} {:>8s}".format(
+                name, record['wall'], record['import'], record['pv_connect'], record['construct'],
+                '{:.1f}!'.format(over[name][1]) if name in over else ''))
+        text = "\n".join(lines)
+
+        with open(os.path.join(self.report_dir, 'cms_startup_profile.txt'), 'w') as fout:
+            fout.write(text + "\n")
+        with open(os.path.join(self.report_dir, 'cms_startup_profile.json'), 'w') as fout:
+            json.dump({'time': time.time(), 'total': total, 'files': dict(rows)}, fout, indent=4)
+
+        if verbosity >= 3:
+            print(text)
+        return rows
+
+    def finish(self, enforce=True):
+        if self._finished:
+            return
+        self._finished = True
+        self.uninstall()
+        self.report(num=15)
+        over = self.over_budget()
+        if over:
+            msg = "Startup files over budget: " + ", ".join(
+                "{} ({:.1f} s > {:.1f} s)".format(name, wall, budget) for name, (wall, budget) in over.items())
+            if self.enforce_budget and enforce:
+                raise StartupBudgetExceeded(msg)
+            print(msg)
+
+
+if os.environ.get('CMS_STARTUP_PROFILE', '1') != '0':
+    from IPython import get_ipython
+
+    _ip = get_ipython()
+    if _ip is not None:  # Not available when loaded by the queueserver
+        startup_profiler = StartupProfiler(
+            os.path.dirname(os.path.abspath(__file__)),
+            enforce_budget=(os.environ.get('CMS_STARTUP_BUDGET', '0') != '0'),
+        )
+        startup_profiler.install(_ip)
@@ -34,26 +34,408 @@ ip.prompts = ProposalIDPrompt(ip)
 tiled_writing_client = from_profile("nsls2", api_key=os.environ["TILED_BLUESKY_WRITING_API_KEY_CMS"])["cms"]["raw"]
 tiled_writing_client.context.http_client.headers['tiled-qos'] = 'acquisition'
 
+import atexit
+import collections
+import json
+import queue
+import random
+import threading
+import time
+
+
+# On persistent storage, so that the spool survives a crash or a reboot
+TILED_SPOOL_DIRECTORY = os.environ.get('CMS_TILED_SPOOL', os.path.expanduser('~/.local/share/cms/tiled_spool'))
+
+
+class DocumentSpool:
+    """
+    Append-only write-ahead spool for documents on their way to Tiled.
+
+    Every document is written to a segment file (one per run, named after the
+    run start uid) before it is posted; once the post succeeds an ack record
+    is appended. Segments are fsync'd in batches (every fsync_every records,
+    or fsync_interval seconds, and always at the stop document). A segment is
+    removed once its run has stopped and every document in it has been
+    acknowledged, so whatever remains on disk is what replay_spool() reposts.
+
+    Each line of a segment is a JSON record, either
+        {"seq": n, "name": name, "doc": doc}   or   {"ack": n}
+    """
+
+    def __init__(self, directory=None, fsync_every=200, fsync_interval=1.0, keep_acknowledged=False):
+        # Must survive a reboot (not /tmp)
+        directory = TILED_SPOOL_DIRECTORY if directory is None else directory
+        self.directory = directory
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.keep_acknowledged = keep_acknowledged
+        os.makedirs(self.directory, exist_ok=True)
+
+        self._segments = {}
+        self._run_of = {}  # descriptor/resource uid --> run start uid
+        self._lock = threading.RLock()
+        self._unsynced = set()
+        self._unsynced_records = 0
+        self._last_sync = time.monotonic()
+
+    def _path(self, key):
+        return os.path.join(self.directory, "{}.spool".format(key))
+
+    def _run_key(self, name, doc):
+        if name == 'start':
+            return doc['uid']
+        if name in ('descriptor', 'resource', 'stream_resource'):
+            key = doc.get('run_start', 'misc')
+            self._run_of[doc['uid']] = key
+            return key
+        if name == 'stop':
+            return doc.get('run_start', 'misc')
+        if name in ('event', 'event_page', 'stream_datum'):
+            return self._run_of.get(doc.get('descriptor'), 'misc')
+        if name in ('datum', 'datum_page'):
+            return self._run_of.get(doc.get('resource'), 'misc')
+        return 'misc'
+
+    def _open(self, key):
+        """Open (or reopen, restoring its state from disk) the segment for key."""
+        seg = self._segments.get(key)
+        if seg is None:
+            path = self._path(key)
+            seq, unacked, stopped = 0, set(), False
+            for record in self._records(path):
+                if 'ack' in record:
+                    unacked.discard(record['ack'])
+                else:
+                    seq = max(seq, record['seq'] + 1)
+                    unacked.add(record['seq'])
+                    stopped = stopped or record['name'] == 'stop'
+            seg = {'file': open(path, 'a'), 'seq': seq, 'unacked': unacked, 'inflight': 0, 'stopped': stopped}
+            self._segments[key] = seg
+        return seg
+
+    @staticmethod
+    def _records(path):
+        if not os.path.exists(path):
+            return
+        with open(path) as fin:
+            for line in fin:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # Torn final line from a crash mid-write
+                    break
+
+    @staticmethod
+    def _default(obj):
+        if hasattr(obj, 'tolist'):  # numpy arrays and scalars
+            return obj.tolist()
+        return str(obj)
+
+    def _write(self, key, seg, record, force_sync=False):
+        seg['file'].write(json.dumps(record, default=self._default) + "\n")
+        self._unsynced.add(key)
+        self._unsynced_records += 1
+        if (force_sync or self._unsynced_records >= self.fsync_every
+                or time.monotonic() - self._last_sync > self.fsync_interval):
+            self.sync()
+
+    def sync(self):
+        """Flush and fsync every segment written since the last sync."""
+        with self._lock:
+            for key in self._unsynced:
+                seg = self._segments.get(key)
+                if seg is not None:
+                    seg['file'].flush()
+                    os.fsync(seg['file'].fileno())
+            self._unsynced.clear()
+            self._unsynced_records = 0
+            self._last_sync = time.monotonic()
+
+    def append(self, name, doc):
+        """Record a document before it is posted. Returns a reference for ack()."""
+        with self._lock:
+            key = self._run_key(name, doc)
+            seg = self._open(key)
+            seq = seg['seq']
+            seg['seq'] += 1
+            seg['unacked'].add(seq)
+            seg['inflight'] += 1
+            if name == 'stop':
+                seg['stopped'] = True
+            self._write(key, seg, {'seq': seq, 'name': name, 'doc': doc}, force_sync=(name == 'stop'))
+            return (key, seq)
+
+    def ack(self, ref):
+        """Mark a document as saved in Tiled."""
+        key, seq = ref
+        with self._lock:
+            seg = self._open(key)
+            seg['inflight'] -= 1
+            seg['unacked'].discard(seq)
+            self._write(key, seg, {'ack': seq})
+            if seg['stopped'] and not seg['unacked'] and not seg['inflight']:
+                self._finish(key)
+
+    def release(self, ref):
+        """Give up on a document for now; it stays in the spool for replay."""
+        key, seq = ref
+        with self._lock:
+            seg = self._segments.get(key)
+            if seg is not None:
+                seg['inflight'] -= 1
+
+    def _finish(self, key):
+        seg = self._segments.pop(key)
+        self._unsynced.discard(key)
+        seg['file'].close()
+        if not self.keep_acknowledged:
+            os.remove(self._path(key))
+
+    def abandon(self, key):
+        """A segment left over from an earlier session: no more documents will
+        come for its run (the stop document may never have been written), so
+        it is removed as soon as what it holds is acknowledged. Returns True
+        if it was removed right away (nothing left to replay)."""
+        with self._lock:
+            seg = self._open(key)
+            seg['stopped'] = True
+            if not seg['unacked'] and not seg['inflight']:
+                self._finish(key)
+                return True
+            return False
+
+    def is_open(self, key):
+        with self._lock:
+            return key in self._segments
+
+    def replayable(self):
+        """Keys of segments (oldest first) with unacknowledged documents and none in flight."""
+        with self._lock:
+            keys = []
+            for fname in os.listdir(self.directory):
+                if fname.endswith('.spool'):
+                    key = fname[:-len('.spool')]
+                    seg = self._segments.get(key)
+                    if seg is None or seg['inflight'] == 0:
+                        keys.append(key)
+            return sorted(keys, key=lambda k: os.path.getmtime(self._path(k)))
+
+    def unacknowledged(self, key):
+        """List of (ref, name, doc) not yet acknowledged in segment key, in
+        order. They are counted as in flight until ack() or release()."""
+        with self._lock:
+            seg = self._open(key)
+            pending = []
+            for record in self._records(self._path(key)):
+                if 'ack' not in record and record['seq'] in seg['unacked']:
+                    pending.append(((key, record['seq']), record['name'], record['doc']))
+            seg['inflight'] += len(pending)
+            if not pending and seg['stopped'] and not seg['inflight']:
+                self._finish(key)
+            return pending
+
+    def close(self):
+        with self._lock:
+            self.sync()
+            for seg in self._segments.values():
+                seg['file'].close()
+            self._segments.clear()
+
+
 class TiledInserter:
+    """
+    Deliver documents to Tiled from a background thread.
+
+    insert() only puts the document on a bounded in-memory queue, so the
+    RunEngine callback path never waits on the Tiled server. A single worker
+    thread posts the documents in order, retrying failures with exponential
+    backoff plus jitter. When the queue is full, insert() waits for room
+    (back-pressure) instead of dropping documents.
+
+    With a spool, each document is written to disk before it is queued and
+    acknowledged once posted; documents that run out of attempts stay in the
+    spool for replay_spool() instead of being lost.
+
+    client: object with a post_document(name, doc) method (defaults to the
+        global tiled_writing_client, resolved at post time)
+    spool: DocumentSpool, or None to keep documents only in memory
+    """
 
     name = 'cms'
+
+    def __init__(self, client=None, spool=None, maxsize=20000, attempts=20, backoff_base=0.5, backoff_max=30.0,
+                 jitter=0.5, verbosity=3):
+        self.client = client
+        self.spool = spool
+        self.attempts = attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.jitter = jitter
+        self.verbosity = verbosity
+
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._pending = collections.deque()  # enqueue times (monotonic) of documents not yet posted
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+        self.failed = collections.deque(maxlen=1000)  # (name, doc, exc) that ran out of attempts
+        self.counters = collections.Counter()
+        self.last_error = None
+
+        self._thread = threading.Thread(target=self._run, name='TiledInserter', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
     def insert(self, name, doc):
-        ATTEMPTS = 20
-        error = None
-        for _ in range(ATTEMPTS):
+        ref = self.spool.append(name, doc) if self.spool is not None else None
+        self._enqueue(name, doc, ref)
+
+    def _enqueue(self, name, doc, ref=None):
+        t = time.monotonic()
+        with self._lock:
+            self._pending.append(t)
+        try:
+            self._queue.put_nowait((name, doc, ref))
+        except queue.Full:
+            self.counters['blocked'] += 1
+            if self.verbosity >= 2:
+                print("TiledInserter queue is full ({} documents); waiting for Tiled...".format(self._queue.maxsize))
+            self._queue.put((name, doc, ref))
+        self.counters['queued'] += 1
+
+    def backoff(self, attempt):
+        """Delay (in s) before retry number attempt (starting at 1)."""
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1))
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    @staticmethod
+    def is_duplicate(exc):
+        """Tiled refused the document because it already has it (e.g. a
+        replayed document whose ack was not yet on disk at a crash): an HTTP
+        409 Conflict response, on exc or the exception it was raised from.
+        Nothing else counts, whatever the message says: the document must
+        stay spooled until Tiled has it."""
+        while exc is not None:
+            response = getattr(exc, 'response', None)
+            if getattr(response, 'status_code', None) == 409:
+                return True
+            exc = exc.__cause__
+        return False
+
+    def _post(self, name, doc):
+        """Post one document, retrying with backoff. Returns the last
+        exception if every attempt failed, else None."""
+        client = self.client if self.client is not None else tiled_writing_client
+        for attempt in range(1, self.attempts + 1):
             try:
-                tiled_writing_client.post_document(name, doc)
+                client.post_document(name, doc)
             except Exception as exc:
-                print("Document saving failure:", repr(exc))
-                error = exc
+                if self.is_duplicate(exc):
+                    # Already saved: nothing to retry
+                    self.counters['duplicates'] += 1
+                    return None
+                self.counters['errors'] += 1
+                self.last_error = exc
+                if self.verbosity >= 2:
+                    print("Document saving failure ({}/{}):".format(attempt, self.attempts), repr(exc))
+                if attempt == self.attempts or self._stop.wait(self.backoff(attempt)):
+                    return exc
             else:
+                self.counters['posted'] += 1
+                return None
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
                 break
-            time.sleep(2)
-        else:
-            # Out of attempts
-            raise error
+            name, doc, ref = item
+            try:
+                error = self._post(name, doc)
+                if error is not None:
+                    self.counters['failed'] += 1
+                    self.failed.append((name, doc, error))
+                    print("Document '{}' could not be saved to Tiled: {}".format(name, repr(error)))
+                if ref is not None:
+                    if error is None:
+                        self.spool.ack(ref)
+                    else:
+                        self.spool.release(ref)
+            except Exception as exc:
+                # Never let the worker thread die
+                print("TiledInserter worker error:", repr(exc))
+            finally:
+                with self._lock:
+                    self._pending.popleft()
+                self._queue.task_done()
+
+    def stats(self):
+        """Back-pressure metrics: queue depth, age (s) of the oldest pending document, counters."""
+        with self._lock:
+            depth = len(self._pending)
+            oldest = time.monotonic() - self._pending[0] if depth else 0.0
+        return {'queue_depth': depth,
+                'oldest_pending_age': oldest,
+                'posted': self.counters['posted'],
+                'errors': self.counters['errors'],
+                'failed': self.counters['failed'],
+                'blocked': self.counters['blocked'],
+                'last_error': repr(self.last_error) if self.last_error is not None else None,
+                }
 
-tiled_inserter = TiledInserter()
+    def flush(self, timeout=None, verbosity=None):
+        """Wait until every queued document has been posted (or given up on).
+        Returns True if the queue drained within timeout."""
+        verbosity = self.verbosity if verbosity is None else verbosity
+        t_end = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                depth = len(self._pending)
+            if depth == 0:
+                return True
+            if not self._thread.is_alive() or (t_end is not None and time.monotonic() > t_end):
+                if verbosity >= 2:
+                    print("TiledInserter: {} documents still pending after flush.".format(depth))
+                return False
+            time.sleep(0.01)
+
+    def close(self, timeout=60):
+        """Flush pending documents and stop the worker thread (called at exit)."""
+        if not self._thread.is_alive():
+            return
+        self.flush(timeout=timeout)
+        self._stop.set()
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+        if self.spool is not None:
+            self.spool.close()
+
+
+def replay_spool(inserter=None, verbosity=3):
+    """Repost, in order, every spooled document that was never acknowledged
+    by Tiled (e.g. after a crash or an outage). The documents go through the
+    inserter queue, so this returns immediately."""
+    inserter = tiled_inserter if inserter is None else inserter
+    if inserter.spool is None:
+        return 0
+    num = 0
+    for key in inserter.spool.replayable():
+        if not inserter.spool.is_open(key) and inserter.spool.abandon(key):
+            # Left over from an earlier session, with nothing to replay: removed
+            continue
+        pending = inserter.spool.unacknowledged(key)
+        for ref, name, doc in pending:
+            inserter._enqueue(name, doc, ref)
+        num += len(pending)
+        if verbosity >= 3 and pending:
+            print("Replaying {} spooled documents for run {}".format(len(pending), key))
+    return num
+
+
+tiled_spool = DocumentSpool()
+tiled_inserter = TiledInserter(spool=tiled_spool)
+replay_spool()
 
 nslsii.configure_base(get_ipython().user_ns,
                       tiled_inserter,
@@ -62,12 +444,141 @@ nslsii.configure_base(get_ipython().user_ns,
                       redis_port=6380,
                       redis_ssl=True)
 
-print("Initializing Tiled reading client...\nMake sure you check for duo push.")
-tiled_reading_client = cat = from_profile("nsls2", username=None)["cms"]["raw"]
-tiled_reading_client.context.http_client.headers['tiled-qos'] = 'acquisition'
-mig = from_profile("nsls2", username=None)["cms/migration"]
 
-db = Broker(tiled_reading_client)  # Keep for backcompatibility with older code that uses databroker
+class LazyClient:
+    """
+    Proxy that builds the wrapped object (a Tiled client, Broker, ...) on
+    first use instead of at import time. Attribute access, indexing, calls,
+    iteration and len() are forwarded to the real object.
+
+    warm_up() connects in a background thread, so the connection is usually
+    ready by the time the user needs it; first use waits for it if not.
+    """
+
+    def __init__(self, factory, name=None):
+        self.__dict__['_factory'] = factory
+        self.__dict__['_name'] = name
+        self.__dict__['_obj'] = None
+        self.__dict__['_lock'] = threading.Lock()
+
+    def _connect(self):
+        obj = self.__dict__['_obj']
+        if obj is None:
+            with self._lock:
+                obj = self.__dict__['_obj']
+                if obj is None:
+                    t0 = time.monotonic()
+                    obj = self._factory()
+                    self.__dict__['_obj'] = obj
+                    self.__dict__['_connect_time'] = time.monotonic() - t0
+        return obj
+
+    def warm_up(self):
+        """Connect in a background thread. A failed warm-up is reported, and
+        retried on first use."""
+
+        def run():
+            try:
+                self._connect()
+            except Exception as exc:
+                print("Could not initialize {}: {}".format(self._name, repr(exc)))
+
+        thread = threading.Thread(target=run, name="warm_up_{}".format(self._name), daemon=True)
+        thread.start()
+        return thread
+
+    @property
+    def connected(self):
+        return self.__dict__['_obj'] is not None
+
+    @property
+    def __class__(self):
+        # isinstance(db, Broker) checks the real object
+        return type(self._connect())
+
+    def __dir__(self):
+        # Tab completion
+        return sorted(set(dir(self._connect())) | {'warm_up', 'connected'})
+
+    def __getattr__(self, attr):
+        return getattr(self._connect(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._connect(), attr, value)
+
+    def __getitem__(self, key):
+        return self._connect()[key]
+
+    def __call__(self, *args, **kwargs):
+        return self._connect()(*args, **kwargs)
+
+    def __iter__(self):
+        return iter(self._connect())
+
+    def __len__(self):
+        return len(self._connect())
+
+    def __contains__(self, key):
+        return key in self._connect()
+
+    def __repr__(self):
+        if not self.connected:
+            return "<LazyClient {} (not connected)>".format(self._name)
+        return repr(self._obj)
+
+
+_tiled_root = LazyClient(lambda: from_profile("nsls2", username=None), name='tiled')
+
+
+def _reading_client():
+    client = _tiled_root["cms"]["raw"]
+    client.context.http_client.headers['tiled-qos'] = 'acquisition'
+    return client
+
+
+tiled_reading_client = cat = LazyClient(_reading_client, name='tiled_reading_client')
+mig = LazyClient(lambda: _tiled_root["cms/migration"], name='mig')
+
+
+class FlushingBroker(Broker):
+    """Broker that waits for queued documents to reach Tiled before lookups,
+    so that db[-1] right after a run returns that run."""
+
+    flush_timeout = 30
+
+    def __getitem__(self, key):
+        tiled_inserter.flush(timeout=self.flush_timeout)
+        return super().__getitem__(key)
+
+    def __call__(self, *args, **kwargs):
+        tiled_inserter.flush(timeout=self.flush_timeout)
+        return super().__call__(*args, **kwargs)
+
+
+# Keep for backcompatibility with older code that uses databroker
+db = LazyClient(lambda: FlushingBroker(tiled_reading_client._connect()), name='db')
+
+
+def tiled_login_cached():
+    """True if a Tiled login is cached, so that from_profile() will not ask
+    for a password or Duo push."""
+    cache_dir = os.environ.get('TILED_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'tiled'))
+    for root, dirs, files in os.walk(os.path.join(cache_dir, 'tokens')):
+        if files:
+            return True
+    return False
+
+
+if tiled_login_cached():
+    # Connect to Tiled (and build db) in the background while the rest of the profile loads
+    print("Initializing Tiled reading client in the background...")
+    db.warm_up()
+    mig.warm_up()
+else:
+    # The login prompt needs the terminal: connect here, before IPython takes it over
+    print("Initializing Tiled reading client...\nMake sure you check for duo push.")
+    db._connect()
+    mig._connect()
 
 from pyOlog.ophyd_tools import *
 
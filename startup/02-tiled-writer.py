@@ -1,5 +1,10 @@
+import collections
+import functools
 import numpy
 import os
+import threading
+import time
+from importlib.metadata import version
 
 from bluesky_tiled_plugins import TiledWriter
 from bluesky.callbacks.buffer import BufferingWrapper
@@ -50,16 +55,26 @@ MIMETYPE_LOOKUP = {
 
 
 # Define document-specific patches to be applied before sending them to TiledWriter
+#
+# Descriptors of long series and fly scans repeat the same data_keys schema over
+# and over, so the normalized (shape, dtype_str) of every data key is memoized,
+# keyed by the schema itself, with LRU eviction. The same goes for the path
+# rewriting in resources.
+
+@functools.lru_cache(maxsize=1024)
+def _patched_resource_path(root, resource_path):
+    if not resource_path.startswith(root):
+        resource_path = os.path.join(root, resource_path)
+    return resource_path.replace("/nsls2/data3/cms", "/nsls2/data/cms")
+
+
 def patch_resource(doc):
 
     kwargs = doc.get("resource_kwargs", {})
 
     # Fix the resource path
-    root = doc.get("root", "")
-    if not doc["resource_path"].startswith(root):
-        doc["resource_path"] = os.path.join(root, doc["resource_path"])
+    doc["resource_path"] = _patched_resource_path(doc.get("root", ""), doc["resource_path"])
     doc["root"] = ""
-    doc["resource_path"] = doc["resource_path"].replace("/nsls2/data3/cms", "/nsls2/data/cms")
 
     if doc.get("spec") in ["AD_TIFF"]:
         kwargs["template"] = "/" + kwargs["template"].lstrip("/")    # Ensure leading slash
@@ -69,41 +84,249 @@ def patch_resource(doc):
     return doc
 
 
+def _data_keys_signature(data_keys):
+    return tuple((key, tuple(desc.get("shape", ())), desc.get("dtype_str")) for key, desc in data_keys.items())
+
+
+@functools.lru_cache(maxsize=256)
+def _normalized_data_keys(signature):
+    '''Normalized (key, shape, dtype_str) for a data_keys signature; the
+    cached equivalent of the former uncached patch (patch_descriptor_reference
+    in benchmarks/02-tiled-writer.py).'''
+    normalized = []
+    for key, shape, dtype_str in signature:
+        shape = list(shape)
+        if len(shape) < 3:
+            shape = [1]*(3-len(shape)) + shape
+
+        if key == 'pilatus800_image':
+            if dtype_str is None:
+                dtype_str = "<i4"
+            if shape[-1] == 0:
+                shape[-1] = 1
+                shape = shape[::-1]
+
+        # Ensure dtype_str has the proper numpy format (to pass the EventModel validator)
+        if dtype_str is not None:
+            dtype_str = numpy.dtype(dtype_str).str
+        normalized.append((key, tuple(max(x, 0) for x in shape), dtype_str))
+    return tuple(normalized)
+
+
 def patch_descriptor(doc):
-    for desc in doc['data_keys'].values():
-        if len(desc["shape"]) < 3:
-            desc["shape"] = [1]*(3-len(desc["shape"])) + desc["shape"]
-
-    if 'pilatus800_image' in doc['data_keys']:
-        desc = doc['data_keys']['pilatus800_image']
-        desc.setdefault("dtype_str", "<i4")
-        shape = desc['shape']
-        if shape[-1] == 0:
-            shape[-1] = 1
-            desc['shape'] = shape[::-1]
-
-    # Ensure dtype_str has the proper numpy format (to pass the EventModel validator)
-    for key, val in doc["data_keys"].items():
-        if "dtype_str" in val:
-            val["dtype_str"] = numpy.dtype(val["dtype_str"]).str
-        val["shape"] = tuple(map(lambda x: max(x, 0), val.get("shape", [])))
+    data_keys = doc['data_keys']
+    for key, shape, dtype_str in _normalized_data_keys(_data_keys_signature(data_keys)):
+        desc = data_keys[key]
+        desc["shape"] = shape
+        if dtype_str is not None:
+            desc["dtype_str"] = dtype_str
 
     return doc
 
 
+##### Adaptive batching #####
+# A fixed batch_size is a trade-off between throughput (large batches for
+# 1000-frame bursts) and latency (single-point counts that should show up in
+# Tiled right away). AdaptiveTiledWriter sizes the batches from the observed
+# event rate so that a batch holds about max_latency seconds of events, and
+# also flushes whenever the oldest cached event is older than max_latency
+# (checked at every event, and every max_latency/2 s by a timer thread, so the
+# tail of a burst does not wait for the stop document).
+#
+# AdaptiveRunWriter builds on private parts of bluesky-tiled-plugins (the
+# _RunWriter caches, and a copy of TiledWriter._factory): with any version
+# other than the ones it was checked against, the plain TiledWriter is used.
+ADAPTIVE_WRITER_VERSIONS = ("2.0.2",)
+
+try:
+    from bluesky_tiled_plugins.writing.tiled_writer import _RunWriter, _ConditionalBackup, JSONLinesWriter
+    adaptive_writer_supported = version("bluesky-tiled-plugins") in ADAPTIVE_WRITER_VERSIONS
+except ImportError:
+    _RunWriter = object
+    adaptive_writer_supported = False
+
+class BatchingStats:
+    '''Counters of the flushes done by an AdaptiveTiledWriter (all runs).'''
+
+    def __init__(self, history=1000):
+        self.flushes = 0
+        self.events = 0
+        self.rows_written = 0
+        self.write_time = 0.0
+        self.batch_sizes = collections.deque(maxlen=history)
+        self.write_latencies = collections.deque(maxlen=history)  # time spent writing each batch to Tiled
+
+    def record_flush(self, batch_size, latency):
+        self.flushes += 1
+        self.rows_written += batch_size
+        self.write_time += latency
+        self.batch_sizes.append(batch_size)
+        self.write_latencies.append(latency)
+
+    def summary(self, verbosity=3):
+        summary = {
+            'flushes': self.flushes,
+            'events': self.events,
+            'rows_written': self.rows_written,
+            'mean_batch_size': numpy.mean(self.batch_sizes) if self.batch_sizes else 0,
+            'max_batch_size': max(self.batch_sizes, default=0),
+            'mean_write_latency': numpy.mean(self.write_latencies) if self.write_latencies else 0,
+            'max_write_latency': max(self.write_latencies, default=0),
+        }
+        if verbosity >= 3:
+            for key, val in summary.items():
+                print("{:20s} {}".format(key, val))
+        return summary
+
+
+class AdaptiveBatchController:
+    '''Batch size from the event rate (EWMA of the inter-event time).'''
+
+    def __init__(self, max_latency=2.0, min_batch_size=1, max_batch_size=10000, smoothing=0.2):
+        self.max_latency = max_latency
+        self.min_batch_size = min_batch_size
+        self.max_batch_size = max_batch_size
+        self.smoothing = smoothing
+        self.interval = None
+        self._last_time = None
+
+    def observe(self, t):
+        if self._last_time is not None:
+            dt = max(t - self._last_time, 1e-6)
+            if self.interval is None:
+                self.interval = dt
+            else:
+                self.interval += self.smoothing*(dt - self.interval)
+        self._last_time = t
+
+    @property
+    def rate(self):
+        return None if self.interval is None else 1.0/self.interval
+
+    @property
+    def batch_size(self):
+        if self.interval is None:
+            return self.min_batch_size
+        size = int(self.max_latency/self.interval)
+        return max(self.min_batch_size, min(self.max_batch_size, size))
+
+
+class AdaptiveRunWriter(_RunWriter):
+
+    def __init__(self, client, controller, stats, **kwargs):
+        self._controller = controller
+        self._stats = stats
+        # Documents (BufferingWrapper thread) and timed flushes (flusher thread) take turns
+        self._lock = threading.RLock()
+        self._closed = threading.Event()
+        self._flusher = None
+        super().__init__(client, **kwargs)
+
+    def __call__(self, name, doc):
+        with self._lock:
+            result = super().__call__(name, doc)
+        if name == "event" and self._flusher is None:
+            self._flusher = threading.Thread(target=self._flush_periodically, name="tiled_writer_flush",
+                                             daemon=True)
+            self._flusher.start()
+        elif name == "stop":
+            self._closed.set()
+        return result
+
+    def _flush_periodically(self):
+        while not self._closed.wait(self._controller.max_latency / 2.0):
+            try:
+                with self._lock:
+                    self._flush_stale()
+            except Exception as ex:
+                print("WARNING: timed flush to Tiled failed ({})".format(repr(ex)))
+
+    def _flush_stale(self):
+        """Write the cached events of every stream whose oldest one is older than max_latency."""
+        now = time.time()
+        for desc_node in self._desc_nodes.values():
+            data_cache = self._internal_data_cache.get(desc_node.item["id"])
+            if data_cache and now - data_cache[0]["time"] >= self._controller.max_latency:
+                self._write_internal_data(data_cache, desc_node=desc_node)
+                data_cache.clear()
+
+    # _RunWriter compares the cache lengths (events and StreamDatums) to _batch_size
+    @property
+    def _batch_size(self):
+        return self._controller.batch_size
+
+    @_batch_size.setter
+    def _batch_size(self, value):
+        self._controller.max_batch_size = max(1, value)
+
+    def _write_internal_data(self, data_cache, desc_node):
+        batch_size = len(data_cache)
+        t0 = time.perf_counter()
+        super()._write_internal_data(data_cache, desc_node)
+        self._stats.record_flush(batch_size, time.perf_counter() - t0)
+
+    def event(self, doc):
+        self._stats.events += 1
+        self._controller.observe(doc["time"])
+        super().event(doc)
+
+        # Do not keep events waiting for longer than max_latency
+        self._flush_stale()
+
+
+class AdaptiveTiledWriter(TiledWriter):
+    '''TiledWriter whose batch_size is the upper bound of an adaptive batch size.'''
+
+    def __init__(self, client, *, max_latency=2.0, min_batch_size=1, **kwargs):
+        super().__init__(client, **kwargs)
+        self.max_latency = max_latency
+        self.min_batch_size = min_batch_size
+        self.batching_stats = BatchingStats()
+
+    def _factory(self, name, doc):
+        controller = AdaptiveBatchController(max_latency=self.max_latency,
+                                             min_batch_size=self.min_batch_size,
+                                             max_batch_size=self._batch_size)
+        cb = run_writer = AdaptiveRunWriter(self.client, controller, self.batching_stats,
+                                            batch_size=self._batch_size,
+                                            max_array_size=self._max_array_size,
+                                            validate=self._validate)
+
+        if self._normalizer:
+            cb = self._normalizer(patches=self.patches, spec_to_mimetype=self.spec_to_mimetype)
+            cb.subscribe(run_writer)
+
+        if self.backup_directory:
+            cb = _ConditionalBackup(cb, [JSONLinesWriter(self.backup_directory)])
+
+        return [cb], []
+
+
 # Initialize the Tiled client and the TiledWriter
 api_key = os.environ.get("TILED_BLUESKY_WRITING_API_KEY_CMS")
 tiled_writing_client_sql = from_uri("https://tiled.nsls2.bnl.gov", api_key=api_key)['cms/migration']
-tw = TiledWriter(client = tiled_writing_client_sql,
-                 backup_directory="/tmp/tiled_backup",   # NOTE: Pick a suitable backup directory
-                 patches = {"descriptor": patch_descriptor,
-                            "resource": patch_resource},
-                 spec_to_mimetype = MIMETYPE_LOOKUP,
-                 batch_size=10000   # NOTE: Set to 1 to disable batching
-                 )
+if adaptive_writer_supported:
+    tiled_writer = AdaptiveTiledWriter(client = tiled_writing_client_sql,
+                     backup_directory="/tmp/tiled_backup",   # NOTE: Pick a suitable backup directory
+                     patches = {"descriptor": patch_descriptor,
+                                "resource": patch_resource},
+                     spec_to_mimetype = MIMETYPE_LOOKUP,
+                     batch_size=10000,   # NOTE: Maximum batch size; set to 1 to disable batching
+                     max_latency=2.0,    # Flush cached events after at most this many seconds
+                     )
+else:
+    print("WARNING: adaptive batching not checked against this bluesky-tiled-plugins version; "
+          "using the fixed batch size.")
+    tiled_writer = TiledWriter(client = tiled_writing_client_sql,
+                     backup_directory="/tmp/tiled_backup",   # NOTE: Pick a suitable backup directory
+                     patches = {"descriptor": patch_descriptor,
+                                "resource": patch_resource},
+                     spec_to_mimetype = MIMETYPE_LOOKUP,
+                     batch_size=10000   # NOTE: Set to 1 to disable batching
+                     )
 
 # Thread-safe wrapper for TiledWriter
-tw = BufferingWrapper(tw)
+tw = BufferingWrapper(tiled_writer)
 
 # Subscribe the TiledWriter
 RE.md["tiled_access_tags"] = (RE.md["data_session"],)
@@ -2,23 +2,152 @@
 # Add by Siyu Wu 2025/08/21
 
 import asyncio
+import atexit
+import itertools
 import threading
 import contextlib
 import queue
+import sys
+import time
 from concurrent.futures import ThreadPoolExecutor
 
-def async_run(func, *args, **kwargs):
+
+class AsyncLoopService:
     """
-    Run a synchronous function in an asynchronous context.
+    A single long-lived asyncio event loop running in a background thread.
+
+    Coroutines submitted here run concurrently with acquisition: the loop is
+    independent of the RunEngine's own loop and of the IPython main thread,
+    so e.g. a Linkam step program can keep running (and archiving) while
+    RE(...) is measuring.
+
+    submit(coro)                    schedule a coroutine, returns a concurrent.futures.Future
+    submit_sync(func, *args)        run a blocking function on the (bounded) executor
+    run(coro) / run_sync(func)      same, but wait for (and return) the result
+    create_event() / set_event(e)   asyncio.Event owned by the loop, settable from any thread
+    tasks()                         what is currently running
+    cancel(task_id=None)            cancel one (or every) task
     """
-    try:
-        return asyncio.run(func(*args, **kwargs))
-    except RuntimeError:
+
+    def __init__(self, name='async_loop', max_workers=8):
+        self.name = name
+        self._loop = asyncio.new_event_loop()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._loop.set_default_executor(self._executor)
+        self._tasks = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+        ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(ready,), name=name, daemon=True)
+        self._thread.start()
+        ready.wait()
+        atexit.register(self.shutdown)
+
+    def _run(self, ready):
+        asyncio.set_event_loop(self._loop)
+        self._loop.call_soon(ready.set)
+        self._loop.run_forever()
+
+    @property
+    def loop(self):
+        return self._loop
+
+    def _track(self, future, name, kind):
+        with self._lock:
+            task_id = next(self._ids)
+            self._tasks[task_id] = {'future': future, 'name': name, 'kind': kind, 'submitted': time.time()}
+
+        def forget(fut):
+            with self._lock:
+                self._tasks.pop(task_id, None)
+            if not fut.cancelled() and fut.exception() is not None:
+                print("[{}] Task {} ({}) failed: {}".format(self.name, task_id, name, repr(fut.exception())))
+
+        future.add_done_callback(forget)
+        future.task_id = task_id
+        return future
+
+    def submit(self, coro, name=None):
+        """Schedule a coroutine on the loop; returns a concurrent.futures.Future."""
+        name = getattr(coro, '__qualname__', repr(coro)) if name is None else name
+        return self._track(asyncio.run_coroutine_threadsafe(coro, self._loop), name, 'coroutine')
+
+    def submit_sync(self, func, *args, name=None, **kwargs):
+        """Run a blocking function on the executor; returns a concurrent.futures.Future."""
+        name = getattr(func, '__qualname__', repr(func)) if name is None else name
+        return self._track(self._executor.submit(func, *args, **kwargs), name, 'function')
+
+    def _wait(self, future, timeout=None):
         try:
-            import nest_asyncio
-            nest_asyncio.apply()
-        except Exception:
-            pass
-    loop = asyncio.get_event_loop()
-    return loop.run_in_executor(None, func, *args, **kwargs)
+            return future.result(timeout=timeout)
+        except KeyboardInterrupt:
+            future.cancel()
+            raise
 
+    def run(self, coro, timeout=None, name=None):
+        """Run a coroutine on the loop and wait for its result (Ctrl-C cancels it)."""
+        return self._wait(self.submit(coro, name=name), timeout=timeout)
+
+    def run_sync(self, func, *args, timeout=None, name=None, **kwargs):
+        """Run a blocking function on the executor and wait for its result."""
+        return self._wait(self.submit_sync(func, *args, name=name, **kwargs), timeout=timeout)
+
+    def create_event(self):
+        """An asyncio.Event bound to this loop (use set_event to set it from another thread)."""
+        return self.run(self._create_event())
+
+    @staticmethod
+    async def _create_event():
+        return asyncio.Event()
+
+    def set_event(self, event):
+        self._loop.call_soon_threadsafe(event.set)
+
+    def tasks(self, verbosity=3):
+        """Running (or pending) tasks as a list of dicts."""
+        now = time.time()
+        with self._lock:
+            tasks = [{'id': task_id, 'name': task['name'], 'kind': task['kind'],
+                      'age': now - task['submitted'], 'running': task['future'].running()}
+                     for task_id, task in self._tasks.items()]
+        if verbosity >= 3:
+            if not tasks:
+                print("No tasks running on {}".format(self.name))
+            for task in tasks:
+                print("{id:4d} {kind:10s} {name:40s} {age:8.1f} s".format(**task))
+        return tasks
+
+    def cancel(self, task_id=None):
+        """Cancel the task task_id (or every task if None)."""
+        with self._lock:
+            futures = [task['future'] for tid, task in self._tasks.items() if task_id is None or tid == task_id]
+        for future in futures:
+            future.cancel()
+        return len(futures)
+
+    def shutdown(self, timeout=5):
+        if not self._loop.is_running():
+            return
+        self.cancel()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=timeout)
+        if sys.version_info >= (3, 9):
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        else:
+            # The queued jobs were cancelled by cancel() above
+            self._executor.shutdown(wait=False)
+
+
+async_loop = AsyncLoopService()
+
+
+def async_run(func, *args, **kwargs):
+    """
+    Run func(*args, **kwargs) on the background event loop (async_loop) and
+    wait for the result. func may be a coroutine function or a regular
+    (blocking) function, which is then run on the loop's executor.
+    """
+    if asyncio.iscoroutinefunction(func):
+        return async_loop.run(func(*args, **kwargs))
+    return async_loop.run_sync(func, *args, **kwargs)
@@ -0,0 +1,109 @@
+print(f'Loading {__file__}')
+
+##### Bulk connection of ophyd devices #####
+# Connecting devices one at a time means that every dead IOC costs a full
+# connection_timeout (see EpicsSignalBase.set_defaults in 00-startup.py).
+# connect_devices() instead lets every channel search go out at once, waits on
+# all of them against one global deadline, and reports whatever did not
+# connect in a single table.
+
+import time
+
+from ophyd.ophydobj import OphydObject
+from ophyd.device import Device
+from ophyd.signal import EpicsSignalBase
+
+
+def _epics_signals(obj, include_lazy=False):
+    """All EPICS signals of an ophyd object (itself if it is a signal)."""
+    if isinstance(obj, EpicsSignalBase):
+        return [obj]
+    if isinstance(obj, Device):
+        return [walk.item for walk in obj.walk_signals(include_lazy=include_lazy)
+                if isinstance(walk.item, EpicsSignalBase)]
+    return []
+
+
+def _signal_pvnames(sig):
+    pvnames = [sig.pvname]
+    setpoint = getattr(sig, 'setpoint_pvname', None)
+    if setpoint is not None and setpoint != sig.pvname:
+        pvnames.append(setpoint)
+    return pvnames
+
+
+def find_devices(namespace=None):
+    """Top-level ophyd objects (no parent) in namespace (default: the user namespace)."""
+    namespace = globals() if namespace is None else namespace
+    devices, seen = {}, set()
+    for name, obj in list(namespace.items()):
+        if name.startswith('_') or not isinstance(obj, OphydObject) or obj.parent is not None:
+            continue
+        if id(obj) not in seen:
+            seen.add(id(obj))
+            devices[name] = obj
+    return devices
+
+
+def connect_devices(devices=None, timeout=10.0, include_lazy=False, poll=0.05, verbosity=3):
+    """
+    Connect many ophyd devices concurrently.
+
+    devices: dict {name: device}, list of devices, or None for every top-level
+        ophyd object in the user namespace
+    timeout: global deadline (s) for all connections together
+    include_lazy: also instantiate (and so connect) lazy components, e.g. the
+        configuration signals of area detector plugins
+
+    Returns a dict with the elapsed time and the disconnected signals, grouped
+    by device: {'elapsed': ..., 'num_signals': ..., 'disconnected': {device: [(signal, pvnames), ...]}}
+    """
+    if devices is None:
+        devices = find_devices()
+    elif not isinstance(devices, dict):
+        devices = {dev.name: dev for dev in devices}
+
+    t0 = time.time()
+
+    # Instantiating the signals creates the channels, i.e. sends the searches
+    pending, seen = {}, set()
+    for name, dev in devices.items():
+        for sig in _epics_signals(dev, include_lazy=include_lazy):
+            if id(sig) not in seen:
+                seen.add(id(sig))
+                pending[sig] = name
+    num_signals = len(pending)
+
+    if ophyd.cl.name == 'pyepics':
+        import epics
+        epics.ca.flush_io()
+
+    # Wait on everything at once
+    while pending and time.time() - t0 < timeout:
+        pending = {sig: name for sig, name in pending.items() if not sig.connected}
+        if pending:
+            time.sleep(poll)
+
+    disconnected = {}
+    for sig, name in pending.items():
+        disconnected.setdefault(name, []).append((sig.name, _signal_pvnames(sig)))
+    report = {'elapsed': time.time() - t0, 'num_signals': num_signals, 'disconnected': disconnected}
+
+    if verbosity >= 3 or (verbosity >= 1 and disconnected):
+        print_connection_report(report)
+
+    return report
+
+
+def print_connection_report(report):
+    num_bad = sum(len(sigs) for sigs in report['disconnected'].values())
+    print("Connected {}/{} signals from {} in {:.2f} s".format(
+        report['num_signals'] - num_bad, report['num_signals'],
+        'all devices' if not num_bad else '{} devices with failures'.format(len(report['disconnected'])),
+        report['elapsed']))
+    if num_bad:
+        print("{:20s} {:40s} {}".format('device', 'signal', 'PV'))
+        for name, sigs in sorted(report['disconnected'].items()):
+            for sig_name, pvnames in sigs:
+                print("{:20s} {:40s} {}".format(name, sig_name, ', '.join(pvnames)))
+                name = ''
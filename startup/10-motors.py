@@ -524,26 +524,21 @@ def wbs():
     print("bsphi = {}".format(bsphi.position))
 
 
+# motor_readback is defined in 11-motor-readback.py
 def wsam():
-    print("smx = {}".format(smx.position))
-    print("smy = {}".format(smy.position))
-    print("sth = {}".format(sth.position))
+    motor_readback.print_positions('sample')
 
 
 def wWAXS():
-    print("WAXSx = {}".format(WAXSx.position))
-    print("WAXSy = {}".format(WAXSy.position))
-    print("WAXSz = {}".format(WAXSz.position))
+    motor_readback.print_positions('WAXS')
 
 
 def wSAXS():
-    print("SAXSx = {}".format(SAXSx.position))
-    print("SAXSy = {}".format(SAXSy.position))
+    motor_readback.print_positions('SAXS')
 
 
 def wMAXS():
-    print("MAXSx = {}".format(MAXSx.position))
-    print("MAXSy = {}".format(MAXSy.position))
+    motor_readback.print_positions('MAXS')
 
 
 def wGONIO():
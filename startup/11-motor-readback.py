@@ -0,0 +1,139 @@
+print(f'Loading {__file__}')
+
+##### Bulk motor readback #####
+# Reading motors one at a time (motor.user_readback.value, caget(prefix + '.OFF'),
+# ...) costs one round trip per PV, and a dead IOC blocks for the full signal
+# timeout. motor_readback reads a list (or named group) of motors at once:
+#   - signals with a monitor (e.g. the EpicsMotor readback, or anything passed to
+#     motor_readback.monitor()) are served from the cached monitor value;
+#   - everything else is read concurrently, each PV with its own timeout;
+#   - the result carries a single timestamp, and lists what could not be read.
+#
+#   motor_readback.positions('sample')
+#   motor_readback.read([smx, smy], fields=('position', 'offset', 'direction'))
+#   motor_readback.define_group('mygroup', [smx, smy, sth])
+#   motor_readback.monitor('mygroup', fields=('position', 'offset'))
+
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+
+class MotorReadback:
+
+    # field: EpicsMotor component
+    FIELDS = {
+        'position': 'user_readback',
+        'setpoint': 'user_setpoint',
+        'offset': 'user_offset',
+        'direction': 'user_offset_dir',
+    }
+
+    def __init__(self, timeout=2.0, max_workers=16):
+        self.timeout = timeout
+        self.groups = {}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='motor_readback')
+        self._monitored = {}  # signal: (value, timestamp)
+        self._last = {}  # group name: last result
+
+    def define_group(self, name, motors):
+        self.groups[name] = list(motors)
+
+    def _motors(self, motors):
+        if isinstance(motors, str):
+            return self.groups[motors]
+        return list(motors)
+
+    def _signal(self, motor, field):
+        return getattr(motor, self.FIELDS[field], None)
+
+    def _cached(self, sig):
+        if sig in self._monitored:
+            return True, self._monitored[sig][0]
+        if getattr(sig, '_auto_monitor', False) and sig.connected:
+            return True, sig.get()
+        return False, None
+
+    def monitor(self, motors, fields=('position',)):
+        """Keep monitors on these motors' fields, so reads are served from cache."""
+        for motor in self._motors(motors):
+            for field in fields:
+                sig = self._signal(motor, field)
+                if sig is not None and sig not in self._monitored:
+                    self._monitored[sig] = (None, None)
+                    sig.subscribe(self._update, event_type=sig.SUB_VALUE, run=True)
+
+    def _update(self, value=None, timestamp=None, obj=None, **kwargs):
+        self._monitored[obj] = (value, timestamp)
+
+    def clear_monitors(self):
+        for sig in self._monitored:
+            sig.clear_sub(self._update)
+        self._monitored = {}
+
+    def _get(self, sig, timeout):
+        return sig.get(timeout=timeout, connection_timeout=timeout)
+
+    def read(self, motors, fields=('position',), timeout=None, max_age=None):
+        """
+        Read fields of many motors at once.
+
+        motors: list of motors, or the name of a group (see define_group)
+        fields: any of MotorReadback.FIELDS
+        timeout: per-PV timeout (s)
+        max_age: for a named group, reuse the previous result if it is younger
+
+        Returns {'time': t, 'values': {motor_name: {field: value}}, 'failed': [(motor_name, field), ...]}
+        (values that could not be read are None).
+        """
+        timeout = self.timeout if timeout is None else timeout
+        group = motors if isinstance(motors, str) else None
+        if group is not None and max_age is not None and group in self._last:
+            last = self._last[group]
+            if time.time() - last['time'] < max_age and last['fields'] == tuple(fields):
+                return last
+
+        t0 = time.time()
+        values, failed, pending = {}, [], {}
+        for motor in self._motors(motors):
+            values[motor.name] = {}
+            for field in fields:
+                sig = self._signal(motor, field)
+                if sig is None:
+                    # Not an EpicsMotor (e.g. a pseudo-motor): fall back to its position
+                    values[motor.name][field] = motor.position if field == 'position' else None
+                    continue
+                cached, value = self._cached(sig)
+                if cached and value is not None:
+                    values[motor.name][field] = value
+                else:
+                    pending[self._executor.submit(self._get, sig, timeout)] = (motor.name, field)
+
+        done, not_done = wait(pending, timeout=timeout + 1.0)
+        for future, (name, field) in pending.items():
+            if future in done and future.exception() is None:
+                values[name][field] = future.result()
+            else:
+                values[name][field] = None
+                failed.append((name, field))
+
+        result = {'time': t0, 'elapsed': time.time() - t0, 'fields': tuple(fields),
+                  'values': values, 'failed': failed}
+        if group is not None:
+            self._last[group] = result
+        return result
+
+    def positions(self, motors, timeout=None, max_age=None):
+        """{motor_name: position} for a list or group of motors."""
+        result = self.read(motors, fields=('position',), timeout=timeout, max_age=max_age)
+        return {name: value['position'] for name, value in result['values'].items()}
+
+    def print_positions(self, motors, timeout=None):
+        for name, position in self.positions(motors, timeout=timeout).items():
+            print("{} = {}".format(name, position))
+
+
+motor_readback = MotorReadback()
+motor_readback.define_group('sample', [smx, smy, sth])
+motor_readback.define_group('SAXS', [SAXSx, SAXSy])
+motor_readback.define_group('WAXS', [WAXSx, WAXSy, WAXSz])
+motor_readback.define_group('MAXS', [MAXSx, MAXSy])
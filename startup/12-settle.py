@@ -0,0 +1,205 @@
+print(f'Loading {__file__}')
+
+##### Readback settling #####
+# Waiting a fixed time.sleep() after a motion is either too long (dead time
+# between exposures) or too short (vibrating detector arm, filter still
+# moving). readback_settle.wait() instead watches the readbacks with monitor
+# subscriptions, and returns as soon as every one of them stayed within
+# tolerance (of its target, or of itself) for a dwell window; it gives up
+# after a hard timeout. How long every device took to settle is recorded,
+# to tune the tolerances:
+#
+#   readback_settle.wait([SAXSx, SAXSy])                     motors: target = setpoint, not moving
+#   readback_settle.wait(filter1.sts, targets=1, tolerance=0.5)
+#   readback_settle.wait(some_signal, tolerance=0.1, dwell=2.0)  no target: just stop changing
+#   yield from readback_settle.wait_plan([smx, smy])        inside a plan
+#   readback_settle.configure(SAXSy, tolerance=0.002, dwell=0.5)
+#   readback_settle.stats_table()
+#
+# A motor stops anywhere within its retry deadband (.RDBD) of the target, so
+# unless a tolerance is given or configured, a motor's tolerance is at least
+# its deadband (readback_settle.tolerance(motor)).
+
+import asyncio
+import collections
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import epics
+from ophyd import EpicsMotor
+
+
+class ReadbackSettle:
+
+    def __init__(self, tolerance=0.005, dwell=0.2, timeout=10.0, max_workers=4):
+        self.defaults = {'tolerance': tolerance, 'dwell': dwell, 'timeout': timeout}
+        self.config = {}  # device name: {'tolerance': ..., 'dwell': ..., 'timeout': ...}
+        self.stats = collections.defaultdict(list)  # device name: [(settle time, settled), ...]
+        self._deadbands = {}  # motor name: retry deadband (None if it could not be read)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='readback_settle')
+
+    def configure(self, device, **kwargs):
+        """Per-device tolerance, dwell and/or timeout (override the defaults)."""
+        self.config.setdefault(getattr(device, 'name', device), {}).update(kwargs)
+
+    def _param(self, device, key, value):
+        if value is not None:
+            return value
+        if key == 'tolerance':
+            return self.tolerance(device)
+        return self.config.get(device.name, {}).get(key, self.defaults[key])
+
+    def deadband(self, motor):
+        """Retry deadband (.RDBD) of an EpicsMotor, read once; None if it cannot be read."""
+        if motor.name not in self._deadbands:
+            try:
+                self._deadbands[motor.name] = abs(epics.caget(motor.prefix + '.RDBD', timeout=1.0))
+            except Exception:
+                self._deadbands[motor.name] = None
+        return self._deadbands[motor.name]
+
+    def tolerance(self, device, tolerance=None):
+        """Tolerance for device: the given one, else the configured one, else the
+        default, widened to the retry deadband for a motor."""
+        if tolerance is not None:
+            return tolerance
+        configured = self.config.get(device.name, {}).get('tolerance')
+        if configured is not None:
+            return configured
+        tolerance = self.defaults['tolerance']
+        if isinstance(device, EpicsMotor):
+            tolerance = max(tolerance, self.deadband(device) or 0.0)
+        return tolerance
+
+    def wait(self, devices, targets=None, tolerance=None, dwell=None, timeout=None, verbosity=1):
+        """
+        Wait until every device is settled: its readback stayed within
+        tolerance of the target for dwell seconds (and, for a motor, it is not
+        moving). Motors default to their setpoint as target; signals without
+        a target only have to stop changing.
+
+        Returns True if everything settled, False on timeout.
+        """
+        if not isinstance(devices, (list, tuple)):
+            devices, targets = [devices], (None if targets is None else [targets])
+        if targets is None:
+            targets = [None] * len(devices)
+
+        start_time = time.time()
+        event = threading.Event()
+        lock = threading.Lock()
+        watched = []
+        for device, target in zip(devices, targets):
+            readback = device.user_readback if isinstance(device, EpicsMotor) else device
+            if target is None and isinstance(device, EpicsMotor):
+                # Not the monitored value: it may not have caught up with a put just done
+                target = device.user_setpoint.get(use_monitor=False)
+            watched.append({
+                'device': device, 'readback': readback, 'target': target,
+                'tolerance': self._param(device, 'tolerance', tolerance),
+                'dwell': self._param(device, 'dwell', dwell),
+                'value': readback.get(), 'reference': None,
+                # last time the readback was seen out of tolerance (or changing, without target)
+                'last_out': start_time,
+            })
+        timeout = max([self._param(device, 'timeout', timeout) for device in devices] or [0])
+
+        for entry in watched:
+            if entry['target'] is None:
+                entry['reference'] = entry['value']
+
+        def update(value=None, obj=None, **kwargs):
+            now = time.time()
+            with lock:
+                for entry in watched:
+                    if entry['readback'] is obj:
+                        entry['value'] = value
+                        if entry['target'] is None and not self._inside(entry, value):
+                            entry['reference'] = value
+                            entry['last_out'] = now
+            event.set()
+
+        for entry in watched:
+            entry['readback'].subscribe(update, event_type=entry['readback'].SUB_VALUE, run=False)
+
+        settled = False
+        try:
+            while True:
+                now = time.time()
+                ready_at = now
+                with lock:
+                    for entry in watched:
+                        moving = isinstance(entry['device'], EpicsMotor) and entry['device'].moving
+                        if moving or not self._inside(entry, entry['value']):
+                            entry['last_out'] = now
+                        ready_at = max(ready_at, entry['last_out'] + entry['dwell'])
+                if all(now - entry['last_out'] >= entry['dwell'] for entry in watched):
+                    settled = True
+                    break
+                if now - start_time >= timeout:
+                    break
+                event.clear()
+                # Woken up by any readback update; the motors' moving flag is checked at least every 0.1 s
+                event.wait(min(max(ready_at - now, 0.005), timeout - (now - start_time), 0.1))
+        finally:
+            for entry in watched:
+                entry['readback'].clear_sub(update)
+
+        elapsed = time.time() - start_time
+        for entry in watched:
+            # Time this device took: until the start of its last (successful) dwell window
+            device_time = min(elapsed, entry['last_out'] + entry['dwell'] - start_time) if settled else elapsed
+            self.stats[entry['device'].name].append((device_time, settled))
+        if not settled and verbosity >= 1:
+            print("WARNING: not settled after {:.1f} s: {}".format(elapsed, ", ".join(
+                "{} = {} (target {})".format(entry['device'].name, entry['value'], entry['target'])
+                for entry in watched)))
+        return settled
+
+    @staticmethod
+    def _inside(entry, value):
+        compare = entry['target'] if entry['target'] is not None else entry['reference']
+        if value is None or compare is None:
+            return False
+        return abs(value - compare) <= entry['tolerance']
+
+    def wait_plan(self, devices, targets=None, tolerance=None, dwell=None, timeout=None, verbosity=1):
+        """Plan version of wait() (the RunEngine keeps running while waiting)."""
+        future = self._executor.submit(self.wait, devices, targets=targets, tolerance=tolerance, dwell=dwell,
+                                       timeout=timeout, verbosity=verbosity)
+        yield from bps.wait_for([lambda: asyncio.wrap_future(future)])
+        return future.result()
+
+    def clear_stats(self):
+        self.stats.clear()
+
+    def stats_table(self, verbosity=3):
+        """Settle time per device: count, mean, min, max, timeouts."""
+        rows = []
+        for name, values in sorted(self.stats.items()):
+            times = [t for t, settled in values if settled]
+            rows.append({
+                'device': name,
+                'count': len(values),
+                'mean': np.mean(times) if times else np.nan,
+                'min': np.min(times) if times else np.nan,
+                'max': np.max(times) if times else np.nan,
+                'timeouts': sum(1 for t, settled in values if not settled),
+            })
+        if verbosity >= 3:
+            print("{:20s} {:>6s} {:>8s} {:>8s} {:>8s} {:>8s}".format('device', 'count', 'mean', 'min', 'max', 'timeouts'))
+            for row in rows:
+                print("{device:20s} {count:6d} {mean:8.3f} {min:8.3f} {max:8.3f} {timeouts:8d}".format(**row))
+        return rows
+
+
+readback_settle = ReadbackSettle()
+
+# Filter box foils: discrete in/out status
+for _filter in filters.values():
+    readback_settle.configure(_filter.sts, tolerance=0.5, dwell=0.3, timeout=5.0)
+
+# Sample exchange robot: long moves, and the next step must never start while the arm is moving
+for _motor in (armx, army, armz, armphi, smx, smy, sth):
+    readback_settle.configure(_motor, timeout=120.0)
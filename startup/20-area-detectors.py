@@ -214,12 +214,8 @@ class PilatusV33(SingleTriggerV33, PilatusDetector):
     )
 
     def setExposureTime(self, exposure_time, verbosity=3):
-        yield from mv(
-            self.cam.acquire_time,
-            exposure_time,
-            # self.cam.acquire_period,
-            # exposure_time + 0.1,
-        )
+        # Skips the write if already set, then waits on the readback monitor (23-detector-exposure.py)
+        yield from exposure_setter.set_plan([self], acquire_time=exposure_time, verbosity=verbosity)
         # caput('XF:11BMB-ES{Det:SAXS}:cam1:AcquireTime', exposure_time)
         # caput('XF:11BMB-ES{Det:SAXS}:cam1:AcquirePeriod', exposure_time+0.1)
 
@@ -256,12 +252,7 @@ class Pilatus800V33(SingleTriggerV33, PilatusDetector):
         return super().stage(*args, **kwargs)
 
     def setExposureTime(self, exposure_time, verbosity=3):
-        yield from mv(
-            self.cam.acquire_time,
-            exposure_time,
-            # self.cam.acquire_period,
-            # exposure_time + 0.1,
-        )
+        yield from exposure_setter.set_plan([self], acquire_time=exposure_time, verbosity=verbosity)
         
         # self.cam.acquire_time.put(exposure_time)
         # self.cam.acquire_period.put(exposure_time+.1)
@@ -363,17 +354,7 @@ class Pilatus2MV33(SingleTriggerV33, PilatusDetector):#, h5=False):
     #         return super().stage(*args, **kwargs)
 
     def setExposureTime(self, exposure_time, verbosity=3):
-        yield from mv(
-            self.cam.acquire_time,
-            exposure_time,
-            # self.cam.acquire_period,
-            # exposure_time + 0.1,
-        )    
-        print('Setting exposure time to ', exposure_time)
-        while self.cam.acquire_time.get() != exposure_time:
-            #yield from asyncio.sleep(0.1)
-            yield from bps.sleep(0.1)
-            print('Waiting for exposure time to be set correctly...')
+        yield from exposure_setter.set_plan([self], acquire_time=exposure_time, verbosity=verbosity)
 
     def setExposurePeriod(self, exposure_period, verbosity=3):
         yield from mv(self.cam.acquire_period, exposure_period)
@@ -403,12 +384,7 @@ class PilatusV33_h5(SingleTriggerV33, PilatusDetector):
     )
 
     def setExposureTime(self, exposure_time, verbosity=3):
-        yield from mv(
-            self.cam.acquire_time,
-            exposure_time,
-            # self.cam.acquire_period,
-            # exposure_time + 0.1,
-        )
+        yield from exposure_setter.set_plan([self], acquire_time=exposure_time, verbosity=verbosity)
         # self.cam.acquire_time.put(exposure_time)
         # self.cam.acquire_period.put(exposure_time+.1)
         # caput('XF:11BMB-ES{Det:PIL2M}:cam1:AcquireTime', exposure_time)
@@ -466,12 +442,7 @@ class Pilatus800V33_h5(SingleTriggerV33, PilatusDetector):
     )
 
     def setExposureTime(self, exposure_time, verbosity=3):
-        yield from mv(
-            self.cam.acquire_time,
-            exposure_time,
-            # self.cam.acquire_period,
-            # exposure_time + 0.1,
-        )
+        yield from exposure_setter.set_plan([self], acquire_time=exposure_time, verbosity=verbosity)
         # self.cam.acquire_time.put(exposure_time)
         # self.cam.acquire_period.put(exposure_time+.1)
         # caput('XF:11BMB-ES{Det:PIL2M}:cam1:AcquireTime', exposure_time)
@@ -527,19 +498,8 @@ if Camera_on==True:
 
     all_standard_pros = [fs2, fs3, fs4]
 
-    time.sleep(1)
-
-    # for cam_number, fs in zip([1,2,3,4], [fs1, fs2, fs3, fs4]):
-    for cam_number, fs in zip([2, 3, 4], [fs2, fs3, fs4]):
-        G, port_dict = fs.get_asyn_digraph()
-        cam = port_dict["cam{:02}".format(cam_number)]
-        for v in port_dict.values():
-            try:
-                if v.nd_array_port.get() == "CAM":
-                    v.nd_array_port.set("cam{:02}".format(cam_number))
-            except AttributeError:
-                pass
-        fs.validate_asyn_ports()
+    # The plugin ports of fs2-fs4 are fixed in 80-connect-devices.py, once
+    # every device is connected
 
 
 
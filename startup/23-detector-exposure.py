@@ -0,0 +1,181 @@
+print(f'Loading {__file__}')
+
+##### Exposure settings for all detectors at once #####
+# Setting acquire_time with mv() and then polling cam.acquire_time every 0.1 s
+# (exact float comparison), one detector after the other, costs several
+# round trips per detector before every exposure.
+# exposure_setter instead:
+#   - keeps monitors on the readbacks, and skips the write entirely when the
+#     value already matches (within atol + rtol*|value|); a cached readback
+#     that does not match is read again from the PV before writing;
+#   - writes all the changed values of all detectors at once;
+#   - waits for the readback monitors to report the new values (no polling),
+#     and raises TimeoutError if they do not within exposure_setter.timeout.
+#
+#   exposure_setter.set(cms.detector, acquire_time=1.0, num_images=1)
+#   exposure_setter.set_many({pilatus2M: {'acquire_time': 1.0}, pilatus800: {'acquire_time': 2.0}})
+#   yield from exposure_setter.set_plan(cms.detector, acquire_time=1.0)    # inside a plan
+#   benchmark_exposure_setter()          in benchmarks/23-detector-exposure.py
+
+import asyncio
+import threading
+import time
+from concurrent.futures import Future
+
+
+class DetectorExposureSetter:
+
+    FIELDS = ('acquire_time', 'acquire_period', 'num_images')
+
+    def __init__(self, atol=1e-4, rtol=1e-6, timeout=10.0):
+        self.atol = atol
+        self.rtol = rtol
+        self.timeout = timeout
+        self._readbacks = {}  # signal: last monitored readback
+        self._waiting = {}  # signal: [(target, callback), ...]
+        self._lock = threading.RLock()
+
+    def matches(self, value, target):
+        if value is None:
+            return False
+        try:
+            return abs(value - target) <= self.atol + self.rtol * abs(target)
+        except TypeError:
+            return value == target
+
+    def _watch(self, sig):
+        with self._lock:
+            if sig in self._readbacks:
+                return
+            self._readbacks[sig] = None
+        sig.subscribe(self._update, event_type=sig.SUB_VALUE, run=True)
+
+    def _update(self, value=None, obj=None, **kwargs):
+        with self._lock:
+            self._readbacks[obj] = value
+            waiting = self._waiting.get(obj, [])
+            reached = [w for w in waiting if self.matches(value, w[0])]
+            self._waiting[obj] = [w for w in waiting if w not in reached]
+        for target, callback in reached:
+            callback(obj)
+
+    def cached(self, detector, field):
+        """Last readback of detector.cam.<field> received from its monitor."""
+        return self._readbacks.get(getattr(detector.cam, field))
+
+    def _is_set(self, sig, target):
+        with self._lock:
+            if self.matches(self._readbacks.get(sig), target):
+                return True
+        # The monitor may not have delivered a value yet, or missed one
+        try:
+            value = sig.get(use_monitor=False)
+        except Exception:
+            return False
+        with self._lock:
+            self._readbacks[sig] = value
+        return self.matches(value, target)
+
+    @staticmethod
+    def check(report):
+        """Raise TimeoutError if a readback of report did not reach its value."""
+        if report['failed']:
+            raise TimeoutError("Readback did not reach the requested value within {:.1f} s for: {}".format(
+                report['elapsed'], ", ".join("{}.cam.{}".format(*f) for f in report['failed'])))
+
+    def set_many(self, targets, timeout=None, wait=True, verbosity=3):
+        """
+        Apply {detector: {field: value}} (fields: acquire_time, acquire_period,
+        num_images; None values are ignored).
+
+        With wait=True, returns a report {'written': [...], 'skipped': [...],
+        'failed': [...], 'elapsed': s} once every readback matches, and raises
+        TimeoutError if timeout expires first; with wait=False, returns a
+        concurrent.futures.Future of the report (see check()).
+        """
+        timeout = self.timeout if timeout is None else timeout
+        t0 = time.time()
+        future = Future()
+        report = {'written': [], 'skipped': [], 'failed': [], 'elapsed': None}
+        pending = {}  # signal: (detector name, field)
+        lock = threading.Lock()
+
+        def finish():
+            report['elapsed'] = time.time() - t0
+            if not future.done():
+                future.set_result(report)
+
+        def reached(sig):
+            with lock:
+                pending.pop(sig, None)
+                last = not pending
+            if last:
+                timer.cancel()
+                finish()
+
+        def expire():
+            with lock:
+                if future.done():
+                    return
+                stale = dict(pending)
+                pending.clear()
+            with self._lock:
+                for sig in stale:
+                    self._waiting[sig] = [w for w in self._waiting.get(sig, []) if w[1] is not reached]
+            report['failed'] = list(stale.values())
+            finish()
+
+        timer = threading.Timer(timeout, expire)
+        timer.daemon = True
+
+        writes = []
+        for detector, fields in targets.items():
+            for field, target in fields.items():
+                if target is None:
+                    continue
+                sig = getattr(detector.cam, field)
+                self._watch(sig)
+                if self._is_set(sig, target):
+                    report['skipped'].append((detector.name, field))
+                    continue
+                with self._lock:
+                    self._waiting.setdefault(sig, []).append((target, reached))
+                with lock:
+                    pending[sig] = (detector.name, field)
+                writes.append((sig, target))
+                report['written'].append((detector.name, field))
+
+        if writes:
+            timer.start()
+            for sig, target in writes:
+                sig.put(target)
+        else:
+            finish()
+
+        if not wait:
+            return future
+
+        report = future.result()
+        self.check(report)
+        if verbosity >= 4:
+            print("Exposure settings: {} written, {} already set ({:.3f} s)".format(
+                len(report['written']), len(report['skipped']), report['elapsed']))
+        return report
+
+    def set(self, detectors, acquire_time=None, acquire_period=None, num_images=None, **kwargs):
+        """Apply the same settings to every detector (see set_many)."""
+        fields = {'acquire_time': acquire_time, 'acquire_period': acquire_period, 'num_images': num_images}
+        return self.set_many({detector: fields for detector in detectors}, **kwargs)
+
+    def set_plan(self, detectors, acquire_time=None, acquire_period=None, num_images=None, timeout=None,
+                 verbosity=3):
+        """Plan version of set()."""
+        future = self.set(detectors, acquire_time=acquire_time, acquire_period=acquire_period,
+                          num_images=num_images, timeout=timeout, wait=False)
+        yield from bps.wait_for([lambda: asyncio.wrap_future(future)])
+        report = future.result()
+        self.check(report)
+        return report
+
+
+exposure_setter = DetectorExposureSetter()
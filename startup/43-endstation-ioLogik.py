@@ -153,7 +153,7 @@ class ioLogik(Device):
 
     def read(self, port):
         if port is not None and port in AO + AO2 + AI + RTD + TC + Relay + DI:
-            return caget(port.sts)
+            return md_snapshot.caget(port.sts)
         else:
             print("The port is not valid")
 
@@ -270,6 +270,65 @@ def archived(output_file, pv_list=None, dt=0.1, verbose=True):
     """
         
     def decorator(func):
+        def save_archive(t_start, t_end):
+            t_start_str = datetime.fromtimestamp(t_start).strftime("%Y-%m-%d %H:%M:%S")
+            t_end_str = datetime.fromtimestamp(t_end).strftime("%Y-%m-%d %H:%M:%S")
+            if verbose:
+                print(f"[Archiver] Recording PVs until {t_end_str}")
+
+            if dt is not None and dt > 0:
+                # Build fixed time grid
+                n_points = int((t_end - t_start) / dt) + 1
+                time_grid = np.linspace(t_start, t_end, n_points)
+                df_sync = pd.DataFrame({'timestamp': time_grid})
+                df_sync['time_elapsed'] = df_sync['timestamp'] - t_start
+
+                # For each PV, interpolate or forward-fill to time grid
+                for pv in pv_list:
+                    try:
+                        df = arvReader.get(pv, t_start_str, t_end_str)
+                        # Convert archiver times to epoch seconds
+                        pv_times = pd.to_datetime(df['time']).astype(np.int64) / 1e9
+                        pv_data = df['data'].to_numpy()
+                        # Interpolate to grid (linear, or nearest if only one point)
+                        if len(pv_times) > 1:
+                            interp_data = np.interp(time_grid, pv_times, pv_data)
+                        elif len(pv_times) == 1:
+                            interp_data = np.full_like(time_grid, pv_data[0])
+                        else:
+                            interp_data = np.full_like(time_grid, np.nan)
+                        df_sync[f"{pv}_data"] = interp_data
+                        if verbose:
+                            print(f"[Archiver] {pv}: {len(pv_data)} points, interpolated to {len(interp_data)}")
+                    except Exception as e:
+                        print(f"[Archiver] Skipping PV '{pv}': {e}")
+                        df_sync[f"{pv}_data"] = np.full_like(time_grid, np.nan)
+
+                # Move time_elapsed to first column
+                cols = ['time_elapsed'] + [c for c in df_sync.columns if c != 'time_elapsed']
+                df_sync = df_sync[cols]
+
+                df_sync.to_csv(output_file, index=False)
+                print(f"[Archiver] Saved {len(df_sync)} rows to {output_file}")
+            
+            else:
+                since = t_start_str
+                until = t_end_str
+                df_all = pd.DataFrame()
+                for pv in pv_list:
+                    try:
+                        df = arvReader.get(pv, since, until)
+                        ep_time = [pd.Timestamp(t).timestamp() for t in df['time']]
+                        pv_data = df['data'].to_numpy()
+                        df_pv = pd.DataFrame({f"{pv}_time": ep_time, f"{pv}_data": pv_data})
+                        df_all = pd.concat([df_all, df_pv], axis=1)
+                        if verbose:
+                            print(f"[Archiver] {pv}: {len(df_pv)} points")
+                    except Exception as e:
+                        print(f"[Archiver] Skipping PV '{pv}': {e}")
+                df_all.to_csv(output_file, index=False)
+                print(f"[Archiver] Saved {len(df_all)} rows to {output_file}")
+
         @wraps(func)
         async def wrapper(*args, **kwargs):
             t_start = time.time()
@@ -285,62 +344,9 @@ def archived(output_file, pv_list=None, dt=0.1, verbose=True):
 
             finally:
                 t_end = time.time()
-                t_end_str = datetime.fromtimestamp(t_end).strftime("%Y-%m-%d %H:%M:%S")
-                if verbose:
-                    print(f"[Archiver] Recording PVs until {t_end_str}")
-
-                if dt is not None and dt > 0:
-                    # Build fixed time grid
-                    n_points = int((t_end - t_start) / dt) + 1
-                    time_grid = np.linspace(t_start, t_end, n_points)
-                    df_sync = pd.DataFrame({'timestamp': time_grid})
-                    df_sync['time_elapsed'] = df_sync['timestamp'] - t_start
-
-                    # For each PV, interpolate or forward-fill to time grid
-                    for pv in pv_list:
-                        try:
-                            df = arvReader.get(pv, t_start_str, t_end_str)
-                            # Convert archiver times to epoch seconds
-                            pv_times = pd.to_datetime(df['time']).astype(np.int64) / 1e9
-                            pv_data = df['data'].to_numpy()
-                            # Interpolate to grid (linear, or nearest if only one point)
-                            if len(pv_times) > 1:
-                                interp_data = np.interp(time_grid, pv_times, pv_data)
-                            elif len(pv_times) == 1:
-                                interp_data = np.full_like(time_grid, pv_data[0])
-                            else:
-                                interp_data = np.full_like(time_grid, np.nan)
-                            df_sync[f"{pv}_data"] = interp_data
-                            if verbose:
-                                print(f"[Archiver] {pv}: {len(pv_data)} points, interpolated to {len(interp_data)}")
-                        except Exception as e:
-                            print(f"[Archiver] Skipping PV '{pv}': {e}")
-                            df_sync[f"{pv}_data"] = np.full_like(time_grid, np.nan)
-
-                    # Move time_elapsed to first column
-                    cols = ['time_elapsed'] + [c for c in df_sync.columns if c != 'time_elapsed']
-                    df_sync = df_sync[cols]
-
-                    df_sync.to_csv(output_file, index=False)
-                    print(f"[Archiver] Saved {len(df_sync)} rows to {output_file}")
-                
-                else:
-                    since = t_start_str
-                    until = t_end_str
-                    df_all = pd.DataFrame()
-                    for pv in pv_list:
-                        try:
-                            df = arvReader.get(pv, since, until)
-                            ep_time = [pd.Timestamp(t).timestamp() for t in df['time']]
-                            pv_data = df['data'].to_numpy()
-                            df_pv = pd.DataFrame({f"{pv}_time": ep_time, f"{pv}_data": pv_data})
-                            df_all = pd.concat([df_all, df_pv], axis=1)
-                            if verbose:
-                                print(f"[Archiver] {pv}: {len(df_pv)} points")
-                        except Exception as e:
-                            print(f"[Archiver] Skipping PV '{pv}': {e}")
-                    df_all.to_csv(output_file, index=False)
-                    print(f"[Archiver] Saved {len(df_all)} rows to {output_file}")
+                # The archiver queries are blocking: run them on the executor so that
+                # other tasks on the event loop (see async_loop in 03-async.py) keep going
+                await asyncio.get_running_loop().run_in_executor(None, save_archive, t_start, t_end)
             return result
         return wrapper
     return decorator
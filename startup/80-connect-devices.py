@@ -0,0 +1,27 @@
+print(f'Loading {__file__}')
+
+# Connect every device defined by the startup files so far in one concurrent
+# pass (see 05-connection-utilities.py), instead of paying a connection
+# timeout per dead IOC later on.
+device_connection_report = connect_devices(timeout=10.0, verbosity=1)
+
+
+if Camera_on == True:
+    # Point the webcam plugins that still read from 'CAM' to their camera's
+    # port. Done after connect_devices() (it used to be in 20-area-detectors.py,
+    # behind a time.sleep(1)), so these reads do not each wait for a connection,
+    # and a camera that is off is skipped instead of blocking.
+    # for cam_number, fs in zip([1,2,3,4], [fs1, fs2, fs3, fs4]):
+    for cam_number, fs in zip([2, 3, 4], [fs2, fs3, fs4]):
+        if not fs.connected:
+            print("WARNING: {} is not connected; its plugin ports were not checked.".format(fs.name))
+            continue
+        G, port_dict = fs.get_asyn_digraph()
+        cam = port_dict["cam{:02}".format(cam_number)]
+        for v in port_dict.values():
+            try:
+                if v.nd_array_port.get() == "CAM":
+                    v.nd_array_port.set("cam{:02}".format(cam_number))
+            except AttributeError:
+                pass
+        fs.validate_asyn_ports()
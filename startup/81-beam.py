@@ -1083,6 +1083,10 @@ class CMSBeam(object):
 
         return energy_keV
 
+    def bragg_to_wavelength(self, Bragg_deg):
+        """Wavelength (in Angstroms) for the monochromator angle Bragg_deg."""
+        return 2.0 * self.dmm_dsp * np.sin(np.radians(Bragg_deg))
+
     def wavelength(self, verbosity=3):
         """
         Returns the current x-ray photon wavelength (in Angstroms).
@@ -1629,7 +1633,11 @@ class CMSBeam(object):
                             )
                         )
 
-            time.sleep(1.0)  # Wait for filter box to settle
+            # Wait for filter box to settle (status of every foil reached, and stable)
+            readback_settle.wait(
+                [filters["filter{:d}".format(i + 1)].sts for i, state in enumerate(filter_settings) if state in (0, 1)],
+                targets=[state for state in filter_settings if state in (0, 1)],
+            )
 
         if verbosity >= 4:
             filters_final = [caget("XF:11BMB-OP{{Fltr:{:d}}}Pos-Sts".format(ifoil)) for ifoil in range(1, 8 + 1)]
@@ -2026,10 +2034,14 @@ class Beamline(object):
     def log_motors(self, motors, verbosity=3, **md):
         log_text = "Motors\n----------------------------------------\nname | position | offset | direction |\n"
 
+        readback = motor_readback.read(motors, fields=("position", "offset", "direction"))
         for motor in motors:
-            offset = float(caget(motor.prefix + ".OFF"))
-            direction = int(caget(motor.prefix + ".DIR"))
-            log_text += "{} | {} | {} | {} |\n".format(motor.name, motor.user_readback.value, offset, direction)
+            values = readback["values"][motor.name]
+            offset = None if values["offset"] is None else float(values["offset"])
+            direction = None if values["direction"] is None else int(values["direction"])
+            log_text += "{} | {} | {} | {} |\n".format(motor.name, values["position"], offset, direction)
+        if readback["failed"]:
+            log_text += "(could not read: {})\n".format(", ".join("{}.{}".format(*f) for f in readback["failed"]))
 
         md_current = {k: v for k, v in RE.md.items()}
         md_current.update(md)
@@ -3004,12 +3016,20 @@ class CMS_Beamline(Beamline):
 
     def get_md(self, prefix=None, **md):
         md_current = self.md.copy()
-        md_current["calibration_energy_keV"] = float(round(self.beam.energy(verbosity=0), 3))
-        md_current["calibration_wavelength_A"] = float(round(self.beam.wavelength(verbosity=0), 5))
 
-        h, v = self.beam.size(verbosity=0)
-        md_current["beam_size_x_mm"] = h
-        md_current["beam_size_y_mm"] = v
+        # All the motors at once (see 11-motor-readback.py)
+        slit = self.beam.beam_defining_slit
+        positions = motor_readback.positions(
+            [mono_bragg, slit.xg, slit.yg, SAXSx, SAXSy, WAXSx, WAXSy, WAXSz, smx, smy, sth]
+        )
+
+        if positions[mono_bragg.name] is not None:
+            wavelength_A = self.beam.bragg_to_wavelength(positions[mono_bragg.name])
+            md_current["calibration_energy_keV"] = float(round(self.beam.hc_over_e_keVpA / wavelength_A, 3))
+            md_current["calibration_wavelength_A"] = float(round(wavelength_A, 5))
+
+        md_current["beam_size_x_mm"] = positions[slit.xg.name]
+        md_current["beam_size_y_mm"] = positions[slit.yg.name]
 
         # temperarily block it for bad communication. 17:30, 071617
         # h, v = self.beam.divergence(verbosity=0)
@@ -3020,14 +3040,8 @@ class CMS_Beamline(Beamline):
 
         # md_current['detector'] = self.detector
 
-        md_current["motor_SAXSx"] = SAXSx.user_readback.value
-        md_current["motor_SAXSy"] = SAXSy.user_readback.value
-        md_current["motor_WAXSx"] = WAXSx.user_readback.value
-        md_current["motor_WAXSy"] = WAXSy.user_readback.value
-        md_current["motor_WAXSz"] = WAXSz.user_readback.value
-        md_current["motor_smx"] = smx.user_readback.value
-        md_current["motor_smy"] = smy.user_readback.value
-        md_current["motor_sth"] = sth.user_readback.value
+        for motor in [SAXSx, SAXSy, WAXSx, WAXSy, WAXSz, smx, smy, sth]:
+            md_current["motor_" + motor.name] = positions[motor.name]
 
         # md_current['motor_bsx'] = bsx.user_readback.value
         # md_current['motor_bsy'] = bsy.user_readback.value
@@ -149,9 +149,73 @@ class LiveTable_Custom(LiveTable):
         super().stop(doc)
 
 
+class _LazyValues(dict):
+    """
+    dict of statistics where some values are only computed when first asked
+    for (then kept until set_lazy/put replaces them).
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._lazy = {}  # key: function computing the value
+
+    def put(self, key, value):
+        self._lazy.pop(key, None)
+        self[key] = value
+
+    def set_lazy(self, key, func):
+        dict.pop(self, key, None)
+        self._lazy[key] = func
+
+    def __missing__(self, key):
+        if key not in self._lazy:
+            raise KeyError(key)
+        value = self._lazy.pop(key)()
+        self[key] = value
+        return value
+
+    def _materialize(self):
+        for key in list(self._lazy):
+            self[key]
+
+    def __contains__(self, key):
+        return dict.__contains__(self, key) or key in self._lazy
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def keys(self):
+        self._materialize()
+        return dict.keys(self)
+
+    def items(self):
+        self._materialize()
+        return dict.items(self)
+
+    def values(self):
+        self._materialize()
+        return dict.values(self)
+
+    def __iter__(self):
+        self._materialize()
+        return dict.__iter__(self)
+
+    def __len__(self):
+        return dict.__len__(self) + len(self._lazy)
+
+    def __repr__(self):
+        self._materialize()
+        return dict.__repr__(self)
+
+
 class LiveStat(CallbackBase):
     """
     Calculate simple statistics for an (x,y) curve.
+
+    The statistics are incremental: each point updates the running sums (COM)
+    and the running max/min in O(1). The half-max (HM, HMi) and the value at
+    the COM need the whole curve: they are only computed when result.values
+    is asked for them (and cached until the next point).
     """
 
     # Note: Follows the style/naming of class LiveFit(CallbackBase),
@@ -166,11 +230,21 @@ class LiveStat(CallbackBase):
         self.ydata = []
         self.xdata = []
 
+        # Running statistics; the points are also kept in growing arrays
+        self._n = 0
+        self._x = np.empty(64)
+        self._y = np.empty(64)
+        self._sum_y = 0.0
+        self._sum_xy = 0.0
+        self._i_max = None
+        self._i_min = None
+        self._half_max_cache = {}  # stat: (number of points, x0, y0)
+
         class Result(object):
             pass
 
         self.result = Result()  # Dummy object to replicate the hiearchy expected for LiveFit
-        self.result.values = {}
+        self.result.values = _LazyValues()
 
     def event(self, doc):
         if self.y_name not in doc["data"]:
@@ -181,6 +255,7 @@ class LiveStat(CallbackBase):
 
         self.ydata.append(y)
         self.xdata.append(x)
+        self._add(x, y)
 
         if self.update_every is not None:
             i = doc["seq_num"]
@@ -193,44 +268,90 @@ class LiveStat(CallbackBase):
 
         super().event(doc)
 
+    def _add(self, x, y):
+        if self._n == len(self._x):
+            self._x = np.concatenate((self._x, np.empty(len(self._x))))
+            self._y = np.concatenate((self._y, np.empty(len(self._y))))
+        i = self._n
+        self._x[i] = x
+        self._y[i] = y
+        self._n += 1
+
+        self._sum_y += y
+        self._sum_xy += x * y
+        # First occurrence wins, as with argmax/argmin
+        if self._i_max is None or y > self._y[self._i_max]:
+            self._i_max = i
+        if self._i_min is None or y < self._y[self._i_min]:
+            self._i_min = i
+
+    @property
+    def xs(self):
+        return self._x[: self._n]
+
+    @property
+    def ys(self):
+        return self._y[: self._n]
+
     def update_fit(self, stat):
-        xs = np.asarray(self.xdata)
-        ys = np.asarray(self.ydata)
+        values = self.result.values
 
         if stat == "max":
-            idx = np.argmax(ys)
-            x0 = xs[idx]
-            y0 = ys[idx]
+            x0, y0 = self._x[self._i_max], self._y[self._i_max]
 
-            self.result.values["x_max"] = x0
-            self.result.values["y_max"] = y0
+            values.put("x_max", x0)
+            values.put("y_max", y0)
 
         elif stat == "min":
-            idx = np.argmin(ys)
-            x0 = xs[idx]
-            y0 = ys[idx]
+            x0, y0 = self._x[self._i_min], self._y[self._i_min]
 
-            self.result.values["x_min"] = x0
-            self.result.values["y_min"] = y0
+            values.put("x_min", x0)
+            values.put("y_min", y0)
 
         elif stat == "COM":
-            x0 = np.sum(xs * ys) / np.sum(ys)
-            y0 = np.interp(x0, xs, ys)
+            x0 = self._sum_xy / self._sum_y
+            y0 = lambda: np.interp(x0, self.xs, self.ys)
 
-            self.result.values["x_COM"] = x0
-            self.result.values["y_COM"] = y0
+            values.put("x_COM", x0)
+            values.set_lazy("y_COM", y0)
 
-        elif stat == "HM":
-            """Half-maximum, using the point(s) closest to HM."""
-            idx_max = np.argmax(ys)
-            half_max = 0.5 * ys[idx_max]
+        elif stat in ("HM", "HMi"):
+            x0 = lambda: self.half_max(stat)[0]
+            y0 = lambda: self.half_max(stat)[1]
+
+            values.set_lazy("x_HM", x0)
+            values.set_lazy("y_HM", y0)
+
+        else:
+            print("ERROR: Statistic type {} is not recognized.".format(stat))
+            return
+
+        # print('Update_fit: ({:g}, {:g})'.format(x0, y0))
+        for key, value in (("x0", x0), ("y0", y0)):
+            if callable(value):
+                values.set_lazy(key, value)
+            else:
+                values.put(key, value)
+
+    def half_max(self, stat="HM"):
+        """(x, y) at half-maximum; computed from the whole curve, once per new point."""
+        cached = self._half_max_cache.get(stat)
+        if cached is not None and cached[0] == self._n:
+            return cached[1:]
+
+        xs = self.xs
+        ys = self.ys
+        idx_max = self._i_max
+        half_max = 0.5 * ys[idx_max]
 
-            l = None
-            r = None
+        l = None
+        r = None
 
-            left = ys[:idx_max]
-            right = ys[idx_max:]
+        left = ys[:idx_max]
+        right = ys[idx_max:]
 
+        if stat == "HM":
+            """Half-maximum, using the point(s) closest to HM."""
             if len(left) > 0 and left.min() < half_max:
                 idx_hm = np.abs(left - half_max).argmin()
                 l = xs[:idx_max][idx_hm]
@@ -238,58 +359,28 @@ class LiveStat(CallbackBase):
                 idx_hm = np.abs(right - half_max).argmin()
                 r = xs[idx_max:][idx_hm]
 
-            if l is None:
-                x0 = r
-            elif r is None:
-                x0 = l
-            else:
-                x0 = np.average([l, r])
-
-            if x0 is None:
-                x0 = np.average(xs)
-
-            y0 = np.interp(x0, xs, ys)
-            self.result.values["x_HM"] = x0
-            self.result.values["y_HM"] = y0
-
-        elif stat == "HMi":
+        else:
             """Half-maximum, with averaging of values near HW."""
-            idx_max = np.argmax(ys)
-            half_max = 0.5 * ys[idx_max]
-
-            l = None
-            r = None
-
-            left = ys[:idx_max]
-            right = ys[idx_max:]
-
             if len(left) > 0 and left.min() < half_max and left.max() > half_max:
                 idx = np.where(left < half_max)[0][-1]
-                l = np.average([xs[:idx_max][idx], xs[:idx_max][idx + 1]])
+                l = np.average([xs[idx], xs[idx + 1]])  # the crossing can be next to the maximum
             if len(right) > 0 and right.min() < half_max and right.max() > half_max:
                 idx = np.where(right < half_max)[0][0]
                 r = np.average([xs[idx_max:][idx - 1], xs[idx_max:][idx]])
 
-            if l is None:
-                x0 = r
-            elif r is None:
-                x0 = l
-            else:
-                x0 = np.average([l, r])
-
-            if x0 is None:
-                x0 = np.average(xs)
-
-            y0 = np.interp(x0, xs, ys)
-            self.result.values["x_HM"] = x0
-            self.result.values["y_HM"] = y0
-
+        if l is None:
+            x0 = r
+        elif r is None:
+            x0 = l
         else:
-            print("ERROR: Statistic type {} is not recognized.".format(stat))
+            x0 = np.average([l, r])
 
-        # print('Update_fit: ({:g}, {:g})'.format(x0, y0))
-        self.result.values["x0"] = x0
-        self.result.values["y0"] = y0
+        if x0 is None:
+            x0 = np.average(xs)
+
+        y0 = np.interp(x0, xs, ys)
+        self._half_max_cache[stat] = (self._n, x0, y0)
+        return x0, y0
 
 
 class LiveStatPlot(LivePlot):
@@ -507,6 +598,84 @@ class LivePlot_Custom(LivePlot):
         self.legend = self.ax.legend(loc=0, title=self.legend_title)  # .draggable()
 
 
+##### Background fitting #####
+# LiveFit re-fits the model after every point, on the thread that runs the
+# callbacks, so the fit (and the plot redraw) is dead time added to every
+# point of an alignment scan. With fit_interval, LiveFit_Custom hands the data
+# to a FitWorker instead: it keeps only the latest data (events coalesce),
+# fits at most every fit_interval s in a background thread, and each result
+# replaces livefit.result (LiveFitPlot_Custom draws a new result at its next
+# event). The final fit, at stop, is still done synchronously, so fit_scan
+# moves to the x0 of all the points.
+#
+#   fit_scan(smy, 1.0, 21, fit='sigmoid_r', fit_interval=0.2)
+#   benchmark_fit_worker()      (benchmarks/91-fit_scan.py) per-point dead time with and without the worker
+
+import threading
+import time
+
+class FitWorker:
+
+    def __init__(self, fit, on_result, interval=0.2):
+        self.fit = fit  # fit(data) -> result
+        self.on_result = on_result  # on_result(data, result), called from the worker thread
+        self.interval = interval
+        self.stats = {"submitted": 0, "fits": 0, "fit_time": 0.0}
+        self._cond = threading.Condition()
+        self._pending = None
+        self._busy = False
+        self._closing = False
+        self._last_start = 0.0
+        self._thread = None
+
+    def submit(self, data):
+        """Fit this data as soon as allowed (replaces data not yet fitted)."""
+        with self._cond:
+            self._pending = data
+            self.stats["submitted"] += 1
+            if self._thread is None or not self._thread.is_alive():
+                self._closing = False
+                self._thread = threading.Thread(target=self._run, name="fit_worker", daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._pending is None and not self._closing:
+                    self._cond.wait()
+                if self._pending is None:
+                    return
+                wait = self._last_start + self.interval - time.time()
+                if wait > 0:
+                    self._cond.wait(wait)
+                    continue
+                data, self._pending = self._pending, None
+                self._busy = True
+                self._last_start = time.time()
+            try:
+                result = self.fit(data)
+                if result is not None:
+                    self.on_result(data, result)
+            except Exception as ex:
+                print("WARNING: background fit failed ({})".format(repr(ex)))
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self.stats["fits"] += 1
+                    self.stats["fit_time"] += time.time() - self._last_start
+                    self._cond.notify_all()
+
+    def drain(self, close=True, timeout=None):
+        """Drop the data not yet fitted, and wait for the fit in progress (its
+        result is delivered before this returns). With close, the thread ends."""
+        with self._cond:
+            self._pending = None
+            self._closing = close
+            self._cond.notify_all()
+            self._cond.wait_for(lambda: not self._busy, timeout=timeout)
+
+
 class LiveFitPlot_Custom(LiveFitPlot):
     """
     Add a plot to an instance of LiveFit.
@@ -559,6 +728,7 @@ class LiveFitPlot_Custom(LiveFitPlot):
 
         self.y_guess = 0
         self.scan_range = scan_range
+        self._plotted_result = None
 
     def get_scan_range(self, overscan=0.0):
         if self.scan_range is None:
@@ -583,21 +753,29 @@ class LiveFitPlot_Custom(LiveFitPlot):
         self.x0_line.set_linewidth(2.0)
 
         self.livefit.event(doc)
-        if self.livefit.result is not None:
-            # self.y_data = self.livefit.result.best_fit
-            # self.x_data = self.livefit.independent_vars_data[self.__x_key]
+        # With a background fit, the result may be the same as at the last
+        # event (or arrive later): only redraw for a new one
+        result = self.livefit.result
+        if result is not None and result is not self._plotted_result:
+            self.draw_result(result)
 
-            x_start, x_stop, span = self.get_scan_range(overscan=0.25)
+        # Intentionally override LivePlot.event. Do not call super().
 
-            self.x_data = np.linspace(x_start, x_stop, num=200, endpoint=True, retstep=False)
-            self.y_data = self.livefit.result.eval(x=self.x_data)
+    def draw_result(self, result):
+        # self.y_data = self.livefit.result.best_fit
+        # self.x_data = self.livefit.independent_vars_data[self.__x_key]
 
-            self.update_plot()
+        x_start, x_stop, span = self.get_scan_range(overscan=0.25)
 
-        # Intentionally override LivePlot.event. Do not call super().
+        self.x_data = np.linspace(x_start, x_stop, num=200, endpoint=True, retstep=False)
+        self.y_data = result.eval(x=self.x_data)
+        self._plotted_result = result
+
+        self.update_plot()
 
     def start(self, doc):
         super().start(doc)
+        self._plotted_result = None
 
         for line in self.ax.lines:
             if hasattr(line, "custom_tag_x0") and line.custom_tag_x0:
@@ -611,10 +789,18 @@ class LiveFitPlot_Custom(LiveFitPlot):
         self.x0_line.custom_tag_x0 = True
 
     def update_plot(self):
-        x0 = self.livefit.result.values["x0"]
+        x0 = self._plotted_result.values["x0"]
         self.x0_line.set_xdata([x0])
         super().update_plot()
 
+    def stop(self, doc):
+        # The final fit (with all the points) is done here
+        self.livefit.stop(doc)
+        result = self.livefit.result
+        if result is not None and result is not self._plotted_result:
+            self.draw_result(result)
+        # Intentionally override LivePlot.stop. Do not call super().
+
 
 class LiveFit_Custom(LiveFit):
     """
@@ -635,6 +821,10 @@ class LiveFit_Custom(LiveFit):
     update_every : int or None, optional
         How often to recompute the fit. If `None`, do not compute until the
         end. Default is 1 (recompute after each new point).
+    fit_interval : float or None, optional
+        If given, the fits during the scan are done in a background thread
+        (FitWorker), at most every fit_interval s, with the latest points.
+        The final fit, at stop, is always done synchronously.
 
     Attributes
     ----------
@@ -649,6 +839,7 @@ class LiveFit_Custom(LiveFit):
         scan_range,
         update_every=1,
         background=None,
+        fit_interval=None,
     ):
         self.x_start = min(scan_range)
         self.x_stop = max(scan_range)
@@ -686,6 +877,46 @@ class LiveFit_Custom(LiveFit):
             update_every=update_every,
         )
 
+        self.fit_worker = None if fit_interval is None else FitWorker(self._fit, self._fit_done, interval=fit_interval)
+        self._run_number = 0  # results of the fits of a previous run are dropped
+        self._final = False
+
+    def start(self, doc):
+        self._run_number += 1
+        super().start(doc)
+
+    def update_fit(self):
+        if self.fit_worker is None or self._final:
+            super().update_fit()
+        elif len(self.ydata) >= len(self.model.param_names):
+            self.fit_worker.submit((self._run_number, list(self.ydata),
+                                    {k: list(v) for k, v in self.independent_vars_data.items()}))
+
+    def fit_data(self, ydata, **independent_vars_data):
+        """Fit the model, with the initial guesses of this LiveFit, to these data."""
+        kwargs = {}
+        kwargs.update(independent_vars_data)
+        kwargs.update(self.init_guess)
+        return self.model.fit(ydata, **kwargs)
+
+    def _fit(self, data):
+        run_number, ydata, independent_vars_data = data
+        return self.fit_data(ydata, **independent_vars_data)
+
+    def _fit_done(self, data, result):
+        if data[0] == self._run_number:
+            self.result = result
+
+    def stop(self, doc):
+        if self.fit_worker is not None:
+            # No background fit may replace the final one
+            self.fit_worker.drain()
+        self._final = True
+        try:
+            super().stop(doc)
+        finally:
+            self._final = False
+
     def get_model(self, model_name):
         if model_name == "gauss":
 
@@ -880,6 +1111,111 @@ class LiveFit_Custom(LiveFit):
         return init_guess
 
 
+##### Adaptive point placement #####
+# fit_scan and fit_edge spread num points evenly over the span, so most of
+# them measure the flat baseline around the edge or peak being looked for.
+# With adaptive=True, they start with a coarse pass (num points), then add one
+# point at a time where the fit model is the most uncertain (widest 1-sigma
+# band of the model, from the fit covariance: the edge, the top of the peak),
+# until the uncertainty on x0 is below x0_tolerance, or max_num points were
+# measured. All of it is a single run (adaptive_fit_plan): the callbacks see
+# an ordinary scan, with the points out of order.
+#
+#   fit_scan(smy, 0.6, 7, fit='sigmoid_r', adaptive=True, x0_tolerance=0.002)
+#   fit_edge(smy, 0.6, 7, adaptive=True)
+#   benchmark_adaptive_scan()       (benchmarks/91-fit_scan.py) points and x0 error vs. evenly spaced scans
+
+
+def _adaptive_x0_error(result):
+    if result is None or "x0" not in result.params:
+        return np.inf
+    stderr = result.params["x0"].stderr
+    return stderr if stderr is not None and np.isfinite(stderr) else np.inf
+
+
+def _adaptive_next_position(result, positions, candidates, min_spacing):
+    """Candidate (at least min_spacing from the measured positions) where the model is the most uncertain."""
+    distance = np.min(np.abs(candidates[:, None] - np.asarray(positions)[None, :]), axis=1)
+    free = distance >= min_spacing
+    if not np.any(free):
+        return None
+    uncertainty = None
+    if result is not None and result.covar is not None:
+        try:
+            uncertainty = result.eval_uncertainty(x=candidates)
+        except Exception:
+            uncertainty = None
+    if uncertainty is None or not np.all(np.isfinite(uncertainty)):
+        # No covariance (the fit did not converge): fill the largest gap
+        return candidates[np.argmax(distance)]
+    return candidates[np.argmax(np.where(free, uncertainty, -np.inf))]
+
+
+def adaptive_fit_plan(detectors, motor, start, stop, livefit, num=7, max_num=None, x0_tolerance=None,
+                      num_candidates=201, md=None):
+    """
+    Single run: num evenly spaced points over [start, stop], then one point
+    at a time where the model of livefit (a LiveFit_Custom) is the most
+    uncertain, until the uncertainty on x0 is below x0_tolerance (default:
+    span/200) or max_num points (default: 3*num) were measured.
+
+    livefit is only used here for its model and initial guesses (the plan
+    fits the data itself after each point); subscribe it as well to get
+    livefit.result at the end of the run.
+
+    Returns the last fit (lmfit.ModelResult, or None if it failed).
+    """
+    span = abs(stop - start)
+    max_num = 3 * num if max_num is None else max_num
+    x0_tolerance = span / 200.0 if x0_tolerance is None else x0_tolerance
+    candidates = np.linspace(start, stop, num_candidates)
+    min_spacing = span / (2.0 * max(max_num - 1, 1))
+    devices = list(detectors) + [motor]
+
+    _md = {
+        "detectors": [det.name for det in detectors],
+        "motors": [motor.name],
+        "plan_name": "adaptive_fit_plan",
+        "plan_args": {"detectors": list(map(repr, detectors)), "motor": repr(motor), "start": start,
+                      "stop": stop, "num": num, "max_num": max_num, "x0_tolerance": x0_tolerance},
+        "hints": {"dimensions": [([motor.name], "primary")]},
+    }
+    _md.update(md or {})
+
+    xdata, ydata = [], []
+    results = [None]
+
+    def measure(position):
+        yield from bps.mv(motor, position)
+        readings = yield from bps.trigger_and_read(devices)
+        xdata.append(readings[motor.name]["value"] if motor.name in readings else position)
+        ydata.append(readings[livefit.y]["value"])
+
+    def fit():
+        try:
+            return livefit.fit_data(ydata, x=xdata)
+        except Exception as ex:
+            print("WARNING: fit failed after {} points ({})".format(len(xdata), repr(ex)))
+            return None
+
+    @bpp.stage_decorator(devices)
+    @bpp.run_decorator(md=_md)
+    def inner():
+        for position in np.linspace(start, stop, num):
+            yield from measure(position)
+        while True:
+            results[0] = fit()
+            if _adaptive_x0_error(results[0]) < x0_tolerance or len(xdata) >= max_num:
+                break
+            position = _adaptive_next_position(results[0], xdata, candidates, min_spacing)
+            if position is None:
+                break
+            yield from measure(position)
+
+    yield from inner()
+    return results[0]
+
+
 import lmfit
 
 
@@ -898,6 +1234,10 @@ def fit_scan(
     wait_time=None,
     md={},
     save_flg=0,
+    fit_interval=0.2,
+    adaptive=False,
+    max_num=None,
+    x0_tolerance=None,
 ):
     """
     Scans the specified motor, and attempts to fit the data as requested.
@@ -922,6 +1262,15 @@ def fit_scan(
         A baseline/background underlying the fit function can be specified.
         (In fact, a sequence of summed background functions can be supplied.)
             constant, linear
+    fit_interval : None or float
+        Fit in the background, at most every fit_interval s, during the scan
+        (None: fit after every point, as the callbacks come). The final fit
+        is always done with all the points.
+    adaptive : bool
+        Measure num evenly spaced points, then add points where the fit is
+        the most uncertain, until the uncertainty on x0 is below x0_tolerance
+        (default: span/200) or max_num points (default: 3*num) were measured
+        (see adaptive_fit_plan). Needs a fit model (not a stat).
     md : dict, optional
         metadata
     """
@@ -946,6 +1295,10 @@ def fit_scan(
     span = abs(stop - start)
     # positions, dp = np.linspace(start, stop, num, endpoint=True, retstep=True)
 
+    if adaptive and (fit is None or fit in ["max", "min", "COM", "HM", "HMi"] or type(fit) is list):
+        print("WARNING: adaptive scans need a fit model; doing an evenly spaced scan.")
+        adaptive = False
+
     if detectors is None:
         # detselect(pilatus_name, suffix='_stats4_total')
         detectors = get_beamline().detector
@@ -985,7 +1338,11 @@ def fit_scan(
         livetable = LiveTable([motor] + list(detectors))
         # subs.append(livetable)
         # liveplot = LivePlot_Custom(plot_y, motor.name, ax=ax)
-        liveplot = LivePlot(plot_y, motor.name, ax=ax)
+        if adaptive:
+            # Points come out of order: no line between them
+            liveplot = LivePlot(plot_y, motor.name, ax=ax, marker="o", linestyle="none")
+        else:
+            liveplot = LivePlot(plot_y, motor.name, ax=ax)
         subs.append(liveplot)
 
     if wait_time is not None:
@@ -1008,6 +1365,7 @@ def fit_scan(
             {"x": motor.name},
             scan_range=[start, stop],
             background=background,
+            fit_interval=fit_interval,
         )
 
         # livefitplot = LiveFitPlot(livefit, color='k')
@@ -1020,6 +1378,7 @@ def fit_scan(
     md["measure_type"] = "fit_scan_{}".format(motor.name)
     md["fit_function"] = fit
     md["fit_background"] = background
+    md["fit_adaptive"] = adaptive
 
     # cms.SAXS.detector.setExposureTime(exposure_time)
     RE(cms.SAXS.detector.setExposureTime(exposure_time))
@@ -1030,7 +1389,12 @@ def fit_scan(
     # Perform the scan
 
     bec.disable_plots()
-    RE(scan(list(detectors), motor, start, stop, num, per_step=per_step, md=md), subs)
+    if adaptive:
+        plan = adaptive_fit_plan(list(detectors), motor, start, stop, livefit, num=num, max_num=max_num,
+                                 x0_tolerance=x0_tolerance, md=md)
+    else:
+        plan = scan(list(detectors), motor, start, stop, num, per_step=per_step, md=md)
+    RE(plan, subs)
     bec.enable_plots()
     # RE(scan(list(detectors), motor, start, stop, num, per_step=per_step, md=md), [liveplot, livefit, livefitplot])
     # RE(scan(list(detectors), motor, start, stop, num, per_step=per_step, md=md), [livefit])
@@ -1075,6 +1439,9 @@ def fit_edge(
     toggle_beam=True,
     wait_time=None,
     md={},
+    adaptive=False,
+    max_num=None,
+    x0_tolerance=None,
 ):
     """
     Optimized fit_scan for finding a (decreasing) step-edge.
@@ -1089,6 +1456,10 @@ def fit_edge(
         distances relative to the current position for the start and end.
     num : int
         The number of scan points.
+    adaptive : bool
+        Measure num evenly spaced points, then add points where a sigmoid_r
+        fit is the most uncertain, until the uncertainty on x0 is below
+        x0_tolerance or max_num points were measured (see adaptive_fit_plan).
     md : dict, optional
         metadata
     """
@@ -1144,7 +1515,11 @@ def fit_edge(
         fig.canvas.manager.set_window_title(title)
         ax = fig.gca()
 
-        liveplot = LivePlot_Custom(plot_y, motor.name, ax=ax)
+        if adaptive:
+            # Points come out of order: no line between them
+            liveplot = LivePlot_Custom(plot_y, motor.name, ax=ax, marker="o", linestyle="none")
+        else:
+            liveplot = LivePlot_Custom(plot_y, motor.name, ax=ax)
         # liveplot = LivePlot(plot_y, motor.name, ax=ax)
         subs.append(liveplot)
 
@@ -1153,11 +1528,18 @@ def fit_edge(
 
     md["plan_header_override"] = "fit_edge"
     md["scan"] = "fit_edge"
+    md["fit_adaptive"] = adaptive
 
     # Perform the scan
     bec.disable_table()
     bec.disable_plots()
-    RE(scan(list(detectors), motor, start, stop, num, md=md), subs)
+    if adaptive:
+        # The model only places the points; the analysis below is unchanged
+        placement = LiveFit_Custom("sigmoid_r", plot_y, {"x": motor.name}, scan_range=[start, stop])
+        RE(adaptive_fit_plan(list(detectors), motor, start, stop, placement, num=num, max_num=max_num,
+                             x0_tolerance=x0_tolerance, md=md), subs)
+    else:
+        RE(scan(list(detectors), motor, start, stop, num, md=md), subs)
     # RE(scan(list(detectors), motor, start, stop, num, md=md), [liveplot, livetable] )
     bec.enable_plots()
     bec.enable_table()
@@ -1166,6 +1548,12 @@ def fit_edge(
     if plot_y == "pilatus2m-1_stats4_total" or plot_y == "pilatus2m-1_stats3_total":
         remove_last_Pilatus_series()
 
+    if adaptive:
+        # The analysis expects the points in scan order
+        order = np.argsort(livetable.xdata)
+        livetable.xdata = [livetable.xdata[i] for i in order]
+        livetable.ydata = [livetable.ydata[i] for i in order]
+
     x0_guess = np.average(livetable.xdata)
 
     # Determine x0 from half-max (HM) analysis
@@ -1423,10 +1811,132 @@ def setMonitor(monitor=["stats1", "stats2", "stats3", "stats4"]):
 
     pilatus2M.read_attrs = ["tiff"] + monitor
 
+##### Fly-scan monitor accumulation #####
+# The monitors of a fly scan (frame counters, ROI totals) update from the CA
+# threads at every frame. FlyAccumulator keeps them in preallocated NumPy ring
+# buffers (timestamp, value, and an optional extra value read in the callback,
+# e.g. the motor position), and aligns them with np.searchsorted afterwards.
+#
+#   acc = FlyAccumulator(capacity=20000)
+#   acc.watch('frame', det.cam.array_counter, extra=lambda: mtr.position)
+#   acc.watch_roi(det, 4)            'roi4' (frame counter) and 'roi4_total'
+#   acc.subscribe() ... acc.unsubscribe()
+#   acc.roi_totals(4, dt=0.05)       ROI4 total of every ROI4 frame
+#   benchmark_fly_accumulator()      in benchmarks/91-fit_scan.py
+
+import collections
+import threading
+
+
+class FlyAccumulator:
+
+    def __init__(self, capacity=100000):
+        self.capacity = capacity
+        self._channels = collections.OrderedDict()  # name: channel (buffers, lock, subscription)
+
+    def watch(self, name, signal, extra=None):
+        """Record the updates of signal as channel name; extra() is also recorded at each update."""
+        self._channels[name] = {
+            'signal': signal,
+            'extra': extra,
+            'cid': None,
+            'count': 0,
+            'timestamp': np.empty(self.capacity),
+            'value': np.empty(self.capacity),
+            'extra_value': np.empty(self.capacity) if extra is not None else None,
+            'lock': threading.Lock(),
+        }
+
+    def watch_roi(self, det, roi):
+        stats = getattr(det, 'stats{}'.format(roi))
+        self.watch('roi{}'.format(roi), stats.array_counter)
+        self.watch('roi{}_total'.format(roi), stats.total)
+
+    def callback(self, name):
+        """Monitor callback writing to channel name."""
+        channel = self._channels[name]
+        capacity = self.capacity
+
+        def update(value=None, timestamp=None, **kwargs):
+            extra = channel['extra']() if channel['extra'] is not None else None
+            with channel['lock']:
+                i = channel['count'] % capacity
+                channel['timestamp'][i] = timestamp
+                channel['value'][i] = value
+                if extra is not None:
+                    channel['extra_value'][i] = extra
+                channel['count'] += 1
+
+        return update
+
+    def subscribe(self):
+        for name, channel in self._channels.items():
+            channel['cid'] = channel['signal'].subscribe(self.callback(name))
+
+    def unsubscribe(self):
+        for channel in self._channels.values():
+            if channel['cid'] is not None:
+                channel['signal'].unsubscribe(channel['cid'])
+                channel['cid'] = None
+
+    def reset(self):
+        for channel in self._channels.values():
+            with channel['lock']:
+                channel['count'] = 0
+
+    def count(self, name):
+        return self._channels[name]['count']
+
+    def _ordered(self, name, key):
+        channel = self._channels[name]
+        with channel['lock']:
+            count, data = channel['count'], channel[key]
+            if count <= self.capacity:
+                return data[:count].copy()
+            i = count % self.capacity
+            return np.concatenate((data[i:], data[:i]))
+
+    def timestamps(self, name):
+        return self._ordered(name, 'timestamp')
+
+    def values(self, name):
+        return self._ordered(name, 'value')
+
+    def extra(self, name):
+        return self._ordered(name, 'extra_value')
+
+    @staticmethod
+    def align(frame_timestamps, total_timestamps, totals, dt=0.0):
+        """For every frame, the last total received before it (total timestamps
+        taken dt earlier); 0 before the first total."""
+        totals = np.asarray(totals, dtype=float)
+        idx = np.searchsorted(np.asarray(total_timestamps) - dt, frame_timestamps, side='left') - 1
+        if len(totals) == 0:
+            return np.zeros(len(idx))
+        return np.where(idx >= 0, totals[np.maximum(idx, 0)], 0.0)
+
+    def roi_totals(self, roi, dt=0.0):
+        return self.align(self.timestamps('roi{}'.format(roi)), self.timestamps('roi{}_total'.format(roi)),
+                          self.values('roi{}_total'.format(roi)), dt=dt)
+
+    @staticmethod
+    def midpoints(positions):
+        """Position of each frame: midway between the positions at its start and end."""
+        positions = np.asarray(positions, dtype=float)
+        result = positions.copy()
+        result[1:] = 0.5 * (positions[1:] + positions[:-1])
+        return result
+
+    @staticmethod
+    def last(values, num):
+        return values[max(len(values) - num, 0):]
+
+
 #software flyscan
-def flyscan(det, mtr, start, stop, step, exp_time):
+def flyscan(det, mtr, start, stop, step, exp_time, rois=(2, 3, 4)):
     # motors: smy (+/- 2), sth (+/- 1)
     # det = pilatus2M
+    # Returns the frame positions, then the total of each ROI in rois at every frame
 
     # It takes 0.4 to 0.7 s longer to complete motion, so let's add 1 s for now
     #   It should be computed/estimated more accurately
@@ -1438,69 +1948,19 @@ def flyscan(det, mtr, start, stop, step, exp_time):
     det.tiff.disable_on_stage()
     det.stats4.total.kind = "hinted"
 
-    frame_numbers = []
-    frame_timestamps = []
-    frame_mtr_pos = []
-    frame_roi2_ts = []
-    frame_roi3_ts = []
-    frame_roi4_ts = []
-
-    frame_roi2_total_ts = []
-    frame_roi3_total_ts = []
-    frame_roi4_total_ts = []
-    frame_roi2_total = []
-    frame_roi3_total = []
-    frame_roi4_total = []
-
-    def accumulate(value, old_value, timestamp, **kwargs):
-        frame_numbers.append(value)
-        frame_timestamps.append(timestamp)
-        frame_mtr_pos.append(mtr.position)
-
-    def accumulate_roi2(value, old_value, timestamp, **kwargs):
-        frame_roi2_ts.append(timestamp)
-
-    def accumulate_roi3(value, old_value, timestamp, **kwargs):
-        frame_roi3_ts.append(timestamp)
-
-    def accumulate_roi4(value, old_value, timestamp, **kwargs):
-        frame_roi4_ts.append(timestamp)
-
-    def accumulate_roi2_total(value, old_value, timestamp, **kwargs):
-        frame_roi2_total_ts.append(timestamp)
-        frame_roi2_total.append(value)
-
-    def accumulate_roi3_total(value, old_value, timestamp, **kwargs):
-        frame_roi3_total_ts.append(timestamp)
-        frame_roi3_total.append(value)
-
-    def accumulate_roi4_total(value, old_value, timestamp, **kwargs):
-        frame_roi4_total_ts.append(timestamp)
-        frame_roi4_total.append(value)
+    accumulator = FlyAccumulator(capacity=2 * num + 100)
+    accumulator.watch("frame", det.cam.array_counter, extra=lambda: mtr.position)
+    for roi in rois:
+        accumulator.watch_roi(det, roi)
 
     def inner():
-        # if det == None:
-        #     det = cms.detector[0]
-        detector = pilatus2M
-        cid = detector.cam.array_counter.subscribe(accumulate)
-        cid2 = detector.stats2.array_counter.subscribe(accumulate_roi2)
-        cid3 = detector.stats3.array_counter.subscribe(accumulate_roi3)
-        cid4 = detector.stats4.array_counter.subscribe(accumulate_roi4)
-        cid2a = detector.stats2.total.subscribe(accumulate_roi2_total)
-        cid3a = detector.stats3.total.subscribe(accumulate_roi3_total)
-        cid4a = detector.stats4.total.subscribe(accumulate_roi4_total)
+        accumulator.subscribe()
         try:
-            yield from bps.trigger(detector, group="fake_fly")
+            yield from bps.trigger(det, group="fake_fly")
             yield from bps.abs_set(mtr, stop, group="fake_fly")
             yield from bps.wait(group="fake_fly")
         finally:
-            detector.cam.array_counter.unsubscribe(cid)
-            detector.stats2.array_counter.unsubscribe(cid2)
-            detector.stats3.array_counter.unsubscribe(cid3)
-            detector.stats4.array_counter.unsubscribe(cid4)
-            detector.stats2.total.unsubscribe(cid2a)
-            detector.stats3.total.unsubscribe(cid3a)
-            detector.stats4.total.unsubscribe(cid4a)
+            accumulator.unsubscribe()
 
     @bpp.reset_positions_decorator(
         [det.cam.num_images, det.cam.acquire_time, det.cam.acquire_period, mtr.velocity]
@@ -1534,50 +1994,20 @@ def flyscan(det, mtr, start, stop, step, exp_time):
     # cbs = [lp]
     # yield from bpp.subs_wrapper(inner2, cbs)
 
-    def trim_list(v, num):
-        n_first = max(len(v) - num, 0)
-        return v[n_first:]
-
-    def set_total_values(frame_roi_ts, total_ts, total, dt=0.25 * exp_time):
-        total_ts = [_ - dt for _ in total_ts]
-        vals = [0] * len(frame_roi_ts)
-        n_current, v_current = 0, 0
-        for n in range(len(vals)):
-            if n_current < len(total_ts) and total_ts[n_current] < frame_roi_ts[n]:
-                v_current = total[n_current]
-                n_current += 1
-            vals[n] = v_current
-        return vals
-
     # 0-th frame is discarded during trimming
-    _ = frame_mtr_pos
-    frame_mtr_pos = [_[0]] + [(_[n] + _[n - 1]) / 2 for n in range(1, len(_))]
-
-    total_roi2 = set_total_values(frame_roi2_ts, frame_roi2_total_ts, frame_roi2_total)
-    total_roi3 = set_total_values(frame_roi3_ts, frame_roi3_total_ts, frame_roi3_total)
-    total_roi4 = set_total_values(frame_roi4_ts, frame_roi4_total_ts, frame_roi4_total)
-
     num = num - 1  # Discard the 1st point
 
-    frame_numbers = trim_list(frame_numbers, num)
-    frame_timestamps = trim_list(frame_timestamps, num)
-    frame_mtr_pos = trim_list(frame_mtr_pos, num)
-    frame_roi2_ts = trim_list(frame_roi2_ts, num)
-    frame_roi3_ts = trim_list(frame_roi3_ts, num)
-    frame_roi4_ts = trim_list(frame_roi4_ts, num)
-    total_roi2 = trim_list(total_roi2, num)
-    total_roi3 = trim_list(total_roi3, num)
-    total_roi4 = trim_list(total_roi4, num)
+    frame_mtr_pos = FlyAccumulator.last(FlyAccumulator.midpoints(accumulator.extra("frame")), num)
+    totals = [FlyAccumulator.last(accumulator.roi_totals(roi, dt=0.25 * exp_time), num) for roi in rois]
 
     print("**********************************************************************")
 
-    print(f"POSITION, TOTAL_ROI2, TOTAL_ROI3, TOTAL_ROI4")
+    print("POSITION, " + ", ".join("TOTAL_ROI{}".format(roi) for roi in rois))
     for n, pos in enumerate(frame_mtr_pos):
-        print(f"{pos:11.5f} {total_roi2[n]:11.1f} {total_roi3[n]:11.1f} {total_roi4[n]:11.1f}")
+        print(f"{pos:11.5f}" + "".join(f" {total[n]:11.1f}" for total in totals))
     print("**********************************************************************")
 
-    return frame_mtr_pos, total_roi2, total_roi3, total_roi4
-
+    return (frame_mtr_pos, *totals)
 
 
 def align_motor(det, mtr, start, stop, step, exp_time, select_roi=4,  mtr_max_velocity=0.08, fitting=True, model_type='peak', plot=True):
@@ -1866,6 +2296,180 @@ def fly_scan(
     #     return livefit.result
 
 
+##### Fly sweep + fit #####
+# One fly sweep (flyscan) across the range, then a fit of the ROI total along
+# the sweep: used by SampleGISAXS_Generic.align_fly in place of the fit_scan /
+# fit_edge step scans. The exposure time is chosen from the step and the
+# motor's maximum velocity, and doubled (slower sweep) when the signal is too
+# weak to fit. The result says whether the fit is good enough to be used.
+#
+#   result = fly_fit(smy, 0.6, num=21, model='edge')
+#   result = fly_fit(sth, 0.4, num=41, model='max', select_roi=3)
+#   yield from fly_fit_plan(pilatus2M, sth, 0.8, 21, 'COM')    inside a plan
+
+FLY_FIT_DEFAULTS = {
+    "max_velocity": 0.08,  # motor units/s (as align_motor)
+    "min_exposure": 0.05,  # s per frame
+    "max_exposure": 0.8,  # s per frame, when the exposure is increased for a weak signal
+    "min_counts": 50,  # signal (max - min of the ROI total) needed for a fit
+    "max_deviation": 0.06,  # mean |residual| / signal of a good fit (as fit_edge)
+}
+
+
+def fly_exposure(span, num, max_velocity=None, min_exposure=None):
+    """(step, exposure time, velocity) of a sweep of num frames across span: as
+    fast as the motor allows, each frame lasting at least min_exposure."""
+    max_velocity = FLY_FIT_DEFAULTS["max_velocity"] if max_velocity is None else max_velocity
+    min_exposure = FLY_FIT_DEFAULTS["min_exposure"] if min_exposure is None else min_exposure
+    step = abs(span) / num
+    exposure_time = max(min_exposure, step / max_velocity)
+    return step, exposure_time, step / exposure_time
+
+
+def _fly_sigmoid_r(x, x0, sigma, prefactor, base):
+    return base + prefactor / (1 + np.exp((x - x0) / sigma))
+
+
+def _fly_gauss(x, x0, sigma, prefactor, base):
+    return base + prefactor * np.exp(-((x - x0) ** 2) / (2 * sigma**2))
+
+
+def fly_fit_values(positions, values, model, min_counts=None, max_deviation=None):
+    """
+    Fit the ROI totals of a fly sweep. model is 'edge' (decreasing step, x0 at
+    half-max, as fit_edge), 'max' (peak: center of a Gaussian) or 'COM' (center
+    of mass above the baseline, checked with a Gaussian fit).
+
+    Returns {'x0', 'x_max', 'y_max', 'signal', 'deviation', 'ok'}; ok if the
+    signal is strong enough, the fit deviation small enough and x0 within the
+    sweep.
+    """
+    min_counts = FLY_FIT_DEFAULTS["min_counts"] if min_counts is None else min_counts
+    max_deviation = FLY_FIT_DEFAULTS["max_deviation"] if max_deviation is None else max_deviation
+    x = np.asarray(positions, dtype=float)
+    y = np.asarray(values, dtype=float)
+    order = np.argsort(x)
+    x, y = x[order], y[order]
+
+    result = {"x0": None, "x_max": None, "y_max": None, "signal": 0.0, "deviation": np.inf, "ok": False}
+    if len(x) < 5:
+        return result
+    y_min, y_max = np.min(y), np.max(y)
+    signal = y_max - y_min
+    x_span = x[-1] - x[0]
+    result.update(x_max=x[np.argmax(y)], y_max=y_max, signal=signal)
+    if signal <= 0 or x_span <= 0:
+        return result
+
+    try:
+        if model == "edge":
+            # Half-max crossing as the initial guess (y decreasing with x)
+            x0_guess = np.interp(-(y_min + 0.5 * signal), -y, x)
+            lm_model = Model(_fly_sigmoid_r)
+            params = lm_model.make_params(x0=x0_guess, sigma=x_span * 0.02, prefactor=signal, base=y_min)
+        else:
+            lm_model = Model(_fly_gauss)
+            params = lm_model.make_params(x0=x[np.argmax(y)], sigma=x_span * 0.1, prefactor=signal, base=y_min)
+        params["x0"].set(min=x[0], max=x[-1])
+        params["sigma"].set(min=x_span * 1e-4, max=x_span)
+        with np.errstate(over="ignore"):
+            lm_result = lm_model.fit(y, params, x=x)
+    except Exception as ex:
+        print("WARNING: fly sweep fit failed ({})".format(ex))
+        return result
+
+    x0 = lm_result.params["x0"].value
+    if model == "COM":
+        weights = y - y_min
+        x0 = np.sum(x * weights) / np.sum(weights)
+    elif model == "max":
+        result["x_max"] = x0
+    result["x0"] = x0
+    result["deviation"] = np.mean(np.abs(y - lm_result.best_fit)) / signal
+    result["ok"] = bool(
+        signal >= min_counts and result["deviation"] <= max_deviation and x[0] <= x0 <= x[-1]
+    )
+    return result
+
+
+def fly_fit_plan(det, mtr, span, num, model, select_roi=4, exposure_time=None, max_velocity=None, min_exposure=None,
+                 max_exposure=None, min_counts=None, max_deviation=None, verbosity=3):
+    """
+    Fly sweep of mtr across span (centered on the current position; or
+    [start, stop] relative to it) in num frames, then fit (fly_fit_values) the
+    total of ROI select_roi. The exposure time is chosen by fly_exposure
+    unless given; if the signal is too weak, the sweep is redone with twice the
+    exposure time, up to max_exposure.
+
+    The motor ends at the fitted x0 if the fit is good, else at its initial
+    position. Returns the fit result, plus 'exposure_time', 'velocity',
+    'sweeps' and 'elapsed'.
+    """
+    if select_roi not in (2, 3, 4):
+        raise ValueError("select_roi must be 2, 3 or 4 (the ROIs flyscan reads), not {!r}".format(select_roi))
+    min_counts = FLY_FIT_DEFAULTS["min_counts"] if min_counts is None else min_counts
+    max_exposure = FLY_FIT_DEFAULTS["max_exposure"] if max_exposure is None else max_exposure
+    start_time = time.time()
+
+    initial_position = yield from bps.rd(mtr)
+    if type(span) is list:
+        start, stop = initial_position + span[0], initial_position + span[1]
+    else:
+        start, stop = initial_position - span / 2.0, initial_position + span / 2.0
+
+    step, auto_exposure, velocity = fly_exposure(stop - start, num, max_velocity=max_velocity,
+                                                 min_exposure=min_exposure)
+    exposure_time = auto_exposure if exposure_time is None else exposure_time
+    sweeps = 0
+
+    @bpp.finalize_decorator(final_plan=shutter_off)
+    def inner():
+        nonlocal exposure_time, sweeps
+        yield from shutter_on(verbosity=0)
+        while True:
+            if verbosity >= 3:
+                print("Fly sweep {} from {:.4f} to {:.4f}: {} frames of {:.3f} s ({:.4f}/s)".format(
+                    mtr.name, start, stop, num, exposure_time, step / exposure_time))
+            sweeps += 1
+            pos, roi2, roi3, roi4 = yield from flyscan(det, mtr, start, stop, step, exposure_time)
+            roi = {2: roi2, 3: roi3, 4: roi4}[select_roi]
+            result = fly_fit_values(pos, roi, model, min_counts=min_counts, max_deviation=max_deviation)
+            if result["signal"] >= min_counts or exposure_time * 2 > max_exposure:
+                return result
+            exposure_time *= 2
+            if verbosity >= 3:
+                print("  signal {:.0f} < {}: sweeping again with {:.3f} s frames".format(
+                    result["signal"], min_counts, exposure_time))
+
+    result = yield from bpp.stage_wrapper(inner(), [det])
+    yield from bps.mv(mtr, result["x0"] if result["ok"] else initial_position)
+
+    result.update(exposure_time=exposure_time, velocity=step / exposure_time, sweeps=sweeps,
+                  elapsed=time.time() - start_time)
+    if verbosity >= 3:
+        if result["ok"]:
+            print("Fly fit {} ({}): x0 = {:.4f}, deviation {:.1f}% ({:.1f} s)".format(
+                mtr.name, model, result["x0"], 100 * result["deviation"], result["elapsed"]))
+        else:
+            print("Fly fit {} ({}): poor fit (signal {:.0f}, deviation {:.1f}%), back to {:.4f}".format(
+                mtr.name, model, result["signal"], 100 * result["deviation"], initial_position))
+    return result
+
+
+def fly_fit(motor, span, num=21, model="max", detector=None, select_roi=4, verbosity=3, **kwargs):
+    """fly_fit_plan, run by the RunEngine (as fit_scan); returns its result."""
+    if detector is None:
+        detector = get_beamline().detector[0]
+    result = {}
+
+    def plan():
+        result.update((yield from fly_fit_plan(detector, motor, span, num, model, select_roi=select_roi,
+                                               verbosity=verbosity, **kwargs)))
+
+    RE(plan())
+    return result
+
+
 from bluesky.plan_stubs import one_1d_step
 from collections import ChainMap
 import bluesky.plans as bp
@@ -215,7 +215,11 @@ def wh_motors(motor=None, verbosity=3):
 
     flux_expected = None
 
+    # All the motors at once (see 11-motor-readback.py)
+    readback = motor_readback.read(motor_list, fields=("position", "offset", "direction"))
+
     for motor in motor_list:
+        values = {k: (np.nan if v is None else v) for k, v in readback["values"][motor.name].items()}
         # print('motor: {} -- position: {} -- limits: {} -- offset: -- {} direction: {}'.format(motor.name, motor.position, motor.limits, motor.user_offset.value, sth.direction_of_travel.value))
 
         # print('|{:12}  | {:6.6} | {} | {:11.11} | {:5} |'.format(motor.name, motor.position, motor.limits, motor.user_offset.value, sth.direction_of_travel.value))
@@ -224,11 +228,11 @@ def wh_motors(motor=None, verbosity=3):
         print(
             "|{:12}|{:12.6}|{:12.6}|{:12.6}|{:12}|{:12}|".format(
                 motor.name,
-                motor.position,
+                values["position"],
                 motor.low_limit,
                 motor.high_limit,
-                motor.user_offset.value,
-                motor.user_offset_dir.value,
+                values["offset"],
+                values["direction"],
             )
         )
     if verbosity >= 1:
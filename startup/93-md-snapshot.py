@@ -0,0 +1,157 @@
+print(f'Loading {__file__}')
+
+##### Sample metadata snapshot #####
+# Building the metadata and filename of one exposure (get_md, get_savename,
+# get_attribute, get_naming_string, get_measurement_md) reads the same
+# temperature, ioLogik and MFC PVs several times, one caget round trip each.
+#
+# Those reads go through md_snapshot.caget (plain caget is left alone). While a
+# snapshot is open (these methods open one, nested calls share it), its values
+# are cached for md_snapshot.ttl seconds. The PVs that were read the last time
+# are fetched again in one concurrent batch (epics.caget_many) when the next
+# snapshot opens, so a whole exposure costs one batch of reads. PVs matching
+# md_snapshot.uncached (the detector file numbers) are always read directly,
+# and a PV that does not answer a batch is dropped from the batches.
+#
+#   md_snapshot.enabled = False          read every PV every time (old behavior)
+#   md_snapshot.ttl = 1.0                how long a value may be reused (s)
+#   with count_pv_reads() as counts:     count the PV reads done in the block
+#   benchmark_md_snapshot(sam)           (benchmarks/93-md-snapshot.py) PV reads/time per exposure, with and without
+
+import collections
+import contextlib
+import functools
+import threading
+import time
+
+import epics
+from ophyd.signal import EpicsSignalBase
+
+
+class MetadataSnapshot:
+
+    def __init__(self, ttl=1.0, prefetch=(), uncached=(), enabled=True, timeout=2.0):
+        self.ttl = ttl
+        self.enabled = enabled
+        self.timeout = timeout
+        self.prefetch = set(prefetch)  # always read at the start of a snapshot
+        self.uncached = list(uncached)  # PV name substrings never served from the cache
+        self.learned = set()  # read during earlier snapshots
+        self.stats = collections.Counter()
+        self._cache = {}  # pvname: (time, value)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def is_active(self):
+        return self.enabled and getattr(self._local, 'depth', 0) > 0
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def is_cached(self, pvname):
+        return not any(pattern in pvname for pattern in self.uncached)
+
+    def _fresh(self, pvname, now):
+        entry = self._cache.get(pvname)
+        return entry is not None and now - entry[0] < self.ttl
+
+    def _fill(self):
+        now = time.time()
+        with self._lock:
+            pvnames = sorted(pv for pv in self.prefetch | self.learned if not self._fresh(pv, now))
+        if not pvnames:
+            return
+        values = epics.caget_many(pvnames, timeout=self.timeout)
+        self.stats['batches'] += 1
+        self.stats['reads'] += len(pvnames)
+        with self._lock:
+            for pvname, value in zip(pvnames, values):
+                if value is None:
+                    # Do not keep batching a PV that no longer answers
+                    if pvname in self.prefetch:
+                        print('md_snapshot: {} did not answer, no longer prefetched'.format(pvname))
+                    self.prefetch.discard(pvname)
+                    self.learned.discard(pvname)
+                else:
+                    self._cache[pvname] = (now, value)
+
+    @contextlib.contextmanager
+    def active(self):
+        """Open a snapshot (nested snapshots share the outermost one)."""
+        depth = getattr(self._local, 'depth', 0)
+        if depth == 0 and self.enabled:
+            self._fill()
+        self._local.depth = depth + 1
+        try:
+            yield self
+        finally:
+            self._local.depth = depth
+
+    def wrap(self, func):
+        """Decorator: run func inside a snapshot."""
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with self.active():
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    def caget(self, pvname, *args, **kwargs):
+        """Drop-in for epics.caget, served from the snapshot when one is open."""
+        if args or kwargs or not self.is_active() or not self.is_cached(pvname):
+            self.stats['reads'] += 1
+            return epics.caget(pvname, *args, **kwargs)
+
+        now = time.time()
+        with self._lock:
+            if self._fresh(pvname, now):
+                self.stats['hits'] += 1
+                return self._cache[pvname][1]
+
+        value = epics.caget(pvname, timeout=self.timeout)
+        self.stats['reads'] += 1
+        if value is not None:
+            with self._lock:
+                self._cache[pvname] = (now, value)
+                self.learned.add(pvname)
+        return value
+
+    def caput(self, pvname, *args, **kwargs):
+        """Drop-in for epics.caput; forgets the cached value of pvname."""
+        with self._lock:
+            self._cache.pop(pvname, None)
+        return epics.caput(pvname, *args, **kwargs)
+
+
+md_snapshot = MetadataSnapshot(
+    prefetch=['XF:11BM-ES{{Env:01-Chan:{}}}T:C-I'.format(probe) for probe in 'ABCD'],
+    uncached=['FileNumber'],
+)
+
+
+@contextlib.contextmanager
+def count_pv_reads():
+    """
+    Count the PV reads done inside the block: caget round trips (including
+    the ones of snapshot batches), snapshot cache hits, and get() of ophyd
+    signals without a monitor.
+    """
+    counts = collections.Counter()
+    stats_start = md_snapshot.stats.copy()
+    get = EpicsSignalBase.get
+
+    @functools.wraps(get)
+    def counting_get(sig, *args, **kwargs):
+        if not getattr(sig, '_auto_monitor', False):
+            counts['signal_get'] += 1
+        return get(sig, *args, **kwargs)
+
+    EpicsSignalBase.get = counting_get
+    try:
+        yield counts
+    finally:
+        EpicsSignalBase.get = get
+        for key in ('reads', 'hits', 'batches'):
+            counts['caget' if key == 'reads' else key] = md_snapshot.stats[key] - stats_start[key]
@@ -0,0 +1,220 @@
+print(f'Loading {__file__}')
+
+##### Run -> file index #####
+# Finding the file of frame ii of a run meant looping over h.documents() to
+# find the resource document, once per frame (and per detector), each time
+# fetching the run again from Tiled. resource_index instead goes through the
+# documents of a run once, and keeps for each detector the resources and the
+# frames (datums) they hold; the index of the last runs is kept (LRU, by uid).
+# Runs taken in this session are indexed live from the RunEngine documents,
+# so they need no fetch at all.
+#
+#   resource_index.path(uid, 'pilatus800k-1', frame=10)   absolute path of one frame
+#   resource_index.paths(uid, 'waxs')                      all the frames of a detector
+#   resource_index.num_frames(uid, pilatus2M)
+#   benchmark_resource_index()                             (benchmarks/93-resource-index.py) per-frame scans vs the index
+
+import collections
+import threading
+from bisect import bisect_right
+
+
+class _RunFiles:
+    """Files of one run: the resources of each detector and how many frames they hold."""
+
+    DEFAULT_TEMPLATE = '%s%s_%6.6d.tiff'
+
+    def __init__(self):
+        self.start = None
+        self.resources = collections.OrderedDict()  # resource uid: resource document
+        self.points = collections.defaultdict(set)  # resource uid: {point_number}
+        self.owner = {}  # resource uid: detector name
+        self._datum_resource = {}  # datum_id: resource uid
+        self._descriptor_keys = {}  # descriptor uid: {data key: detector name}
+        self._detectors = None
+
+    def add(self, name, doc):
+        if name == 'start':
+            self.start = doc
+        elif name == 'resource':
+            self.resources[doc['uid']] = doc
+        elif name == 'datum':
+            self._datum(doc['datum_id'], doc['resource'], doc.get('datum_kwargs', {}).get('point_number'))
+        elif name == 'datum_page':
+            point_numbers = doc.get('datum_kwargs', {}).get('point_number', [None] * len(doc['datum_id']))
+            for datum_id, point_number in zip(doc['datum_id'], point_numbers):
+                self._datum(datum_id, doc['resource'], point_number)
+        elif name == 'descriptor':
+            self._descriptor_keys[doc['uid']] = {key: detector for detector, keys in doc.get('object_keys', {}).items()
+                                                 for key in keys}
+        elif name == 'event':
+            self._event(doc['descriptor'], doc['data'])
+        elif name == 'event_page':
+            self._event(doc['descriptor'], {key: values[0] for key, values in doc['data'].items() if values})
+        self._detectors = None
+
+    def _datum(self, datum_id, resource, point_number):
+        self._datum_resource[datum_id] = resource
+        if point_number is not None:
+            self.points[resource].add(point_number)
+
+    def _event(self, descriptor, data):
+        keys = self._descriptor_keys.get(descriptor, {})
+        for key, value in data.items():
+            resource = self._datum_resource.get(value) if isinstance(value, str) else None
+            if resource is not None and key in keys:
+                self.owner.setdefault(resource, keys[key])
+
+    def _resource_frames(self, resource):
+        doc = self.resources[resource]
+        fpp = int(doc.get('resource_kwargs', {}).get('frame_per_point', 1) or 1)
+        points = self.points.get(resource)
+        if points:
+            return (max(points) + 1) * fpp
+        # No datum recorded (or not returned): fall back to what the run was asked for
+        return int(self.start.get('measure_series_num_frames', fpp)) if self.start else fpp
+
+    @property
+    def detectors(self):
+        """{detector name: [(first frame, number of frames, resource document), ...]}"""
+        if self._detectors is None:
+            start_detectors = self.start.get('detectors', []) if self.start else []
+            detectors = collections.OrderedDict()
+            for resource, doc in self.resources.items():
+                owner = self.owner.get(resource)
+                if owner is None and len(start_detectors) == 1:
+                    owner = start_detectors[0]
+                entries = detectors.setdefault(owner, [])
+                first = entries[-1][0] + entries[-1][1] if entries else 0
+                entries.append((first, self._resource_frames(resource), doc))
+            self._detectors = detectors
+        return self._detectors
+
+    def _entries(self, detector):
+        detectors = self.detectors
+        if detector in detectors:
+            return detectors[detector]
+        if len(detectors) == 1 and (detector is None or None in detectors):
+            # Only one set of files in the run, not tied to a detector (the old code took the first resource)
+            return next(iter(detectors.values()))
+        raise KeyError("No files for detector '{}' in run {} (detectors with files: {})".format(
+            detector, self.start.get('uid') if self.start else None, list(detectors)))
+
+    def num_frames(self, detector=None):
+        first, num, doc = self._entries(detector)[-1]
+        return first + num
+
+    def _format(self, doc, frame):
+        kwargs = doc.get('resource_kwargs', {})
+        directory = '{}/{}/'.format(doc.get('root', '').rstrip('/'), doc['resource_path'].strip('/'))
+        return kwargs.get('template', self.DEFAULT_TEMPLATE) % (directory, kwargs['filename'], frame)
+
+    def path(self, detector=None, frame=0):
+        entries = self._entries(detector)
+        first, num, doc = entries[max(bisect_right([e[0] for e in entries], frame) - 1, 0)]
+        return self._format(doc, frame - first)
+
+    def paths(self, detector=None):
+        return [self._format(doc, i) for first, num, doc in self._entries(detector) for i in range(num)]
+
+
+class RunFileIndex:
+    """
+    (uid, detector, frame) -> absolute file path, with the file index of the
+    last maxsize runs kept in memory.
+
+    detector can be a detector, its name, or one of the 'saxs'/'waxs'/'maxs'
+    aliases used for the link names; None works for runs with a single detector.
+    """
+
+    ALIASES = {
+        'saxs': 'pilatus2m-1',
+        'waxs': 'pilatus800k-1',
+        'maxs': 'pilatus800k-2',
+    }
+
+    def __init__(self, maxsize=64, broker=None):
+        self.maxsize = maxsize
+        self.broker = broker  # None: use db
+        self.stats = collections.Counter()
+        self._runs = collections.OrderedDict()  # uid: _RunFiles
+        self._live = {}  # uid: _RunFiles of runs in progress
+        self.last_uid = None  # last run indexed live
+        self._lock = threading.Lock()
+
+    def _broker(self):
+        return db if self.broker is None else self.broker
+
+    def _store(self, uid, run):
+        with self._lock:
+            self._runs[uid] = run
+            self._runs.move_to_end(uid)
+            while len(self._runs) > self.maxsize:
+                self._runs.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._runs.clear()
+
+    def __call__(self, name, doc):
+        """RunEngine callback: index the runs of this session as they are taken."""
+        if name == 'start':
+            self._live[doc['uid']] = _RunFiles()
+        run_uid = doc.get('run_start') if name != 'start' else doc['uid']
+        if name in ('datum', 'datum_page', 'event', 'event_page') and run_uid is None:
+            # These documents do not carry the run uid; there is only one run open at a time
+            run_uid = next(reversed(self._live), None) if self._live else None
+        run = self._live.get(run_uid)
+        if run is None:
+            return
+        run.add(name, doc)
+        if name == 'stop':
+            self._store(run_uid, self._live.pop(run_uid))
+            self.last_uid = run_uid
+
+    def get(self, uid):
+        """_RunFiles of a run (uid, scan_id or negative index, as for db[...])."""
+        if isinstance(uid, str):
+            with self._lock:
+                run = self._runs.get(uid)
+                if run is not None:
+                    self._runs.move_to_end(uid)
+            if run is not None:
+                self.stats['hits'] += 1
+                return run
+
+        h = self._broker()[uid]
+        full_uid = h.start['uid']
+        with self._lock:
+            run = self._runs.get(full_uid)
+            if run is not None:
+                self._runs.move_to_end(full_uid)
+        if run is not None:
+            self.stats['hits'] += 1
+            return run
+
+        self.stats['builds'] += 1
+        run = _RunFiles()
+        for name, doc in h.documents():
+            run.add(name, doc)
+        if run.start is None:
+            run.start = h.start
+        self._store(full_uid, run)
+        return run
+
+    def _detector(self, detector):
+        name = getattr(detector, 'name', detector)
+        return self.ALIASES.get(name, name)
+
+    def path(self, uid, detector=None, frame=0):
+        return self.get(uid).path(self._detector(detector), frame)
+
+    def paths(self, uid, detector=None):
+        return self.get(uid).paths(self._detector(detector))
+
+    def num_frames(self, uid, detector=None):
+        return self.get(uid).num_frames(self._detector(detector))
+
+
+resource_index = RunFileIndex()
+RE.subscribe(resource_index)
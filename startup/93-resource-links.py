@@ -0,0 +1,229 @@
+print(f'Loading {__file__}')
+
+##### Link farm: user-facing symlinks to the raw data #####
+# The links <folder>/<saxs|waxs|maxs>/raw/<filename>_<frame>_<det>.tiff -> raw
+# file used to be made one at a time (os.path.exists/os.makedirs/os.symlink
+# per uid and detector, on the acquisition thread). link_farm instead:
+#   - computes every (target, link) pair from the run index (resource_index);
+#   - creates the directories once, then the links with a thread pool;
+#   - is idempotent (a link already pointing to its target is left alone),
+#     and has a dry-run mode;
+#   - takes link jobs from acquisition (handle_file, handle_fileseries) and
+#     does the filesystem work in the background (see link_farm.auto_link).
+#
+#   link_farm.link_runs(range(2118770, 2118860))       links for a list of uids
+#   link_farm.link_proposal(dry_run=True)               every run of the current proposal
+#   link_farm.auto_link = False                          only queue the acquisition jobs...
+#   link_farm.flush()                                    ...and build them later
+
+import collections
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class LinkFarm:
+
+    # detector: name used in the link names
+    DETECTOR_NAMES = {'pilatus800k-1': 'waxs', 'pilatus2m-1': 'saxs', 'pilatus800k-2': 'maxs'}
+
+    def __init__(self, max_workers=16, auto_link=True, max_pending=100000):
+        # By default the links of every exposure are built in the background.
+        # Under data security, the acquisition account may not be allowed to
+        # write the user folders: with auto_link=False jobs are only queued
+        # (flush() them from an account that can).
+        self.auto_link = auto_link
+        self.max_workers = max_workers
+        self.pending = collections.deque(maxlen=max_pending)  # (uid, detector, link_template, num_frames)
+        self.dropped = 0  # jobs pushed out of a full queue since the last flush
+        self.last_report = None
+        self._lock = threading.Lock()
+
+    # Computing the links
+    ########################################
+
+    def pairs(self, uids, detectors=None, output_folder=None, all_frames=True, verbosity=3):
+        """
+        (target, link_name) for every frame (or only the first one) of every
+        detector of these runs. Links go in output_folder/raw/, or by default in
+        RE.md['userpy_alias_directory']/<saxs|waxs|maxs>/raw/ (as handlefilename did).
+        """
+        pairs = []
+        for uid in uids:
+            try:
+                run = resource_index.get(uid)
+            except Exception as ex:
+                if verbosity >= 2:
+                    print("WARNING: run {} skipped ({})".format(uid, repr(ex)))
+                continue
+            start = run.start
+            if 'beamline_mode' not in start or 'filename' not in start:
+                continue
+            for detector in start.get('detectors', []):
+                if detectors is not None and detector not in detectors:
+                    continue
+                detector_name = self.DETECTOR_NAMES.get(detector)
+                if detector_name is None:
+                    continue
+                if output_folder is not None:
+                    link_dir = os.path.join(output_folder, 'raw')
+                else:
+                    link_dir = os.path.join(RE.md["userpy_alias_directory"], detector_name, 'raw')
+                try:
+                    targets = run.paths(detector) if all_frames else [run.path(detector, 0)]
+                except KeyError:
+                    continue
+                for frame, target in enumerate(targets):
+                    link_name = '{}_{:06d}_{}.tiff'.format(start['filename'], frame, detector_name)
+                    pairs.append((target, os.path.join(link_dir, link_name)))
+        return pairs
+
+    # Building the links
+    ########################################
+
+    @staticmethod
+    def _link(target, link_name, replace, dry_run):
+        if os.path.islink(link_name):
+            if os.readlink(link_name) == target:
+                return 'existing'
+            if not replace:
+                return 'conflict'
+            if not dry_run:
+                os.remove(link_name)
+            status = 'replaced'
+        elif os.path.exists(link_name):
+            return 'conflict'  # a real file, never touched
+        else:
+            status = 'created'
+        if not dry_run:
+            os.symlink(target, link_name)
+        return status
+
+    def build(self, pairs, replace=True, dry_run=False, verbosity=3):
+        """
+        Create the links (target, link_name) in bulk. Links already pointing to
+        their target are left alone; links pointing elsewhere are replaced if
+        replace; regular files are never touched. With dry_run, only report
+        what would be done.
+
+        Returns {'created': n, 'replaced': n, 'existing': n, 'conflict': [...],
+        'failed': [(link_name, error), ...], 'directories': n, 'elapsed': s}.
+        """
+        t0 = time.time()
+        pairs = list(dict((link_name, target) for target, link_name in pairs).items())  # last one wins
+        report = {'created': 0, 'replaced': 0, 'existing': 0, 'conflict': [], 'failed': [], 'directories': 0}
+
+        directories = sorted({os.path.dirname(link_name) for link_name, target in pairs})
+        missing = [d for d in directories if d and not os.path.isdir(d)]
+        report['directories'] = len(missing)
+        if not dry_run:
+            for directory in missing:
+                os.makedirs(directory, exist_ok=True)
+
+        def work(item):
+            link_name, target = item
+            try:
+                return link_name, self._link(target, link_name, replace, dry_run), None
+            except OSError as ex:
+                return link_name, 'failed', ex
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='link_farm') as executor:
+            for link_name, status, error in executor.map(work, pairs):
+                if status == 'failed':
+                    report['failed'].append((link_name, repr(error)))
+                elif status == 'conflict':
+                    report['conflict'].append(link_name)
+                else:
+                    report[status] += 1
+
+        report['elapsed'] = time.time() - t0
+        self.last_report = report
+        if verbosity >= 3 or (verbosity >= 1 and (report['failed'] or report['conflict'])):
+            self.print_report(report, dry_run=dry_run)
+        return report
+
+    def print_report(self, report, dry_run=False):
+        print("{}{} links: {} created, {} replaced, {} already there, {} conflicts, {} failed; {} new directories ({:.2f} s)".format(
+            "[dry run] " if dry_run else "", report['created'] + report['replaced'] + report['existing']
+            + len(report['conflict']) + len(report['failed']), report['created'], report['replaced'],
+            report['existing'], len(report['conflict']), len(report['failed']), report['directories'],
+            report['elapsed']))
+        for link_name in report['conflict'][:10]:
+            print("  conflict (not a link to the same file): {}".format(link_name))
+        for link_name, error in report['failed'][:10]:
+            print("  failed: {} ({})".format(link_name, error))
+
+    def link_runs(self, uids, detectors=None, output_folder=None, all_frames=True, replace=True, dry_run=False,
+                  verbosity=3):
+        return self.build(self.pairs(uids, detectors=detectors, output_folder=output_folder, all_frames=all_frames,
+                                     verbosity=verbosity),
+                          replace=replace, dry_run=dry_run, verbosity=verbosity)
+
+    def link_proposal(self, data_session=None, **kwargs):
+        """link_runs for every run of a proposal (default: the current one)."""
+        data_session = RE.md['data_session'] if data_session is None else data_session
+        uids = [h.start['uid'] for h in db(data_session=data_session)]
+        return self.link_runs(uids, **kwargs)
+
+    # Jobs from acquisition
+    ########################################
+
+    @staticmethod
+    def link_template(link_name):
+        """
+        Link template for link_name, the link of the first frame: the
+        '_000000_' of its file name (not of the folders) becomes the {frame} field.
+        """
+        directory, basename = os.path.split(link_name)
+        directory = directory.replace('{', '{{').replace('}', '}}')
+        basename = basename.replace('{', '{{').replace('}', '}}').replace('_000000_', '_{frame:06d}_')
+        return os.path.join(directory, basename)
+
+    def enqueue(self, uid, detector, link_template, num_frames=1):
+        """
+        Queue the links of a run just taken; link_template is the link path
+        with a {frame} field, e.g. '/path/name_{frame:06d}_saxs.tiff'.
+        """
+        job = (uid, getattr(detector, 'name', detector), link_template, num_frames)
+        if self.auto_link:
+            async_loop.submit_sync(self._build_jobs, [job], name='link_farm {}'.format(uid))
+            return
+        with self._lock:
+            full = len(self.pending) == self.pending.maxlen
+            self.pending.append(job)
+            if full:
+                self.dropped += 1
+        if full and self.dropped == 1:
+            print("WARNING: link_farm queue is full ({} jobs), the oldest jobs are dropped; "
+                  "link_farm.flush() or link_farm.link_proposal() to build them".format(self.pending.maxlen))
+
+    def _build_jobs(self, jobs, dry_run=False, verbosity=1):
+        pairs, unresolved = [], []
+        for uid, detector, link_template, num_frames in jobs:
+            try:
+                for frame in range(num_frames):
+                    pairs.append((resource_index.path(uid, detector, frame), link_template.format(frame=frame)))
+            except Exception as ex:
+                unresolved.append((link_template, repr(ex)))
+        report = self.build(pairs, dry_run=dry_run, verbosity=verbosity if not unresolved else 0)
+        if unresolved:
+            report['failed'].extend(unresolved)
+            if verbosity >= 1:
+                self.print_report(report, dry_run=dry_run)
+        return report
+
+    def flush(self, dry_run=False, verbosity=3):
+        """Build the links of every queued acquisition job."""
+        with self._lock:
+            jobs = list(self.pending)
+            if not dry_run:
+                self.pending.clear()
+                if self.dropped and verbosity >= 1:
+                    print("WARNING: {} link jobs were dropped from the full queue; "
+                          "link_farm.link_proposal() rebuilds them".format(self.dropped))
+                self.dropped = 0
+        return self._build_jobs(jobs, dry_run=dry_run, verbosity=verbosity)
+
+
+link_farm = LinkFarm()
@@ -21,6 +21,7 @@ print(f'Loading {__file__}')
 ################################################################################
 
 
+import collections
 import time
 import re
 import os
@@ -33,6 +34,9 @@ import functools
 import hashlib
 import inspect
 
+from ophyd.areadetector.filestore_mixins import FileStoreBase
+from ophyd.device import Staged
+
 
 # ---------------------------------------------------------------------------
 # Tiling configuration
@@ -53,6 +57,29 @@ TILING_CONFIGS = {
 }
 
 
+def _stitch_group_id(args):
+    scan_id = RE.md.get("scan_id", 0)
+    name = getattr(args[0], "name", "block") if args else "block"
+    return "{}_{}_{}".format(name, int(scan_id), datetime.now().strftime("%Y%m%dT%H%M%S"))
+
+
+def _tile_kwargs(base_kwargs, base_extra, tile, index, tile_total):
+    # build per-tile metadata (copy so each tile is independent)
+    tile_kwargs = dict(base_kwargs)
+    tile_kwargs["detector_position"] = tile["detector_position"]
+    tile_kwargs["stitch_tile_label"] = tile["label"]
+    tile_kwargs["stitch_tile_index"] = index + 1
+    tile_kwargs["stitch_tile_total"] = tile_total
+    tile_kwargs["stitchback"] = True
+
+    # append tile label to the extra filename suffix
+    tile_kwargs["extra"] = (
+        tile["label"] if base_extra is None
+        else "{}_{}".format(base_extra, tile["label"])
+    )
+    return tile_kwargs
+
+
 def with_tiling(tiling_mode=None):
     """Decorator factory that wraps detector motion and injects stitching metadata.
 
@@ -151,71 +178,806 @@ def with_tiling(tiling_mode=None):
 
             # --- shared stitching group id (generated once per tiling call) ---
             if "stitch_group_id" not in base_kwargs:
-                scan_id = RE.md.get("scan_id", 0)
-                name = getattr(args[0], "name", "block") if args else "block"
-                base_kwargs["stitch_group_id"] = "{}_{}_{}".format(
-                    name,
-                    int(scan_id),
-                    datetime.now().strftime("%Y%m%dT%H%M%S"),
-                )
+                base_kwargs["stitch_group_id"] = _stitch_group_id(args)
             base_kwargs["stitch_tiling_mode"] = effective_tiling
             RE.md["tiling"] = effective_tiling
 
             # --- save current detector positions ---
-            SAXSy_o = SAXSy.user_readback.value
-            SAXSx_o = SAXSx.user_readback.value
-            WAXSy_o = WAXSy.user_readback.value
-            WAXSx_o = WAXSx.user_readback.value
-            MAXSy_o = MAXSy.user_readback.value
-            MAXSx_o = MAXSx.user_readback.value
-
+            motors = _tiling_motors()
+            origins = {motor: motor.position for motor, key in motors}
+            tile_targets = [{motor: origins[motor] + tile[key] for motor, key in motors} for tile in tiles]
+            predicted = tiling_scheduler.move_time(tile_targets[0], origins) + sum(
+                tiling_scheduler.move_time(tile_targets[i + 1], tile_targets[i]) for i in range(tile_total - 1)
+            ) + tiling_scheduler.move_time(origins, tile_targets[-1])
+            base_kwargs["tiling_predicted_motion_time"] = predicted
+
+            start_time, motion_time = time.time(), 0.0
             try:
                 for i, tile in enumerate(tiles):
-                    # move detectors to tile offset from saved origin
-                    if pilatus2M in cms.detector:
-                        SAXSy.move(SAXSy_o + tile["SAXSy"])
-                        SAXSx.move(SAXSx_o + tile["SAXSx"])
-                    if pilatus800 in cms.detector:
-                        WAXSy.move(WAXSy_o + tile["WAXSy"])
-                        WAXSx.move(WAXSx_o + tile["WAXSx"])
-                    if pilatus8002 in cms.detector:
-                        MAXSy.move(MAXSy_o + tile["MAXSy"])
-                    if pilatus8002 in cms.detector:
-                        MAXSx.move(MAXSx_o + tile["MAXSx"])
-
-                    # build per-tile metadata (copy so each tile is independent)
-                    tile_kwargs = dict(base_kwargs)
-                    tile_kwargs["detector_position"] = tile["detector_position"]
-                    tile_kwargs["stitch_tile_label"] = tile["label"]
-                    tile_kwargs["stitch_tile_index"] = i + 1
-                    tile_kwargs["stitch_tile_total"] = tile_total
-                    tile_kwargs["stitchback"] = True
-
-                    # append tile label to the extra filename suffix
-                    tile_extra = (
-                        tile["label"] if base_extra is None
-                        else "{}_{}".format(base_extra, tile["label"])
-                    )
-                    tile_kwargs["extra"] = tile_extra
-
-                    _call_func(args, tile_kwargs)
+                    # move detectors to tile offset from saved origin (x and y together, then settle)
+                    motion_time += tiling_scheduler.move(tile_targets[i])
+
+                    tile_args = args
+                    if args and isinstance(args[0], (list, tuple)):
+                        # block of samples: go back and forth (serpentine)
+                        tile_args = (_serpentine(args[0], i),) + tuple(args[1:])
+                    tile_kwargs = _tile_kwargs(base_kwargs, base_extra, tile, i, tile_total)
+                    tile_kwargs["tiling_motion_time"] = motion_time
+                    tile_kwargs["tiling_elapsed_time"] = time.time() - start_time
+                    _call_func(tile_args, tile_kwargs)
 
             finally:
                 # restore detector positions unconditionally
-                if pilatus2M in cms.detector:
-                    SAXSy.move(SAXSy_o)
-                    SAXSx.move(SAXSx_o)
-                if pilatus800 in cms.detector:
-                    WAXSy.move(WAXSy_o)
-                    WAXSx.move(WAXSx_o)
-                if pilatus8002 in cms.detector:
-                    MAXSy.move(MAXSy_o)
-                    MAXSx.move(MAXSx_o)
+                motion_time += tiling_scheduler.move(origins)
                 RE.md.pop("tiling", None)
+                tiling_scheduler.last_report = {
+                    'mode': 'tiles', 'steps': tile_total, 'predicted_motion_time': predicted,
+                    'motion_time': motion_time, 'elapsed': time.time() - start_time,
+                }
         return wrapper
     return decorator
 
 
+def tiling_plan(tiling_mode, plan_func, *args, **kwargs):
+    """Plan version of with_tiling.
+
+    Yields from ``plan_func(*args, **tile_kwargs)`` at every tile of
+    ``TILING_CONFIGS[tiling_mode]`` (same per-tile metadata and ``extra``
+    suffixes as with_tiling). The detectors are moved with ``bps.mv`` (x and y
+    together) and moved back at the end, also if the plan fails or is aborted.
+
+    .. code-block:: python
+
+        RE(tiling_plan("ygaps", sam.measure_single_plan, exposure_time=0.5))
+    """
+    if tiling_mode not in TILING_CONFIGS:
+        raise ValueError(
+            "Unknown tiling_mode {!r}. Valid modes: {}".format(tiling_mode, list(TILING_CONFIGS))
+        )
+
+    tiles = TILING_CONFIGS[tiling_mode]
+    base_kwargs = dict(kwargs)
+    base_extra = base_kwargs.get("extra", None)
+    if "stitch_group_id" not in base_kwargs:
+        base_kwargs["stitch_group_id"] = _stitch_group_id(args)
+    base_kwargs["stitch_tiling_mode"] = tiling_mode
+
+    motors = _tiling_motors()
+    origins = {key: motor.user_readback.value for motor, key in motors}
+    positions = [{motor: origins[key] for motor, key in motors}]
+    positions += [{motor: origins[key] + tile[key] for motor, key in motors} for tile in tiles] + positions[:1]
+    base_kwargs["tiling_predicted_motion_time"] = sum(
+        tiling_scheduler.move_time(positions[i + 1], positions[i]) for i in range(len(positions) - 1)
+    )
+    start_time = time.time()
+
+    def move_to(tile):
+        mv_args, targets = [], {}
+        for motor, key in motors:
+            targets[motor] = origins[key] + (tile[key] if tile is not None else 0.0)
+            mv_args += [motor, targets[motor]]
+        if mv_args:
+            yield from bps.mv(*mv_args)
+            yield from tiling_scheduler.settle_plan(targets)
+
+    def inner():
+        RE.md["tiling"] = tiling_mode
+        for i, tile in enumerate(tiles):
+            yield from move_to(tile)
+            tile_args = args
+            if args and isinstance(args[0], (list, tuple)):
+                # block of samples: go back and forth (serpentine)
+                tile_args = (_serpentine(args[0], i),) + tuple(args[1:])
+            tile_kwargs = _tile_kwargs(base_kwargs, base_extra, tile, i, len(tiles))
+            tile_kwargs["tiling_elapsed_time"] = time.time() - start_time
+            yield from plan_func(*tile_args, **tile_kwargs)
+
+    def restore():
+        RE.md.pop("tiling", None)
+        yield from move_to(None)
+
+    return (yield from bpp.finalize_wrapper(inner(), restore))
+
+
+def _tiling_motors():
+    """(motor, TILING_CONFIGS key) of the detector stages of the detectors in use."""
+    motors = []
+    for detector, keys in ((pilatus2M, ("SAXSx", "SAXSy")),
+                           (pilatus800, ("WAXSx", "WAXSy")),
+                           (pilatus8002, ("MAXSx", "MAXSy"))):
+        if detector in cms.detector:
+            motors += [(globals()[key], key) for key in keys]
+    return motors
+
+
+def _serpentine(items, index):
+    # every other pass goes back the other way
+    return list(items) if index % 2 == 0 else list(items)[::-1]
+
+
+class TilingScheduler:
+    """Orders and moves tiled measurements.
+
+    - Samples and tiles are visited serpentine-style: either tile after tile,
+      going through the block of samples back and forth ('block': the
+      detectors move only once per tile), or sample after sample, going
+      through the tiles back and forth ('paired': no detector move between
+      samples). The order with the shortest predicted motion time is used.
+    - When both the sample and the detectors move, they move together.
+    - Instead of a fixed sleep after a move, waits for the readbacks to stay
+      within tolerance of the target for settle_dwell seconds: settle_tolerance
+      for every motor if given, else the tolerance of each motor (at least its
+      retry deadband, see readback_settle.tolerance in 12-settle.py).
+
+    Each measurement gets the predicted and actual (so far) motion time of the
+    tiling call in its metadata; the full report is kept in last_report.
+    """
+
+    def __init__(self, settle_tolerance=None, settle_dwell=0.2, settle_timeout=10.0,
+                 move_overhead=0.3, default_velocity=1.0):
+        self.settle_tolerance = settle_tolerance
+        self.settle_dwell = settle_dwell
+        self.settle_timeout = settle_timeout
+        self.move_overhead = move_overhead  # s per move on top of distance/velocity (acceleration, DMOV)
+        self.default_velocity = default_velocity
+        self.last_report = None
+        self._velocities = {}
+
+    # Time model
+    ########################################
+
+    def tolerance(self, motor):
+        return readback_settle.tolerance(motor, self.settle_tolerance)
+
+    def velocity(self, motor):
+        if motor not in self._velocities:
+            try:
+                self._velocities[motor] = abs(motor.velocity.get()) or self.default_velocity
+            except Exception:
+                self._velocities[motor] = self.default_velocity
+        return self._velocities[motor]
+
+    def move_time(self, targets, positions):
+        """Predicted time to go from positions to targets ({motor: position}), all motors together."""
+        times = [self.move_overhead + abs(target - positions[motor]) / self.velocity(motor)
+                 for motor, target in targets.items()
+                 if abs(target - positions[motor]) > self.tolerance(motor)]
+        return max(times) + self.settle_dwell if times else 0.0
+
+    def schedule(self, sample_targets, tile_targets, positions, mode=None):
+        """
+        Order of the (sample index, tile index) steps and its predicted motion time.
+        sample_targets / tile_targets: per sample / tile, {motor: position}.
+        """
+        num_samples, num_tiles = len(sample_targets), len(tile_targets)
+        orders = {
+            'block': [(i, j) for j in range(num_tiles) for i in _serpentine(range(num_samples), j)],
+            'paired': [(i, j) for i in range(num_samples) for j in _serpentine(range(num_tiles), i)],
+        }
+        predictions = {}
+        for name, order in orders.items():
+            current, total = dict(positions), 0.0
+            for i, j in order + [(None, None)]:
+                # The last step goes back to where we started
+                targets = dict(positions) if i is None else {**sample_targets[i], **tile_targets[j]}
+                total += self.move_time(targets, current)
+                current.update(targets)
+            predictions[name] = total
+        if mode is None:
+            mode = min(predictions, key=predictions.get)
+        return orders[mode], predictions[mode], mode
+
+    # Motion
+    ########################################
+
+    def settle(self, targets, timeout=None):
+        """Wait until every readback stayed within tolerance of its target for settle_dwell
+        (see readback_settle in 12-settle.py)."""
+        return readback_settle.wait(list(targets), targets=list(targets.values()), tolerance=self.settle_tolerance,
+                                    dwell=self.settle_dwell, timeout=self.settle_timeout if timeout is None else timeout)
+
+    def move(self, targets):
+        """Move all the motors together ({motor: position}), then settle; returns the time it took."""
+        start_time = time.time()
+        targets = {motor: target for motor, target in targets.items()
+                   if abs(motor.position - target) > self.tolerance(motor)}
+        if targets:
+            statuses = [motor.set(target) for motor, target in targets.items()]
+            for status in statuses:
+                status.wait()
+            self.settle(targets)
+        return time.time() - start_time
+
+    def settle_plan(self, targets, timeout=None):
+        """Plan version of settle."""
+        return (yield from readback_settle.wait_plan(
+            list(targets), targets=list(targets.values()), tolerance=self.settle_tolerance, dwell=self.settle_dwell,
+            timeout=self.settle_timeout if timeout is None else timeout))
+
+    # Tiled measurements
+    ########################################
+
+    def sample_targets(self, sample, axes=("x", "y")):
+        """{motor: position} of the sample origin along axes."""
+        targets = {}
+        for name in axes:
+            axis = sample._axes.get(name)
+            if axis is None or not axis.is_enabled():
+                continue
+            root = axis
+            while root.motor is None:
+                root = root.base_stage._axes[root.name]
+            targets[root.motor] = axis.cur_to_motor(0)
+        return targets
+
+    def run(self, samples, tiling, measure, mode=None, verbosity=3, **md):
+        """
+        Call measure(sample, **tile_md) for every sample at every tile of
+        TILING_CONFIGS[tiling], in the order with the least motion (see
+        schedule); the detectors are moved back at the end.
+        """
+        tiles = TILING_CONFIGS[tiling]
+        motors = _tiling_motors()
+        origins = {motor: motor.position for motor, key in motors}
+        tile_targets = [{motor: origins[motor] + tile[key] for motor, key in motors} for tile in tiles]
+        sample_targets = [self.sample_targets(sample) for sample in samples]
+        positions = dict(origins)
+        for targets in sample_targets:
+            positions.update({motor: motor.position for motor in targets if motor not in positions})
+
+        order, predicted, mode = self.schedule(sample_targets, tile_targets, positions, mode=mode)
+
+        base_md = dict(md)
+        base_extra = base_md.get("extra", None)
+        base_md.setdefault("stitch_group_id", _stitch_group_id(samples[:1]))
+        base_md["stitch_tiling_mode"] = tiling
+        base_md["tiling_order"] = mode
+        base_md["tiling_predicted_motion_time"] = predicted
+
+        start_time, motion_time = time.time(), 0.0
+        RE.md["tiling"] = tiling
+        try:
+            for i, j in order:
+                motion_time += self.move({**sample_targets[i], **tile_targets[j]})
+                tile_md = _tile_kwargs(base_md, base_extra, tiles[j], j, len(tiles))
+                tile_md["tiling_motion_time"] = motion_time
+                tile_md["tiling_elapsed_time"] = time.time() - start_time
+                measure(samples[i], **tile_md)
+        finally:
+            RE.md.pop("tiling", None)
+            motion_time += self.move(origins)
+
+        self.last_report = {'mode': mode, 'steps': len(order), 'predicted_motion_time': predicted,
+                            'motion_time': motion_time, 'elapsed': time.time() - start_time}
+        if verbosity >= 3:
+            print("Tiling '{}' of {} samples ({} order): motion {:.1f} s (predicted {:.1f} s), total {:.1f} s".format(
+                tiling, len(samples), mode, motion_time, predicted, self.last_report['elapsed']))
+        return self.last_report
+
+
+tiling_scheduler = TilingScheduler()
+
+
+class SamplePathPlanner:
+    """Orders the samples of a holder to minimize the sample-stage travel time.
+
+    The time to go from one sample to the next is predicted from the motor
+    velocities (VELO, or velocities={motor: mm/s}), plus move_overhead per
+    motor that moves; the axes move one after the other (as gotoOrigin does),
+    or together with concurrent=True. The order is the nearest-neighbor path
+    from the current position, improved with 2-opt; it is only used if it is
+    predicted to be faster than the sample-number order.
+
+    Only the order changes: each measurement still records the sample number
+    (sample_holder_sample_number in the metadata).
+    """
+
+    AXES = ("x", "y", "yy", "th")
+
+    def __init__(self, scheduler=None, velocities=None, concurrent=False, max_passes=100):
+        self.scheduler = scheduler  # time model parameters and motor velocities; None: tiling_scheduler
+        self.velocities = dict(velocities or {})
+        self.concurrent = concurrent
+        self.max_passes = max_passes
+        self.last_report = None
+
+    def _scheduler(self):
+        return tiling_scheduler if self.scheduler is None else self.scheduler
+
+    def velocity(self, motor):
+        if motor in self.velocities:
+            return self.velocities[motor]
+        return self._scheduler().velocity(motor)
+
+    # Time model
+    ########################################
+
+    def positions(self, samples, start=None):
+        """Motors and the (num_samples [+1], num_motors) array of their targets; the
+        first row is the start position ({motor: position}), if given."""
+        scheduler = self._scheduler()
+        targets = [scheduler.sample_targets(sample, axes=self.AXES) for sample in samples]
+        motors = []
+        for sample_targets in targets:
+            motors += [motor for motor in sample_targets if motor not in motors]
+        rows = ([start] if start is not None else []) + targets
+        # An axis missing for a sample (or the start) does not move
+        reference = {motor: next((row[motor] for row in rows if motor in row), 0.0) for motor in motors}
+        return motors, np.array([[row.get(motor, reference[motor]) for motor in motors] for row in rows], dtype=float)
+
+    def travel_times(self, motors, positions):
+        """(n, n) predicted time to go from each row of positions to each other."""
+        scheduler = self._scheduler()
+        velocities = np.array([self.velocity(motor) for motor in motors], dtype=float)
+        tolerances = np.array([scheduler.tolerance(motor) for motor in motors], dtype=float)
+        distances = np.abs(positions[:, None, :] - positions[None, :, :])
+        times = np.where(distances > tolerances, scheduler.move_overhead + distances / velocities, 0.0)
+        return times.max(axis=2) if self.concurrent else times.sum(axis=2)
+
+    @staticmethod
+    def path_time(times, path):
+        return float(sum(times[a, b] for a, b in zip(path[:-1], path[1:])))
+
+    # Path
+    ########################################
+
+    @staticmethod
+    def nearest_neighbor(times):
+        """Open path through every node, from node 0, always to the nearest node left."""
+        path, left = [0], set(range(1, len(times)))
+        while left:
+            row = times[path[-1]]
+            nearest = min(left, key=lambda node: (row[node], node))
+            path.append(nearest)
+            left.remove(nearest)
+        return path
+
+    def two_opt(self, times, path):
+        """Reverse path segments while it shortens the (open) path; the first node stays first."""
+        path = list(path)
+        n = len(path)
+        for _ in range(self.max_passes):
+            improved = False
+            for i in range(1, n - 1):
+                a, b = path[i - 1], path[i]
+                # Reversing path[i:j+1]: a-b ... c-d becomes a-c ... b-d (no d after the last node)
+                c = np.array(path[i + 1:])
+                d = np.array(path[i + 2:] + [-1])
+                after = np.where(d >= 0, times[b, np.maximum(d, 0)], 0.0)
+                before = np.where(d >= 0, times[c, np.maximum(d, 0)], 0.0)
+                gain = times[a, b] + before - times[a, c] - after
+                best = int(np.argmax(gain))
+                if gain[best] > 1e-9:
+                    j = i + 1 + best
+                    path[i:j + 1] = path[i:j + 1][::-1]
+                    improved = True
+            if not improved:
+                break
+        return path
+
+    def order(self, samples, start=None, verbosity=3):
+        """
+        samples reordered along the shortest predicted path, from start
+        ({motor: position}; default: where the motors are now, or the first
+        sample if they cannot be read; {}: the first sample). The prediction is
+        kept in last_report.
+        """
+        samples = list(samples)
+        if start is None:
+            start = self._current_positions(samples)
+        motors, positions = self.positions(samples, start=start)
+        # Node 0 is the start position or, if there is none, the first sample (as in the sample-number order)
+        offset = 0 if start is None else 1
+        times = self.travel_times(motors, positions)
+
+        numbered = list(range(len(positions)))
+        path = self.two_opt(times, self.nearest_neighbor(times)) if len(numbered) > 2 else numbered
+        number_time, path_time = self.path_time(times, numbered), self.path_time(times, path)
+        if path_time >= number_time:
+            path, path_time = numbered, number_time
+
+        ordered = [samples[node - offset] for node in path[offset:]]
+        self.last_report = {'samples': len(samples), 'number_time': number_time, 'path_time': path_time,
+                            'saved': number_time - path_time,
+                            'order': [s.md.get("holder_sample_number") for s in ordered]}
+        if verbosity >= 3:
+            print("Sample order: predicted travel {:.1f} s (sample-number order: {:.1f} s)".format(
+                path_time, number_time))
+        return ordered
+
+    def _current_positions(self, samples):
+        start = {}
+        for sample in samples:
+            for motor in self._scheduler().sample_targets(sample, axes=self.AXES):
+                if motor in start:
+                    continue
+                try:
+                    start[motor] = motor.position
+                except Exception:
+                    return None
+                if start[motor] is None:
+                    return None
+        return start or None
+
+
+sample_path_planner = SamplePathPlanner()
+
+
+def file_plugins(detector):
+    """The staged file-writing plugins (ophyd FileStore mixins) of detector."""
+    plugins = []
+    for name in getattr(detector, "component_names", ()):
+        cpt = getattr(detector, name)
+        if isinstance(cpt, FileStoreBase) and cpt._staged == Staged.yes:
+            plugins.append(cpt)
+    return plugins
+
+
+def exposure_run(detectors, md=None):
+    """One exposure of detectors as its own run (like count(detectors)).
+    Returns the uid of the run.
+
+    Detectors that are not staged are staged around the run. Detectors that
+    the caller already staged (e.g. doSamples_plan stages them once for the
+    whole holder) stay staged, and only their file plugins are restaged: the
+    file plugins emit the resource document at stage(), and it must belong
+    to the run whose datums point to it."""
+    _md = {
+        "detectors": [det.name for det in detectors],
+        "num_points": 1,
+        "num_intervals": 0,
+        "plan_args": {"detectors": list(map(repr, detectors)), "num": 1},
+        "plan_name": "count",
+        "hints": {"dimensions": [(("time",), "primary")]},
+    }
+    _md.update(md or {})
+    staged = [det for det in detectors if getattr(det, "_staged", None) == Staged.yes]
+
+    @bpp.stage_decorator([det for det in detectors if det not in staged])
+    def inner():
+        for det in staged:
+            for plugin in file_plugins(det):
+                yield from bps.unstage(plugin)
+                yield from bps.stage(plugin)
+        uid = yield from bps.open_run(md=_md)
+        yield from bps.trigger_and_read(detectors)
+        yield from bps.close_run()
+        return uid
+
+    return (yield from inner())
+
+
+class AxisSearch:
+    """Search plans for the alignment searches (Axis.search, search_plan).
+
+    The whole search is a single run (detector staged once), with one event per
+    exposure. Strategies:
+      'step'    move, and halve the step (and reverse) when the value goes the
+                wrong way (the original search)
+      'bisect'  target fraction of intensity (monotonic edge): bracket the
+                target by doubling steps, then bisect the bracket
+      'golden'  target 'max' or 'min': bracket the extremum, then golden-section
+      'fit'     noisy data: sample a few points, then measure where a local fit
+                (line through the edge, parabola at the extremum) predicts the
+                target, until the prediction moves less than min_step
+
+    Every position is kept within max_range of the start position (default:
+    range_steps × step_size); a search whose target is not bracketed inside
+    that range stops there, with found=False.
+
+    Every search is recorded (exposures, elapsed time) in history:
+      axis_search.stats_table()     mean exposures and time per strategy/target
+    """
+
+    STRATEGIES = ("step", "bisect", "golden", "fit")
+    GOLDEN = (3 - np.sqrt(5)) / 2  # 0.382
+
+    def __init__(self, max_exposures=60, range_steps=20):
+        self.max_exposures = max_exposures
+        self.range_steps = range_steps
+        self.history = []
+        self.last = None
+
+    def plan(self, mover, detector, value_name, target=0.5, intensity=None, step_size=1.0, min_step=0.05,
+             polarity=+1, strategy="step", name=None, max_exposures=None, max_range=None, early_stop=None,
+             verbosity=3, md=None):
+        """
+        Search plan moving mover (a motor, or an Axis) until the detector value
+        value_name reaches target (fraction of intensity, 'max' or 'min'),
+        within max_range of the start position.
+        early_stop(value) can end the search after the first exposure.
+        Returns the record of the search (also appended to history).
+        """
+        if strategy not in self.STRATEGIES:
+            raise ValueError("Unknown search strategy '{}' (one of {})".format(strategy, self.STRATEGIES))
+        if target not in ("max", "min") and strategy == "golden":
+            strategy = "bisect"
+        elif target in ("max", "min") and strategy == "bisect":
+            strategy = "golden"
+        if target not in ("max", "min") and intensity is None:
+            intensity = RE.md["beam_intensity_expected"]
+        name = getattr(mover, "name", "?") if name is None else name
+        max_exposures = self.max_exposures if max_exposures is None else max_exposures
+        max_range = self.range_steps * step_size if max_range is None else max_range
+        motor = mover.motor if isinstance(mover, Axis) else mover
+
+        state = {"exposures": 0, "position": None, "value": None, "bounds": None}
+        start_time = time.time()
+
+        def budget():
+            return state["exposures"] < max_exposures
+
+        def move(position):
+            position = self._clamp(state, position)
+            if isinstance(mover, Axis):
+                yield from mover.move_absolute_plan(position, verbosity=0)
+            else:
+                yield from bps.mv(mover, position)
+            state["position"] = position
+
+        def measure(position=None):
+            if position is not None:
+                yield from move(position)
+            reading = yield from bps.trigger_and_read([detector] + ([motor] if motor is not None else []))
+            if not reading or value_name not in reading:
+                reading = detector.read()
+            value = reading[value_name]["value"]
+            state["exposures"] += 1
+            state["value"] = value
+            if verbosity >= 4:
+                print("      {} = {:.4f}; value : {}".format(name, state["position"], value))
+            return value
+
+        _md = {
+            "plan_name": "search",
+            "detectors": [detector.name],
+            "motors": [motor.name] if motor is not None else [],
+            "search_axis": name,
+            "search_strategy": strategy,
+            "search_target": target,
+            "search_max_range": max_range,
+            "hints": {"dimensions": [(([motor.name] if motor is not None else ["time"]), "primary")]},
+        }
+        _md.update(md or {})
+
+        def inner():
+            uid = yield from bps.open_run(md=_md)
+            if isinstance(mover, Axis):
+                state["position"] = mover.get_position(verbosity=0)
+            else:
+                state["position"] = yield from bps.rd(mover)
+            state["bounds"] = (state["position"] - max_range, state["position"] + max_range)
+            value = yield from measure()
+            if early_stop is not None and early_stop(value):
+                found = True
+            else:
+                search = getattr(self, "_" + strategy)
+                found = yield from search(measure, move, state, target, intensity, step_size, min_step, polarity,
+                                          budget)
+            yield from bps.close_run()
+            return uid, found
+
+        uid, found = yield from bpp.stage_wrapper(inner(), [detector])
+
+        return self.record(name, strategy, target, state["exposures"], time.time() - start_time,
+                           state["position"], state["value"], found=found, uid=uid, verbosity=verbosity)
+
+    def record(self, name, strategy, target, exposures, elapsed, position, value, found=True, uid=None,
+               verbosity=3):
+        record = {"time": time.time(), "axis": name, "strategy": strategy, "target": target,
+                  "exposures": exposures, "elapsed": elapsed, "position": position, "value": value,
+                  "found": found, "uid": uid}
+        self.history.append(record)
+        self.last = record
+        if verbosity >= 3:
+            print("Search {} ({}, target {}): {} = {:.4f} after {} exposures, {:.1f} s{}".format(
+                name, strategy, target, name, position, exposures, elapsed, "" if found else " (NOT FOUND)"))
+        return record
+
+    def since(self, start_time):
+        """The searches done since start_time (e.g. during one alignment)."""
+        return [record for record in self.history if record["time"] >= start_time]
+
+    def stats_table(self, verbosity=3):
+        """Exposures and time per search, by strategy and target kind."""
+        groups = collections.OrderedDict()
+        for record in self.history:
+            kind = record["target"] if record["target"] in ("max", "min") else "edge"
+            groups.setdefault((record["strategy"], kind), []).append(record)
+        rows = []
+        for (strategy, kind), records in groups.items():
+            rows.append({
+                "strategy": strategy,
+                "target": kind,
+                "count": len(records),
+                "exposures": np.mean([r["exposures"] for r in records]),
+                "elapsed": np.mean([r["elapsed"] for r in records]),
+                "not_found": sum(1 for r in records if not r["found"]),
+            })
+        if verbosity >= 3:
+            print("{:8s} {:6s} {:>6s} {:>10s} {:>10s} {:>10s}".format(
+                "strategy", "target", "count", "exposures", "time (s)", "not found"))
+            for row in rows:
+                print("{strategy:8s} {target:6s} {count:6d} {exposures:10.1f} {elapsed:10.2f} {not_found:10d}".format(
+                    **row))
+        return rows
+
+    # Strategies
+    ########################################
+    # Each one starts after the first exposure (state: position, value,
+    # bounds) and returns whether the target was found. Every position they
+    # ask for is clamped to the bounds (_clamp).
+
+    @staticmethod
+    def _clamp(state, position):
+        if state["bounds"] is None:
+            return position
+        lo, hi = state["bounds"]
+        return min(max(position, lo), hi)
+
+    def _step(self, measure, move, state, target, intensity, step_size, min_step, polarity, budget):
+        value = state["value"]
+        direction = +1 * polarity
+        if target not in ("max", "min"):
+            target = target * intensity
+            direction = -1 * polarity if value > target else +1 * polarity
+        while step_size >= min_step and budget():
+            prev_value = value
+            position = self._clamp(state, state["position"] + direction * step_size)
+            if position == state["position"]:
+                return False  # at the edge of max_range, still going outwards
+            value = yield from measure(position)
+            if target == "max":
+                reverse = not value > prev_value
+            elif target == "min":
+                reverse = not value < prev_value
+            else:
+                reverse = (-1 * polarity if value > target else +1 * polarity) != direction
+            if reverse:
+                direction *= -1
+                step_size *= 0.5
+        return step_size < min_step
+
+    def _bisect(self, measure, move, state, target, intensity, step_size, min_step, polarity, budget):
+        target = target * intensity
+        a, va = state["position"], state["value"]
+        direction = -1 * polarity if va > target else +1 * polarity
+
+        # Bracket the target, doubling the step (within max_range)
+        b, vb = self._clamp(state, a + direction * step_size), None
+        while budget() and b != a:
+            vb = yield from measure(b)
+            if (vb > target) != (va > target):
+                break
+            a, va = b, vb
+            step_size *= 2
+            b = self._clamp(state, a + direction * step_size)
+        else:
+            return False
+
+        while abs(b - a) > min_step and budget():
+            m = 0.5 * (a + b)
+            vm = yield from measure(m)
+            if (vm > target) == (va > target):
+                a, va = m, vm
+            else:
+                b, vb = m, vm
+
+        # Interpolate within the final bracket
+        yield from move(a + (b - a) * (target - va) / (vb - va) if vb != va else 0.5 * (a + b))
+        return abs(b - a) <= min_step
+
+    def _golden(self, measure, move, state, target, intensity, step_size, min_step, polarity, budget):
+        sign = +1 if target == "max" else -1
+        a, fa = state["position"], sign * state["value"]
+        b = self._clamp(state, a + polarity * step_size)
+        fb = sign * (yield from measure(b))
+        if fb < fa:
+            a, fa, b, fb = b, fb, a, fa
+
+        # Bracket the extremum: a, b, c with f(b) the best (within max_range)
+        c = self._clamp(state, b + (b - a) * (1 - self.GOLDEN) / self.GOLDEN)
+        if c == b:
+            yield from move(b)
+            return False
+        fc = sign * (yield from measure(c))
+        while fc > fb and budget():
+            a, fa, b, fb = b, fb, c, fc
+            c = self._clamp(state, b + (b - a) * (1 - self.GOLDEN) / self.GOLDEN)
+            if c == b:
+                return False  # still improving at the edge of max_range
+            fc = sign * (yield from measure(c))
+
+        lo, hi = min(a, c), max(a, c)
+        while hi - lo > min_step and budget():
+            x = b + self.GOLDEN * (hi - b) if hi - b > b - lo else b - self.GOLDEN * (b - lo)
+            fx = sign * (yield from measure(x))
+            if fx > fb:
+                if x > b:
+                    lo = b
+                else:
+                    hi = b
+                b, fb = x, fx
+            elif x > b:
+                hi = x
+            else:
+                lo = x
+
+        yield from move(b)
+        return hi - lo <= min_step
+
+    def _fit(self, measure, move, state, target, intensity, step_size, min_step, polarity, budget, min_points=5):
+        extremum = target in ("max", "min")
+        sign = -1 if target == "min" else +1
+        if not extremum:
+            target = target * intensity
+        positions, values = [state["position"]], [state["value"]]
+        center = state["position"]
+        for offset in (-1.0, -0.5, 0.5, 1.0):
+            if budget():
+                positions.append(self._clamp(state, center + polarity * offset * step_size))
+                values.append((yield from measure(positions[-1])))
+
+        width, prediction = step_size, None
+        while budget():
+            p, v = np.asarray(positions), sign * np.asarray(values)
+            if extremum:
+                center = p[np.argmax(v)]
+            else:
+                above = v > target
+                if above.all() or not above.any():
+                    # Not bracketed yet: extend beyond the end closest to the target
+                    direction = -1 * polarity if above.all() else +1 * polarity
+                    position = self._clamp(state, p.max() + step_size if direction > 0 else p.min() - step_size)
+                    if position in positions:
+                        return False  # not bracketed within max_range
+                    positions.append(position)
+                    step_size *= 2
+                    values.append((yield from measure(positions[-1])))
+                    continue
+                order = np.argsort(p)
+                crossings = np.nonzero(above[order][1:] != above[order][:-1])[0]
+                reference = state["position"] if prediction is None else prediction
+                i = crossings[np.argmin(np.abs(p[order][crossings] - reference))]
+                center = 0.5 * (p[order][i] + p[order][i + 1])
+
+            near = np.argsort(np.abs(p - center))
+            near = near[:max(min_points, np.count_nonzero(np.abs(p - center) <= width))]
+            if extremum:
+                curvature, slope, offset = np.polyfit(p[near], v[near], 2)
+                if curvature < 0:
+                    new_prediction = np.clip(-slope / (2 * curvature), center - width, center + width)
+                else:
+                    # No peak in this window yet: go uphill
+                    new_prediction = center + np.sign(2 * curvature * center + slope) * width
+            else:
+                slope, offset = np.polyfit(p[near], v[near], 1)
+                if slope * polarity > 0:
+                    new_prediction = np.clip((target - offset) / slope, center - width, center + width)
+                else:
+                    new_prediction = center
+
+            new_prediction = self._clamp(state, new_prediction)
+            converged = prediction is not None and abs(new_prediction - prediction) < min_step
+            prediction = float(new_prediction)
+            if converged:
+                break
+            positions.append(prediction)
+            values.append((yield from measure(prediction)))
+            width = max(0.5 * width, 2 * min_step)
+        else:
+            converged = False
+
+        if prediction is not None:
+            yield from move(prediction)
+            if state["bounds"] is not None and prediction in state["bounds"]:
+                converged = False  # pushed against the edge of max_range
+        return converged
+
+
+axis_search = AxisSearch()
+
+
 class CoordinateSystem(object):
     """
     A generic class defining a coordinate system. Several coordinate systems
@@ -297,6 +1059,7 @@ class CoordinateSystem(object):
             # the CoordinateSystem() class.
             setattr(self, axis["name"], axis_object.get_position)
             setattr(self, axis["name"] + "abs", axis_object.move_absolute)
+            setattr(self, axis["name"] + "abs_plan", axis_object.move_absolute_plan)
             setattr(self, axis["name"] + "r", axis_object.move_relative)
             setattr(self, axis["name"] + "pos", axis_object.get_position)
             setattr(self, axis["name"] + "posMotor", axis_object.get_motor_position)
@@ -793,6 +1556,21 @@ class Axis(object):
         elif verbosity >= 1:
             print("Axis %s disabled (stage %s)." % (self.name, self.stage.name))
 
+    def move_absolute_plan(self, position, verbosity=3):
+        """Plan version of move_absolute: the motion is done with bps.mv (and
+        waited for), so it can be used inside a running plan."""
+
+        base_position = self.cur_to_base(position)
+
+        if self.is_enabled():
+            if self.motor:
+                yield from bps.mv(self.motor, base_position)
+            else:
+                yield from self.base_stage._axes[self.name].move_absolute_plan(base_position, verbosity=0)
+
+        elif verbosity >= 1:
+            print("Axis %s disabled (stage %s)." % (self.name, self.stage.name))
+
     def move_relative(self, move_amount=None, verbosity=3):
         """Move axis relative to the current position."""
 
@@ -931,6 +1709,9 @@ class Axis(object):
         detector=None,
         detector_suffix=None,
         polarity=+1,
+        strategy="step",
+        max_exposures=None,
+        max_range=None,
         verbosity=3,
     ):
         """Moves this axis, searching for a target value.
@@ -950,152 +1731,41 @@ class Axis(object):
             The beamline detector (and suffix, such as '_stats4_total') to trigger to measure intensity
         polarity : +1 or -1
             Positive motion assumes, e.g. a step-height 'up' (as the axis goes more positive)
+        strategy : 'step', 'bisect', 'golden' or 'fit'
+            'step' is the original search; every strategy runs as a single
+            search_plan (see AxisSearch). The exposures and time of every
+            search are recorded in axis_search.history.
+        max_exposures : int
+            Give up after this many exposures
+        max_range : float
+            Never move further than this from the start position (default:
+            axis_search.range_steps × step_size)
         """
 
-        if not get_beamline().beam.is_on():
-            print("WARNING: Experimental shutter is not open.")
-
-        if intensity is None:
-            intensity = RE.md["beam_intensity_expected"]
-
-        if detector is None:
-            # detector = gs.DETS[0]
-            detector = get_beamline().detector[0]
-        if detector_suffix is None:
-            # value_name = gs.TABLE_COLS[0]
-            value_name = get_beamline().TABLE_COLS[0]
-        else:
-            value_name = detector.name + detector_suffix
-
         bec.disable_table()
-
-        # Check current value
-        RE(count([detector]))
-        value = detector.read()[value_name]["value"]
-
-        if target == "max":
-            if verbosity >= 5:
-                print("Performing search on axis '{}' target is 'max'".format(self.name))
-
-            max_value = value
-            max_position = self.get_position(verbosity=0)
-
-            direction = +1 * polarity
-
-            while step_size >= min_step:
-                if verbosity >= 4:
-                    print("        move {} by {} × {}".format(self.name, direction, step_size))
-                self.move_relative(move_amount=direction * step_size, verbosity=verbosity - 2)
-
-                prev_value = value
-                RE(count([detector]))
-
-                value = detector.read()[value_name]["value"]
-                if verbosity >= 3:
-                    print(
-                        "      {} = {:.3f} {}; value : {}".format(
-                            self.name, self.get_position(verbosity=0), self.units, value
-                        )
-                    )
-
-                if value > max_value:
-                    max_value = value
-                    max_position = self.get_position(verbosity=0)
-
-                if value > prev_value:
-                    # Keep going in this direction...
-                    pass
-                else:
-                    # Switch directions!
-                    direction *= -1
-                    step_size *= 0.5
-
-        elif target == "min":
-            if verbosity >= 5:
-                print("Performing search on axis '{}' target is 'min'".format(self.name))
-
-            direction = +1 * polarity
-
-            while step_size >= min_step:
-                if verbosity >= 4:
-                    print("        move {} by {} × {}".format(self.name, direction, step_size))
-                self.move_relative(move_amount=direction * step_size, verbosity=verbosity - 2)
-
-                prev_value = value
-                RE(count([detector]))
-                value = detector.read()[value_name]["value"]
-                if verbosity >= 3:
-                    print(
-                        "      {} = {:.3f} {}; value : {}".format(
-                            self.name, self.get_position(verbosity=0), self.units, value
-                        )
-                    )
-
-                if value < prev_value:
-                    # Keep going in this direction...
-                    pass
-                else:
-                    # Switch directions!
-                    direction *= -1
-                    step_size *= 0.5
-
-        else:
-            target_rel = target
-            target = target_rel * intensity
-
-            if verbosity >= 5:
-                print(
-                    "Performing search on axis '{}' target {} × {} = {}".format(
-                        self.name, target_rel, intensity, target
-                    )
+        try:
+            RE(
+                self.search_plan(
+                    step_size=step_size,
+                    min_step=min_step,
+                    intensity=intensity,
+                    target=target,
+                    detector=detector,
+                    detector_suffix=detector_suffix,
+                    polarity=polarity,
+                    strategy=strategy,
+                    max_exposures=max_exposures,
+                    max_range=max_range,
+                    verbosity=verbosity,
                 )
-            if verbosity >= 4:
-                print("      value : {} ({:.1f}%)".format(value, 100.0 * value / intensity))
-
-            # Determine initial motion direction
-            if value > target:
-                direction = -1 * polarity
-            else:
-                direction = +1 * polarity
-
-            while step_size >= min_step:
-                if verbosity >= 4:
-                    print("        move {} by {} × {}".format(self.name, direction, step_size))
-                self.move_relative(move_amount=direction * step_size, verbosity=verbosity - 2)
-
-                RE(count([detector]))
-                value = detector.read()[value_name]["value"]
-                if verbosity >= 3:
-                    print(
-                        "      {} = {:.3f} {}; value : {} ({:.1f}%)".format(
-                            self.name,
-                            self.get_position(verbosity=0),
-                            self.units,
-                            value,
-                            100.0 * value / intensity,
-                        )
-                    )
-
-                # Determine direction
-                if value > target:
-                    new_direction = -1.0 * polarity
-                else:
-                    new_direction = +1.0 * polarity
-
-                if abs(direction - new_direction) < 1e-4:
-                    # Same direction as we've been going...
-                    # ...keep moving this way
-                    pass
-                else:
-                    # Switch directions!
-                    direction *= -1
-                    step_size *= 0.5
-
-        bec.enable_table()
+            )
+        finally:
+            bec.enable_table()
+        return axis_search.last
 
     def search_plan(
         self,
-        motor=smy,
+        motor=None,
         step_size=1.0,
         min_step=0.05,
         intensity=None,
@@ -1104,12 +1774,18 @@ class Axis(object):
         detector_suffix=None,
         polarity=+1,
         fastsearch=False,
+        strategy="step",
+        max_exposures=None,
+        max_range=None,
         verbosity=3,
     ):
-        """Moves this axis, searching for a target value.
+        """Plan version of search: the whole search is a single run, with one
+        event per exposure.
 
         Parameters
         ----------
+        motor : motor
+            Search by moving this motor (in its own units); by default this axis
         step_size : float
             The initial step size when moving the axis
         min_step : float
@@ -1123,180 +1799,60 @@ class Axis(object):
             The beamline detector (and suffix, such as '_stats4_total') to trigger to measure intensity
         polarity : +1 or -1
             Positive motion assumes, e.g. a step-height 'up' (as the axis goes more positive)
+        fastsearch : bool
+            Stop right away if the reflected beam is already on the detector
+        strategy : 'step', 'bisect', 'golden' or 'fit'
+            See AxisSearch
+        max_exposures : int
+            Give up after this many exposures
+        max_range : float
+            Never move further than this from the start position
         """
 
-        @stage_decorator([detector])
-        def inner_search():
-            if not get_beamline().beam.is_on():
-                print("WARNING: Experimental shutter is not open.")
-
-            if intensity is None:
-                intensity = RE.md["beam_intensity_expected"]
-
-            if detector is None:
-                # detector = gs.DETS[0]
-                detector = get_beamline().detector[0]
-            if detector_suffix is None:
-                # value_name = gs.TABLE_COLS[0]
-                value_name = get_beamline().TABLE_COLS[0]
-            else:
-                value_name = detector.name + detector_suffix
+        if not get_beamline().beam.is_on():
+            print("WARNING: Experimental shutter is not open.")
 
-            bec.disable_table()
+        if detector is None:
+            # detector = gs.DETS[0]
+            detector = get_beamline().detector[0]
+        if detector_suffix is None:
+            # value_name = gs.TABLE_COLS[0]
+            value_name = get_beamline().TABLE_COLS[0]
+        else:
+            value_name = detector.name + detector_suffix
 
-            # Check current value
-            yield from bps.trigger_and_read([detector])
-            # RE(count([detector]))
-            value = detector.read()[value_name]["value"]
+        early_stop = None
+        if fastsearch:
+            intenisty_threshold = 10
 
-            if fastsearch == True:
-                intenisty_threshold = 10
+            def early_stop(value):
                 if (
                     abs(detector.stats2.max_xy.get().y - detector.stats2.centroid.get().y) < 20
                     and detector.stats2.max_value.get() > intenisty_threshold
                 ):
                     # continue the fast alignment
                     print("The reflective beam is found! Continue the fast alignment")
-                    return
-
-            if target == "max":
-                if verbosity >= 5:
-                    print("Performing search on axis '{}' target is 'max'".format(self.name))
-
-                max_value = value
-                max_position = self.get_position(verbosity=0)
-
-                direction = +1 * polarity
-
-                while step_size >= min_step:
-                    if verbosity >= 4:
-                        print("        move {} by {} × {}".format(self.name, direction, step_size))
-
-                    pos = yield from bps.rd(motor)
-                    yield from bps.mv(motor, pos + direction * step_size)
-                    # self.move_relative(move_amount=direction*step_size, verbosity=verbosity-2)
-
-                    prev_value = value
-                    yield from bps.trigger_and_read([detector])
-                    # RE(count([detector]))
-
-                    value = detector.read()[value_name]["value"]
-                    if verbosity >= 3:
-                        print(
-                            "      {} = {:.3f} {}; value : {}".format(
-                                self.name,
-                                self.get_position(verbosity=0),
-                                self.units,
-                                value,
-                            )
-                        )
-
-                    if value > max_value:
-                        max_value = value
-                        # max_position = self.get_position(verbosity=0)
-
-                    if value > prev_value:
-                        # Keep going in this direction...
-                        pass
-                    else:
-                        # Switch directions!
-                        direction *= -1
-                        step_size *= 0.5
-
-            elif target == "min":
-                if verbosity >= 5:
-                    print("Performing search on axis '{}' target is 'min'".format(self.name))
-
-                direction = +1 * polarity
-
-                while step_size >= min_step:
-                    if verbosity >= 4:
-                        print("        move {} by {} × {}".format(self.name, direction, step_size))
-
-                    pos = yield from bps.rd(motor)
-                    yield from bps.mv(motor, pos + direction * step_size)
-                    # self.move_relative(move_amount=direction*step_size, verbosity=verbosity-2)
-
-                    prev_value = value
-                    RE(count([detector]))
-                    value = detector.read()[value_name]["value"]
-                    if verbosity >= 3:
-                        print(
-                            "      {} = {:.3f} {}; value : {}".format(
-                                self.name,
-                                self.get_position(verbosity=0),
-                                self.units,
-                                value,
-                            )
-                        )
-
-                    if value < prev_value:
-                        # Keep going in this direction...
-                        pass
-                    else:
-                        # Switch directions!
-                        direction *= -1
-                        step_size *= 0.5
-
-            else:
-                target_rel = target
-                target = target_rel * intensity
-
-                if verbosity >= 5:
-                    print(
-                        "Performing search on axis '{}' target {} × {} = {}".format(
-                            self.name, target_rel, intensity, target
-                        )
-                    )
-                if verbosity >= 4:
-                    print("      value : {} ({:.1f}%)".format(value, 100.0 * value / intensity))
-
-                # Determine initial motion direction
-                if value > target:
-                    direction = -1 * polarity
-                else:
-                    direction = +1 * polarity
-
-                while step_size >= min_step:
-                    if verbosity >= 4:
-                        print("        move {} by {} × {}".format(self.name, direction, step_size))
-
-                    pos = yield from bps.rd(motor)
-                    yield from bps.mv(motor, pos + direction * step_size)
-                    # self.move_relative(move_amount=direction*step_size, verbosity=verbosity-2)
-
-                    yield from bps.trigger_and_read([detector])
-                    # RE(count([detector]))
-                    value = detector.read()[value_name]["value"]
-                    if verbosity >= 3:
-                        print(
-                            "      {} = {:.3f} {}; value : {} ({:.1f}%)".format(
-                                self.name,
-                                self.get_position(verbosity=0),
-                                self.units,
-                                value,
-                                100.0 * value / intensity,
-                            )
-                        )
-
-                    # Determine direction
-                    if value > target:
-                        new_direction = -1.0 * polarity
-                    else:
-                        new_direction = +1.0 * polarity
-
-                    if abs(direction - new_direction) < 1e-4:
-                        # Same direction as we've been going...
-                        # ...keep moving this way
-                        pass
-                    else:
-                        # Switch directions!
-                        direction *= -1
-                        step_size *= 0.5
-
-            bec.enable_table()
-
-        yield from inner_search()
+                    return True
+                return False
+
+        return (
+            yield from axis_search.plan(
+                self if motor is None else motor,
+                detector,
+                value_name,
+                target=target,
+                intensity=intensity,
+                step_size=step_size,
+                min_step=min_step,
+                polarity=polarity,
+                strategy=strategy,
+                name=self.name if motor is None else motor.name,
+                max_exposures=max_exposures,
+                max_range=max_range,
+                early_stop=early_stop,
+                verbosity=verbosity,
+            )
+        )
 
     def _search(
         self,
@@ -1666,6 +2222,7 @@ class Sample_Generic(CoordinateSystem):
 
         return self.clock()
 
+    @md_snapshot.wrap
     def get_attribute(self, attribute):
         """Return the value of the requested md."""
 
@@ -1764,6 +2321,7 @@ class Sample_Generic(CoordinateSystem):
     def set_md(self, **md):
         self.md.update(md)
 
+    @md_snapshot.wrap
     def get_md(self, prefix="sample_", include_marks=True, **md):
         """Returns a dictionary of the current metadata.
         The 'prefix' argument is prepended to all the md keys, which allows the
@@ -1828,6 +2386,7 @@ class Sample_Generic(CoordinateSystem):
         self.naming_scheme = scheme
         self.naming_delimeter = delimeter
 
+    @md_snapshot.wrap
     def get_naming_string(self, attribute):
         # Handle special cases of formatting the text
 
@@ -1895,6 +2454,7 @@ class Sample_Generic(CoordinateSystem):
 
             return str(att)
 
+    @md_snapshot.wrap
     def get_savename(self, savename_extra=None):
         """Return the filename that will be used to store data for the upcoming
         measurement. The method "naming" lets one control what gets stored in
@@ -1963,6 +2523,7 @@ class Sample_Generic(CoordinateSystem):
     # Measurement methods
     ########################################
 
+    @md_snapshot.wrap
     def get_measurement_md(self, prefix=None, **md):
         # md_current = {}
         md_current = {k: v for k, v in RE.md.items()}  # Global md
@@ -2154,17 +2715,7 @@ class Sample_Generic(CoordinateSystem):
         # self.handle_file(detector, extra=extra, verbosity=verbosity, **md)
         ##self.handle_file(detector, extra=extra, verbosity=verbosity)
 
-    def set_detector_exposure_time(self, detector, exposure_time=None, md=None, verbosity=3):
-        """
-        Set the exposure time for a detector, handling detector-specific logic.
-        Legacy comments and code preserved for reference.
-        """
-        if md is None:
-            md = self.md
-        # --- Legacy logic preserved below ---
-        if 'webcam' in detector.name:
-            # print(f"Setting exposure time for {detector.name} to {exposure_time} s.")
-            return detector.cam.acquire_time.get()
+    def _chosen_exposure_time(self, detector, exposure_time, md):
         # Detector-specific mapping
         det_time_map = {
             "pilatus2m-1": "SAXS_time",
@@ -2178,13 +2729,44 @@ class Sample_Generic(CoordinateSystem):
             chosen_time = exposure_time
         elif key and md.get(key) is not None:
             chosen_time = md[key]
-        # Set if needed
-        if chosen_time is not None and chosen_time != detector.cam.acquire_time.get():
-            detector.cam.acquire_time.set(chosen_time)
-            # print(f"Setting exposure time for {detector.name} to {chosen_time} s.")
-            return chosen_time
-        # --- End legacy logic ---
-        return detector.cam.acquire_time.get()
+        return chosen_time
+
+    def _exposure_targets(self, detectors, exposure_time, md, num_images=None):
+        # {detector: {field: value}} for exposure_setter (webcams are left alone)
+        targets = {}
+        for detector in detectors:
+            if 'webcam' in detector.name:
+                continue
+            targets[detector] = {
+                'acquire_time': self._chosen_exposure_time(detector, exposure_time, md),
+                'num_images': num_images,
+            }
+        return targets
+
+    def _current_exposure_times(self, detectors):
+        return {detector.name: detector.cam.acquire_time.get() for detector in detectors}
+
+    def set_detectors_exposure_time(self, detectors=None, exposure_time=None, md=None, num_images=None, verbosity=3):
+        """
+        Set the exposure time (and optionally the number of images) of all the
+        detectors at once; values already set are not written again (see
+        exposure_setter in 23-detector-exposure.py).
+        Returns {detector name: exposure time}.
+        """
+        if detectors is None:
+            detectors = get_beamline().detector
+        if md is None:
+            md = self.md
+        exposure_setter.set_many(self._exposure_targets(detectors, exposure_time, md, num_images=num_images),
+                                 verbosity=verbosity)
+        return self._current_exposure_times(detectors)
+
+    def set_detector_exposure_time(self, detector, exposure_time=None, md=None, verbosity=3):
+        """
+        Set the exposure time for a detector, handling detector-specific logic.
+        """
+        times = self.set_detectors_exposure_time([detector], exposure_time, md, verbosity=verbosity)
+        return times[detector.name]
 
     def expose(self, exposure_time=None, extra=None, handlefile=True, datasecurity=True, verbosity=3, poling_period=0.1, **md):
         """Internal function that is called to actually trigger a measurement."""
@@ -2195,33 +2777,26 @@ class Sample_Generic(CoordinateSystem):
         # self.log('{} for {}.'.format(md['measure_type'], self.name), **md)
 
 
-        # Modularized exposure time setting
-        for detector in get_beamline().detector:
-            # RE(detector.setExposureTime(exposure_time, verbosity=verbosity))
-            
-            md["exposure_time"] = self.set_detector_exposure_time(detector, exposure_time, self.md, verbosity=verbosity)
+        # Modularized exposure time setting (all detectors at once)
+        times = self.set_detectors_exposure_time(get_beamline().detector, exposure_time, self.md, verbosity=verbosity)
+        if times:
+            md["exposure_time"] = list(times.values())[-1]
             self.md["exposure_time"] = md["exposure_time"]
-
-            # Ensure number of images is 1
-            # if detector.cam.num_images.get() != 1:
-            #     detector.cam.num_images.set(1)
-
-
-            # --- Legacy comments/code preserved below ---
-            # if detector.name is "pilatus800k-1" and exposure_time != detector.cam.acquire_time.get():  #caget('XF:11BMB-ES{Det:PIL2M}:cam1:AcquireTime'):
-            # RE(detector.setExposureTime(exposure_time, verbosity=verbosity))
-            # if detector.name is "pilatus300k-1" and exposure_time != detector.cam.acquire_time.get():
-            #     detector.setExposureTime(exposure_time, verbosity=verbosity)
-            ##extra wait time when changing the exposure time.
-            ##time.sleep(2)
-            #############################################
-            ##extra wait time for adjusting pilatus2M
-            ##this extra wait time has to be added. Otherwise, the exposure will be skipped when the exposure time is increased
-            ##Note by 091918
-            #############################################
-            # time.sleep(2)
-            # elif detector.name is 'PhotonicSciences_CMS':
-            # detector.setExposureTime(exposure_time, verbosity=verbosity)
+        # --- Legacy comments/code preserved below ---
+        # if detector.name is "pilatus800k-1" and exposure_time != detector.cam.acquire_time.get():  #caget('XF:11BMB-ES{Det:PIL2M}:cam1:AcquireTime'):
+        # RE(detector.setExposureTime(exposure_time, verbosity=verbosity))
+        # if detector.name is "pilatus300k-1" and exposure_time != detector.cam.acquire_time.get():
+        #     detector.setExposureTime(exposure_time, verbosity=verbosity)
+        ##extra wait time when changing the exposure time.
+        ##time.sleep(2)
+        #############################################
+        ##extra wait time for adjusting pilatus2M
+        ##this extra wait time has to be added. Otherwise, the exposure will be skipped when the exposure time is increased
+        ##Note by 091918
+        #############################################
+        # time.sleep(2)
+        # elif detector.name is 'PhotonicSciences_CMS':
+        # detector.setExposureTime(exposure_time, verbosity=verbosity)
 
         # Do acquisition
         get_beamline().beam.on()
@@ -2500,6 +3075,10 @@ class Sample_Generic(CoordinateSystem):
             # if 'camera' in detector.name:
             #     link_name = "{}/{}{}_000000_{}.png".format(RE.md["experiment_alias_directory"], subdir, savename, detname).replace('//','/')
             print(f"  A symlink will be created at: {proposal_path()}experiments/{link_name}")
+            # The link itself is made by link_farm, off the acquisition thread (93-resource-links.py)
+            if 'webcam' not in detector.name:
+                link_template = link_farm.link_template("{}experiments/{}".format(proposal_path(), link_name))
+                link_farm.enqueue(resource_index.last_uid, detector, link_template)
             
             # if os.path.isfile(link_name):
             #     i = 1
@@ -2742,6 +3321,65 @@ class Sample_Generic(CoordinateSystem):
                 print("WARNING: Can't do file handling for detector '{}'.".format(detector.name))
                 return
 
+    # Plan versions of expose/measure
+    ########################################
+    # expose() and measure() call RE(...) themselves, so each exposure pays a
+    # full RunEngine start/stop. The *_plan methods only yield messages and
+    # can be composed into one plan, e.g. RE(hol.doSamples_plan()). Each
+    # exposure is still its own run, with its own resource documents (see
+    # exposure_run), so the documents and file handling are the same as with
+    # expose(). doSamples_plan stages the detectors once for the whole holder.
+
+    def set_detector_exposure_time_plan(self, detector, exposure_time=None, md=None, verbosity=3):
+        """Plan version of set_detector_exposure_time (waits for the new value)."""
+        times = yield from self.set_detectors_exposure_time_plan([detector], exposure_time, md, verbosity=verbosity)
+        return times[detector.name]
+
+    def set_detectors_exposure_time_plan(self, detectors=None, exposure_time=None, md=None, num_images=None,
+                                         verbosity=3):
+        """Plan version of set_detectors_exposure_time."""
+        if detectors is None:
+            detectors = get_beamline().detector
+        if md is None:
+            md = self.md
+        future = exposure_setter.set_many(self._exposure_targets(detectors, exposure_time, md, num_images=num_images),
+                                          wait=False)
+        yield from bps.wait_for([lambda: asyncio.wrap_future(future)])
+        exposure_setter.check(future.result())
+        return self._current_exposure_times(detectors)
+
+    def expose_plan(self, exposure_time=None, extra=None, handlefile=True, shutter=True, verbosity=3, **md):
+        """Plan version of expose(): one exposure (one run) of get_beamline().detector.
+        Returns the uid of the run."""
+
+        if "measure_type" not in md:
+            md["measure_type"] = "expose"
+
+        detectors = get_beamline().detector
+        times = yield from self.set_detectors_exposure_time_plan(detectors, exposure_time, self.md, verbosity=verbosity)
+        if times:
+            md["exposure_time"] = list(times.values())[-1]
+            self.md["exposure_time"] = md["exposure_time"]
+
+        md["plan_header_override"] = md["measure_type"]
+        if 'temperature_Linkam' in self.naming_scheme:
+            md["temperature_Linkam"] = LThermal.temperature()
+
+        if shutter:
+            yield from shutter_on(verbosity=0)
+            uid = yield from bpp.finalize_wrapper(exposure_run(detectors, md=md), shutter_off(verbosity=0))
+        else:
+            uid = yield from exposure_run(detectors, md=md)
+
+        if handlefile:
+            for detector in detectors:
+                self.md["exposure_time"] = detector.cam.acquire_time.get()
+                md["exposure_time"] = detector.cam.acquire_time.get()
+                md["filename"] = self.get_savename()
+                self.handle_file(detector, extra=extra, verbosity=verbosity, **md)
+
+        return uid
+
     def snap(self, exposure_time=None, extra=None, measure_type="snap", verbosity=3, **md):
         """Take a quick exposure (without saving data)."""
 
@@ -2778,229 +3416,39 @@ class Sample_Generic(CoordinateSystem):
         tiling : string
             Controls the detector tiling mode.
               None : regular measurement (single detector position)
+              'xygaps' : 4-tile coverage (pos1, pos2, pos4, pos3; see TILING_CONFIGS)
               'ygaps' : try to cover the vertical gaps in the Pilatus detector
         """
 
-        if tiling == "xygaps":
-            if cms.detector == [pilatus2M]:
-                SAXSy_o = SAXSy.user_readback.value
-                SAXSx_o = SAXSx.user_readback.value
-
-                extra_current = "pos1" if extra is None else "{}_pos1".format(extra)
-                md["detector_position"] = "lower_left"
-                self.measure_single(
-                    exposure_time=exposure_time,
-                    extra=extra_current,
-                    measure_type=measure_type,
-                    verbosity=verbosity,
-                    stitchback=True,
-                    **md,
-                )
-
-                # extra x movement is needed for pilatus2M.
-
-                SAXSy.move(SAXSy.user_readback.value + 5.16)
-                extra_current = "pos2" if extra is None else "{}_pos2".format(extra)
-                md["detector_position"] = "upper_left"
-                self.measure_single(
-                    exposure_time=exposure_time,
-                    extra=extra_current,
-                    measure_type=measure_type,
-                    verbosity=verbosity,
-                    stitchback=True,
-                    **md,
-                )
-
-                # SAXSy.move(SAXSy.user_readback.value + -5.16)
-                SAXSx.move(SAXSx.user_readback.value + 5.16)
-                extra_current = "pos4" if extra is None else "{}_pos4".format(extra)
-                md["detector_position"] = "upper_right"
-                self.measure_single(
-                    exposure_time=exposure_time,
-                    extra=extra_current,
-                    measure_type=measure_type,
-                    verbosity=verbosity,
-                    stitchback=True,
-                    **md,
-                )
-
-                SAXSy.move(SAXSy.user_readback.value + -5.16)
-                extra_current = "pos3" if extra is None else "{}_pos3".format(extra)
-                md["detector_position"] = "lower_right"
-                self.measure_single(
-                    exposure_time=exposure_time,
-                    extra=extra_current,
-                    measure_type=measure_type,
-                    verbosity=verbosity,
-                    stitchback=True,
-                    **md,
-                )
-
-                SAXSx.move(SAXSx.user_readback.value + -5.16)
-
-                if SAXSx.user_readback.value != SAXSx_o:
-                    SAXSx.move(SAXSx_o)
-                if SAXSy.user_readback.value != SAXSy_o:
-                    SAXSy.move(SAXSy_o)
-            if cms.detector == [pilatus800]:
-                WAXSy_o = WAXSy.user_readback.value
-                WAXSx_o = WAXSx.user_readback.value
-
-                extra_current = "pos1" if extra is None else "{}_pos1".format(extra)
-                md["detector_position"] = "lower_left"
-                self.measure_single(
-                    exposure_time=exposure_time,
-                    extra=extra_current,
-                    measure_type=measure_type,
-                    verbosity=verbosity,
-                    stitchback=True,
-                    **md,
-                )
-
-                # extra x movement is needed for pilatus2M.
-
-                WAXSy.move(WAXSy.user_readback.value + 5.16)
-                extra_current = "pos2" if extra is None else "{}_pos2".format(extra)
-                md["detector_position"] = "upper_left"
-                self.measure_single(
-                    exposure_time=exposure_time,
-                    extra=extra_current,
-                    measure_type=measure_type,
-                    verbosity=verbosity,
-                    stitchback=True,
-                    **md,
-                )
-
-                WAXSx.move(WAXSx.user_readback.value - 5.16)
-                extra_current = "pos4" if extra is None else "{}_pos4".format(extra)
-                md["detector_position"] = "upper_right"
-                self.measure_single(
-                    exposure_time=exposure_time,
-                    extra=extra_current,
-                    measure_type=measure_type,
-                    verbosity=verbosity,
-                    stitchback=True,
-                    **md,
-                )
-
-                WAXSy.move(WAXSy.user_readback.value + -5.16)
-                extra_current = "pos3" if extra is None else "{}_pos3".format(extra)
-                md["detector_position"] = "lower_right"
-                self.measure_single(
-                    exposure_time=exposure_time,
-                    extra=extra_current,
-                    measure_type=measure_type,
-                    verbosity=verbosity,
-                    stitchback=True,
-                    **md,
-                )
-
-                WAXSx.move(WAXSx.user_readback.value + 5.16)
-
-                if WAXSx.user_readback.value != WAXSx_o:
-                    WAXSx.move(WAXSx_o)
-                if WAXSy.user_readback.value != WAXSy_o:
-                    WAXSy.move(WAXSy_o)
-
-        elif tiling == "ygaps":
-            if cms.detector == [pilatus2M]:
-                SAXSy_o = SAXSy.user_readback.value
-                SAXSx_o = SAXSx.user_readback.value
-
-                extra_current = "pos1" if extra is None else "{}_pos1".format(extra)
-                md["detector_position"] = "lower"
-                self.measure_single(
-                    exposure_time=exposure_time,
-                    extra=extra_current,
-                    measure_type=measure_type,
-                    verbosity=verbosity,
-                    stitchback=True,
-                    **md,
-                )
-
-                # extra x movement is needed for pilatus2M.
-
-                extra_current = "pos2" if extra is None else "{}_pos2".format(extra)
-                md["detector_position"] = "upper"
-                SAXSy.move(SAXSy.user_readback.value + 5.16)
-                time.sleep(5)
-                self.measure_single(
-                    exposure_time=exposure_time,
-                    extra=extra_current,
-                    measure_type=measure_type,
-                    verbosity=verbosity,
-                    stitchback=True,
-                    **md,
-                )
-
-                SAXSy.move(SAXSy.user_readback.value - 5.16)
-                time.sleep(5)
-                if SAXSx.user_readback.value != SAXSx_o:
-                    SAXSx.move(SAXSx_o)
-                if SAXSy.user_readback.value != SAXSy_o:
-                    SAXSy.move(SAXSy_o)
-
-            if cms.detector == [pilatus300]:
-                # MAXSy_o = MAXSy.user_readback.value
-
-                extra_current = "pos1" if extra is None else "{}_pos1".format(extra)
-                md["detector_position"] = "lower"
-                self.measure_single(
-                    exposure_time=exposure_time,
-                    extra=extra_current,
-                    measure_type=measure_type,
-                    verbosity=verbosity,
-                    stitchback=True,
-                    **md,
-                )
-
-                MAXSy.move(MAXSy.user_readback.value + 5.16)
-                extra_current = "pos2" if extra is None else "{}_pos2".format(extra)
-                md["detector_position"] = "upper"
-                self.measure_single(
-                    exposure_time=exposure_time,
-                    extra=extra_current,
-                    measure_type=measure_type,
-                    verbosity=verbosity,
-                    stitchback=True,
-                    **md,
-                )
-
-                MAXSy.move(MAXSy.user_readback.value + -5.16)
-
-                # if MAXSy.user_readback.value != MAXSy_o:
-                # MAXSy.move(MAXSy_o)
-
-            if cms.detector == [pilatus800]:
-                WAXSy_o = WAXSy.user_readback.value
-
-                extra_current = "pos1" if extra is None else "{}_pos1".format(extra)
-                md["detector_position"] = "lower"
-                self.measure_single(
-                    exposure_time=exposure_time,
-                    extra=extra_current,
-                    measure_type=measure_type,
-                    verbosity=verbosity,
-                    stitchback=True,
-                    **md,
-                )
-
-                WAXSy.move(WAXSy.user_readback.value + 5.16)
-                extra_current = "pos2" if extra is None else "{}_pos2".format(extra)
-                md["detector_position"] = "upper"
-                self.measure_single(
-                    exposure_time=exposure_time,
-                    extra=extra_current,
-                    measure_type=measure_type,
-                    verbosity=verbosity,
-                    stitchback=True,
-                    **md,
-                )
-
-                WAXSy.move(WAXSy.user_readback.value - 5.16)
+        # Detector stages moved by each tiling mode (TILING_CONFIGS keys), when that
+        # detector is the only one in use
+        tiling_keys = {
+            "xygaps": ((pilatus2M, ("SAXSx", "SAXSy")), (pilatus800, ("WAXSx", "WAXSy"))),
+            "ygaps": ((pilatus2M, ("SAXSx", "SAXSy")), (pilatus300, ("MAXSy",)), (pilatus800, ("WAXSy",))),
+        }
 
-                # if WAXSy.user_readback.value != WAXSy_o:
-                # WAXSy.move(MAXSy_o)
+        if tiling in tiling_keys:
+            for detector, keys in tiling_keys[tiling]:
+                if cms.detector != [detector]:
+                    continue
+                motors = [(globals()[key], key) for key in keys]
+                origins = {motor: motor.user_readback.value for motor, key in motors}
+                try:
+                    for tile in TILING_CONFIGS[tiling]:
+                        # offsets from the saved origin, x and y together, then settle
+                        tiling_scheduler.move({motor: origins[motor] + tile[key] for motor, key in motors})
+                        extra_current = tile["label"] if extra is None else "{}_{}".format(extra, tile["label"])
+                        md["detector_position"] = tile["detector_position"]
+                        self.measure_single(
+                            exposure_time=exposure_time,
+                            extra=extra_current,
+                            measure_type=measure_type,
+                            verbosity=verbosity,
+                            stitchback=True,
+                            **md,
+                        )
+                finally:
+                    tiling_scheduler.move(origins)
         # if tiling is 'big':
         # TODO: Use multiple images to fill the entire detector motion range
 
@@ -3069,6 +3517,60 @@ class Sample_Generic(CoordinateSystem):
                 f"Unknown tiling mode {tiling!r}. Valid options are: {list(TILING_CONFIGS.keys())}"
             )
 
+    def measure_single_plan(self, exposure_time=None, extra=None, measure_type="measure", verbosity=3, **md):
+        """Plan version of measure_single (see expose_plan)."""
+
+        if verbosity >= 2 and (get_beamline().current_mode != "measurement"):
+            print(
+                "WARNING: Beamline is not in measurement mode (mode is '{}')".format(get_beamline().current_mode)
+            )
+
+        if verbosity >= 1 and len(get_beamline().detector) < 1:
+            print("ERROR: No detectors defined in cms.detector")
+            return
+
+        for detector in get_beamline().detector:
+            if exposure_time is not None and exposure_time != detector.cam.acquire_time.get():
+                yield from detector.setExposureTime(exposure_time, verbosity=verbosity)
+            self.md["exposure_time"] = detector.cam.acquire_time.get()
+
+        savename = self.get_savename(savename_extra=extra)
+
+        md_current = self.get_md()
+        md_current.update(self.get_measurement_md())
+        md_current["sample_savename"] = savename
+        md_current["measure_type"] = measure_type
+        md_current["filename"] = "{:s}_{:06d}".format(savename, RE.md["scan_id"])
+        md_current.update(md)
+
+        uid = yield from self.expose_plan(exposure_time, extra=extra, verbosity=verbosity, **md_current)
+
+        self.md["measurement_ID"] += 1
+        return uid
+
+    def measure_plan(self, exposure_time=None, extra=None, measure_type="measure", verbosity=3, tiling=None, **md):
+        """Plan version of measure(): RE(sam.measure_plan(1)).
+
+        tiling : None, 'ygaps' or 'xygaps' (see TILING_CONFIGS and tiling_plan)
+        """
+        if tiling is None:
+            return (yield from self.measure_single_plan(
+                exposure_time=exposure_time, extra=extra, measure_type=measure_type, verbosity=verbosity, **md
+            ))
+        if tiling not in TILING_CONFIGS:
+            raise ValueError(
+                f"Unknown tiling mode {tiling!r}. Valid options are: {list(TILING_CONFIGS.keys())}"
+            )
+        yield from tiling_plan(
+            tiling,
+            self.measure_single_plan,
+            exposure_time=exposure_time,
+            extra=extra,
+            measure_type=measure_type,
+            verbosity=verbosity,
+            **md,
+        )
+
     def measureRock(
         self,
         incident_angle=None,
@@ -3252,36 +3754,36 @@ class Sample_Generic(CoordinateSystem):
     def prepare_detector(self, mode, exposure_time=None, md=None, verbosity=3):
         """
         Prepare all detectors: set exposure time and number of images.
-        Uses set_detector_exposure_time for modular logic.
+        Uses set_detectors_exposure_time for modular logic.
         Legacy comments preserved.
         """
         if md is None:
             md = self.md
-        for detector in get_beamline().detector:
-            md["exposure_time"] = self.set_detector_exposure_time(detector, exposure_time, md, verbosity=verbosity)
-            # Ensure number of images is 1
-            if mode in ('measure', 'snap', 'expose'):
-                if detector.cam.num_images.get() != 1:
-                    detector.cam.num_images.set(1)
-            if mode == 'series_measure':
-                if detector.cam.num_images.get() != md.get('num_frames', 1):
-                    detector.cam.num_images.set(md.get('num_frames', 1))
-                    
-            # --- Legacy comments/code preserved below ---
-            # if detector.name is "pilatus800k-1" and exposure_time != detector.cam.acquire_time.get():  #caget('XF:11BMB-ES{Det:PIL2M}:cam1:AcquireTime'):
-            # RE(detector.setExposureTime(exposure_time, verbosity=verbosity))
-            # if detector.name is "pilatus300k-1" and exposure_time != detector.cam.acquire_time.get():
-            # detector.setExposureTime(exposure_time, verbosity=verbosity)
-            ##extra wait time when changing the exposure time.
-            ##time.sleep(2)
-            #############################################
-            ##extra wait time for adjusting pilatus2M
-            ##this extra wait time has to be added. Otherwise, the exposure will be skipped when the exposure time is increased
-            ##Note by 091918
-            #############################################
-            # time.sleep(2)
-            # elif detector.name is 'PhotonicSciences_CMS':
-            # detector.setExposureTime(exposure_time, verbosity=verbosity)
+        num_images = None
+        if mode in ('measure', 'snap', 'expose'):
+            num_images = 1
+        if mode == 'series_measure':
+            num_images = md.get('num_frames', 1)
+        # Exposure time and number of images of all detectors in one go
+        times = self.set_detectors_exposure_time(get_beamline().detector, exposure_time, md, num_images=num_images,
+                                                 verbosity=verbosity)
+        if times:
+            md["exposure_time"] = list(times.values())[-1]
+        # --- Legacy comments/code preserved below ---
+        # if detector.name is "pilatus800k-1" and exposure_time != detector.cam.acquire_time.get():  #caget('XF:11BMB-ES{Det:PIL2M}:cam1:AcquireTime'):
+        # RE(detector.setExposureTime(exposure_time, verbosity=verbosity))
+        # if detector.name is "pilatus300k-1" and exposure_time != detector.cam.acquire_time.get():
+        # detector.setExposureTime(exposure_time, verbosity=verbosity)
+        ##extra wait time when changing the exposure time.
+        ##time.sleep(2)
+        #############################################
+        ##extra wait time for adjusting pilatus2M
+        ##this extra wait time has to be added. Otherwise, the exposure will be skipped when the exposure time is increased
+        ##Note by 091918
+        #############################################
+        # time.sleep(2)
+        # elif detector.name is 'PhotonicSciences_CMS':
+        # detector.setExposureTime(exposure_time, verbosity=verbosity)
 
     # Caution: This function is still under development, please use with caution.
     # Issues to be resolved: 
@@ -3821,6 +4323,23 @@ class Sample_Generic(CoordinateSystem):
 
 
 
+    def do_plan(self, step=0, verbosity=3, **md):
+        """Plan version of do(): go to the origin (with bps.mv) and measure_plan."""
+
+        if verbosity >= 4:
+            print("  doing sample {}".format(self.name))
+
+        if step <= 1:
+            if verbosity >= 5:
+                print("    step 1: goto origin")
+            yield from self.xabs_plan(0)
+            yield from self.yabs_plan(0)
+
+        if step <= 10:
+            if verbosity >= 5:
+                print("    step 10: measuring")
+            yield from self.measure_plan(**md)
+
     def scan_measure(
         self,
         motor,
@@ -4377,6 +4896,9 @@ class Sample_Generic(CoordinateSystem):
             # link_name = '{}/{}{}_{:04d}_maxs.tiff'.format(RE.md['experiment_alias_directory'], subdir, savename, RE.md['scan_id']-1)
             link_name = "{}/{}{}_000000_{}.tiff".format(RE.md["experiment_alias_directory"], subdir, savename, detname).replace('//', '/')
             print(f"  Symlinks will be created at: {proposal_path()}experiments/{link_name}")
+            # The links themselves are made by link_farm, off the acquisition thread (93-resource-links.py)
+            link_template = link_farm.link_template("{}experiments/{}".format(proposal_path(), link_name))
+            link_farm.enqueue(resource_index.last_uid, detector, link_template, num_frames=num_frames or 1)
 
     # Control methods
     ########################################
@@ -4393,7 +4915,7 @@ class Sample_Generic(CoordinateSystem):
                         caget("XF:11BM-ES{Env:01-Out:1}T-SP") - 273.15, temperature
                     )
                 )
-            caput("XF:11BM-ES{Env:01-Out:1}T-SP", temperature + 273.15)
+            md_snapshot.caput("XF:11BM-ES{Env:01-Out:1}T-SP", temperature + 273.15)
 
         if output_channel == "2":
             if verbosity >= 2:
@@ -4402,7 +4924,7 @@ class Sample_Generic(CoordinateSystem):
                         caget("XF:11BM-ES{Env:01-Out:2}T-SP") - 273.15, temperature
                     )
                 )
-            caput("XF:11BM-ES{Env:01-Out:2}T-SP", temperature + 273.15)
+            md_snapshot.caput("XF:11BM-ES{Env:01-Out:2}T-SP", temperature + 273.15)
 
         if output_channel == "3":
             if verbosity >= 2:
@@ -4411,7 +4933,7 @@ class Sample_Generic(CoordinateSystem):
                         caget("XF:11BM-ES{Env:01-Out:3}T-SP") - 273.15, temperature
                     )
                 )
-            caput("XF:11BM-ES{Env:01-Out:3}T-SP", temperature + 273.15)
+            md_snapshot.caput("XF:11BM-ES{Env:01-Out:3}T-SP", temperature + 273.15)
 
         if output_channel == "4":
             if verbosity >= 2:
@@ -4420,7 +4942,7 @@ class Sample_Generic(CoordinateSystem):
                         caget("XF:11BM-ES{Env:01-Out:4}T-SP") - 273.15, temperature
                     )
                 )
-            caput("XF:11BM-ES{Env:01-Out:4}T-SP", temperature + 273.15)
+            md_snapshot.caput("XF:11BM-ES{Env:01-Out:4}T-SP", temperature + 273.15)
 
         # temperature_set_RBV = caget("XF:11BM-ES{Env:01-Out:1}T-RB")
 
@@ -4429,7 +4951,7 @@ class Sample_Generic(CoordinateSystem):
         # print('Temperature functions not implemented in {}'.format(self.__class__.__name__))
 
         if temperature_probe == "A":
-            current_temperature = caget("XF:11BM-ES{Env:01-Chan:A}T:C-I")
+            current_temperature = md_snapshot.caget("XF:11BM-ES{Env:01-Chan:A}T:C-I")
             if verbosity >= 3:
                 print(
                     "  Temperature = {:.3f}°C (setpoint = {:.3f}°C)".format(
@@ -4438,7 +4960,7 @@ class Sample_Generic(CoordinateSystem):
                     )
                 )
         if temperature_probe == "B":
-            current_temperature = caget("XF:11BM-ES{Env:01-Chan:B}T:C-I")
+            current_temperature = md_snapshot.caget("XF:11BM-ES{Env:01-Chan:B}T:C-I")
             if verbosity >= 3:
                 print(
                     "  Temperature = {:.3f}°C (setpoint = {:.3f}°C)".format(
@@ -4447,7 +4969,7 @@ class Sample_Generic(CoordinateSystem):
                     )
                 )
         if temperature_probe == "C":
-            current_temperature = caget("XF:11BM-ES{Env:01-Chan:C}T:C-I")
+            current_temperature = md_snapshot.caget("XF:11BM-ES{Env:01-Chan:C}T:C-I")
             if verbosity >= 3:
                 print(
                     "  Temperature = {:.3f}°C (setpoint = {:.3f}°C)".format(
@@ -4456,7 +4978,7 @@ class Sample_Generic(CoordinateSystem):
                     )
                 )
         if temperature_probe == "D":
-            current_temperature = caget("XF:11BM-ES{Env:01-Chan:D}T:C-I")
+            current_temperature = md_snapshot.caget("XF:11BM-ES{Env:01-Chan:D}T:C-I")
             if verbosity >= 3:
                 print(
                     "  Temperature = {:.3f}°C (setpoint = {:.3f}°C)".format(
@@ -4589,16 +5111,16 @@ class Sample_Generic(CoordinateSystem):
         # print('Temperature functions not implemented in {}'.format(self.__class__.__name__))
 
         if output_channel == "1":
-            setpoint_temperature = caget("XF:11BM-ES{Env:01-Out:1}T-SP")
+            setpoint_temperature = md_snapshot.caget("XF:11BM-ES{Env:01-Out:1}T-SP")
 
         if output_channel == "2":
-            setpoint_temperature = caget("XF:11BM-ES{Env:01-Out:2}T-SP")
+            setpoint_temperature = md_snapshot.caget("XF:11BM-ES{Env:01-Out:2}T-SP")
 
         if output_channel == "3":
-            setpoint_temperature = caget("XF:11BM-ES{Env:01-Out:3}T-SP")
+            setpoint_temperature = md_snapshot.caget("XF:11BM-ES{Env:01-Out:3}T-SP")
 
         if output_channel == "4":
-            setpoint_temperature = caget("XF:11BM-ES{Env:01-Out:4}T-SP")
+            setpoint_temperature = md_snapshot.caget("XF:11BM-ES{Env:01-Out:4}T-SP")
 
         return setpoint_temperature
 
@@ -4690,6 +5212,8 @@ class Holder(Stage):
     to store the positions of multiple samples, and to automate the measurement
     of multiple samples."""
 
+    sample_order = "number"  # or "path": default order of doSamples & co (see getSamples)
+
     # Core methods
     ########################################
 
@@ -4893,12 +5417,15 @@ class Holder(Stage):
 
     import string
 
-    def getSamples(self, range=None, verbosity=3):
+    def getSamples(self, range=None, verbosity=3, order="number"):
         """Get the list of samples associated with this holder.
 
         If the optional range argument is provided (2-tuple), then only sample
         numbers within that range (inclusive) are run. If range is instead a
-        string, then all samples with names that match are returned."""
+        string, then all samples with names that match are returned.
+
+        The samples are sorted by sample number, or with order='path' along the
+        path with the least predicted stage travel (see SamplePathPlanner)."""
 
         samples = []
 
@@ -4938,8 +5465,16 @@ class Holder(Stage):
             if verbosity >= 1:
                 print('Range argument "{}" not understood.'.format(range))
 
+        if order == "path":
+            samples = sample_path_planner.order(samples, verbosity=verbosity)
+        elif order != "number" and verbosity >= 1:
+            print('Order argument "{}" not understood.'.format(order))
+
         return samples
 
+    def _order(self, order):
+        return self.sample_order if order is None else order
+
     def listSamples(self):
         """Print a list of the current samples associated with this holder/
         bar."""
@@ -4969,7 +5504,7 @@ class Holder(Stage):
                         caget("XF:11BM-ES{Env:01-Out:1}T-SP") - 273.15, temperature
                     )
                 )
-            caput("XF:11BM-ES{Env:01-Out:1}T-SP", temperature + 273.15)
+            md_snapshot.caput("XF:11BM-ES{Env:01-Out:1}T-SP", temperature + 273.15)
 
         if output_channel == "2":
             if verbosity >= 2:
@@ -4978,7 +5513,7 @@ class Holder(Stage):
                         caget("XF:11BM-ES{Env:01-Out:2}T-SP") - 273.15, temperature
                     )
                 )
-            caput("XF:11BM-ES{Env:01-Out:2}T-SP", temperature + 273.15)
+            md_snapshot.caput("XF:11BM-ES{Env:01-Out:2}T-SP", temperature + 273.15)
 
         if output_channel == "3":
             if verbosity >= 2:
@@ -4987,7 +5522,7 @@ class Holder(Stage):
                         caget("XF:11BM-ES{Env:01-Out:3}T-SP") - 273.15, temperature
                     )
                 )
-            caput("XF:11BM-ES{Env:01-Out:3}T-SP", temperature + 273.15)
+            md_snapshot.caput("XF:11BM-ES{Env:01-Out:3}T-SP", temperature + 273.15)
 
         if output_channel == "4":
             if verbosity >= 2:
@@ -4996,7 +5531,7 @@ class Holder(Stage):
                         caget("XF:11BM-ES{Env:01-Out:4}T-SP") - 273.15, temperature
                     )
                 )
-            caput("XF:11BM-ES{Env:01-Out:4}T-SP", temperature + 273.15)
+            md_snapshot.caput("XF:11BM-ES{Env:01-Out:4}T-SP", temperature + 273.15)
 
             # temperature_set_RBV = caget("XF:11BM-ES{Env:01-Out:1}T-RB")
 
@@ -5005,7 +5540,7 @@ class Holder(Stage):
         # print('Temperature functions not implemented in {}'.format(self.__class__.__name__))
 
         if temperature_probe == "A":
-            current_temperature = caget("XF:11BM-ES{Env:01-Chan:A}T:C-I")
+            current_temperature = md_snapshot.caget("XF:11BM-ES{Env:01-Chan:A}T:C-I")
             if verbosity >= 3:
                 print(
                     "  Temperature = {:.3f}°C (setpoint = {:.3f}°C)".format(
@@ -5015,7 +5550,7 @@ class Holder(Stage):
                 )
 
         if temperature_probe == "B":
-            current_temperature = caget("XF:11BM-ES{Env:01-Chan:B}T:C-I")
+            current_temperature = md_snapshot.caget("XF:11BM-ES{Env:01-Chan:B}T:C-I")
             if verbosity >= 3:
                 print(
                     "  Temperature = {:.3f}°C (setpoint = {:.3f}°C)".format(
@@ -5025,7 +5560,7 @@ class Holder(Stage):
                 )
 
         if temperature_probe == "C":
-            current_temperature = caget("XF:11BM-ES{Env:01-Chan:C}T:C-I")
+            current_temperature = md_snapshot.caget("XF:11BM-ES{Env:01-Chan:C}T:C-I")
             if verbosity >= 3:
                 print(
                     "  Temperature = {:.3f}°C (setpoint = {:.3f}°C)".format(
@@ -5035,7 +5570,7 @@ class Holder(Stage):
                 )
 
         if temperature_probe == "D":
-            current_temperature = caget("XF:11BM-ES{Env:01-Chan:D}T:C-I")
+            current_temperature = md_snapshot.caget("XF:11BM-ES{Env:01-Chan:D}T:C-I")
             if verbosity >= 3:
                 print(
                     "  Temperature = {:.3f}°C (setpoint = {:.3f}°C)".format(
@@ -5051,34 +5586,80 @@ class Holder(Stage):
         # print('Temperature functions not implemented in {}'.format(self.__class__.__name__))
 
         if output_channel == "1":
-            setpoint_temperature = caget("XF:11BM-ES{Env:01-Out:1}T-SP")
+            setpoint_temperature = md_snapshot.caget("XF:11BM-ES{Env:01-Out:1}T-SP")
 
         if output_channel == "2":
-            setpoint_temperature = caget("XF:11BM-ES{Env:01-Out:2}T-SP")
+            setpoint_temperature = md_snapshot.caget("XF:11BM-ES{Env:01-Out:2}T-SP")
 
         if output_channel == "3":
-            setpoint_temperature = caget("XF:11BM-ES{Env:01-Out:3}T-SP")
+            setpoint_temperature = md_snapshot.caget("XF:11BM-ES{Env:01-Out:3}T-SP")
 
         if output_channel == "4":
-            setpoint_temperature = caget("XF:11BM-ES{Env:01-Out:4}T-SP")
+            setpoint_temperature = md_snapshot.caget("XF:11BM-ES{Env:01-Out:4}T-SP")
 
         return setpoint_temperature
 
     # Action (measurement) methods
     ########################################
 
-    def doSamples(self, range=None, verbosity=3, **md):
+    def doSamples(self, range=None, verbosity=3, order=None, **md):
         """Activate the default action (typically measurement) for all the samples.
 
         If the optional range argument is provided (2-tuple), then only sample
         numbers within that range (inclusive) are run. If range is instead a
-        string, then all samples with names that match are returned."""
+        string, then all samples with names that match are returned.
+        order: "number" or "path" (see getSamples); default: self.sample_order."""
 
-        for sample in self.getSamples(range=range):
+        for sample in self.getSamples(range=range, order=self._order(order)):
             if verbosity >= 3:
                 print("Doing sample {}...".format(sample.name))
             sample.do(verbosity=verbosity, **md)
 
+    def doSamples_plan(self, range=None, verbosity=3, order=None, **md):
+        """Plan version of doSamples(), to measure the whole holder with a single
+        RE(...) call: RE(hol.doSamples_plan()).
+
+        The samples are done with their do_plan(); a sample whose do() is
+        customized without a matching do_plan() raises TypeError before
+        anything moves. The detectors are staged once for the whole holder;
+        each exposure is still its own run (see exposure_run)."""
+
+        samples = self.getSamples(range=range, order=self._order(order))
+        for sample in samples:
+            self._check_do_plan(sample)
+
+        def inner():
+            for sample in samples:
+                if verbosity >= 3:
+                    print("Doing sample {}...".format(sample.name))
+                yield from sample.do_plan(verbosity=verbosity, **md)
+
+        yield from bpp.stage_wrapper(inner(), get_beamline().detector)
+
+    @staticmethod
+    def _check_do_plan(sample):
+        """Raise TypeError if do() is overridden further down the class
+        hierarchy than do_plan() (do_plan would skip the customized steps)."""
+        for cls in type(sample).__mro__:
+            if "do_plan" in vars(cls):
+                return
+            if "do" in vars(cls):
+                raise TypeError("{} ({}) customizes do() but has no matching do_plan(); use doSamples() "
+                                "instead of doSamples_plan()".format(sample.name, cls.__name__))
+
+    def measureSamplesTiled(self, tiling="ygaps", range=None, exposure_time=None, mode=None, verbosity=3, order=None,
+                            **md):
+        """Measure the samples at every tile of TILING_CONFIGS[tiling], in the
+        order that minimizes motion (tile by tile over the block of samples, or
+        sample by sample; see TilingScheduler). Sample and detector moves are
+        done together, and followed by a readback settle instead of a sleep."""
+
+        def measure(sample, **tile_md):
+            sample.measure_single(exposure_time=exposure_time, verbosity=verbosity, **tile_md)
+
+        samples = self.getSamples(range=range, order=self._order(order))
+        return tiling_scheduler.run(samples, tiling, measure, mode=mode, verbosity=verbosity, **md)
+
     def doTemperature(
         self,
         temperature,
@@ -5319,151 +5900,25 @@ if False:
 # ss = handlefilename(range(2118770, 2118860))
 # ss = handlefilename(range(2118903, 2118952))
 
-def handlefilename(uids, detector=None, output_folder=None):
-    """Given a list of uids, return a list of filenames."""
-    # single uid 
-    filenames = []
-    # if detector.name == 'pilatus800k-1':
-    #     detector_name = 'waxs'
-    # elif detector.name == 'pilatus2m-1':
-    #     detector_name = 'saxs'
-    # elif detector.name == 'pilatus800k-2':
-    #     detector_name = 'maxs'
-    # else:
-    #     return print('Please specify the detector name: pilatus800 (WAXS), pilatus2M (SAXS), pilatus8002 (MAXS)')
-    
-    for uid in uids:
-        h = db[uid]
-        print(uid)
-        try:
-            h.start['beamline_mode']
-        except:
-            continue
-
-        for detector_i in h.start['detectors']:
-            if detector_i == 'pilatus800k-1':
-                detector_name = 'waxs'
-                try:
-                    link_name = h.start['filename'] + '_000000_' + detector_name + '.tiff'
-                except:
-                    pass
-                for name, doc in h.documents():
-                    if name == "resource":
-                        rdoc = doc
-                        break
-                filename = rdoc['root'] + '/' + rdoc['resource_path'] + '/' + rdoc['resource_kwargs']['filename'] + '_000000.tiff'
-                try:
-                    h = db[uid]
-                    fname = h.start["sample_name"]
-                    filenames.append(fname)
-                except:
-                    pass
-                if output_folder is not None:
-                    link_name = output_folder + '/raw/' + link_name
-                    if os.path.exists(output_folder + '/raw/') == False:
-                        os.makedirs(output_folder + '/raw/')
-                else: 
-                    output_folder = RE.md["userpy_alias_directory"]
-                    link_name = output_folder + '/' + detector_name + '/raw/' + link_name
-                    if os.path.exists(output_folder + '/' + detector_name + '/raw/') == False:
-                        os.makedirs(output_folder + '/' + detector_name + '/raw/')
-                
-                # try:
-                # os.symlink(filename, link_name)
-                if not os.path.exists(link_name):
-                    os.symlink(filename, link_name)
-                else:
-                    # If it exists but is a broken link or old file, 
-                    # you might want to replace it:
-                    os.remove(link_name)
-                    os.symlink(filename, link_name)
-
+def handlefilename(uids, detector=None, output_folder=None, dry_run=False):
+    """Given a list of uids, link the first frame of each detector and return the list of link names
+    (see link_farm in 93-resource-links.py)."""
+    detectors = None if detector is None else [getattr(detector, 'name', detector)]
+    pairs = link_farm.pairs(uids, detectors=detectors, output_folder=output_folder, all_frames=False)
+    link_farm.build(pairs, dry_run=dry_run)
+    return [link_name for filename, link_name in pairs]
 
-
-                # except:
-                #     continue 
-
-            elif detector_i == 'pilatus2m-1':
-                detector_name = 'saxs'
-
-                link_name = h.start['filename'] + '_000000_' + detector_name + '.tiff'
-                for name, doc in h.documents():
-                    if name == "resource":
-                        rdoc = doc
-                        break
-                filename = rdoc['root'] + '/' + rdoc['resource_path'] + '/' + rdoc['resource_kwargs']['filename'] + '_000000.tiff'
-                try:
-                    h = db[uid]
-                    fname = h.start["sample_name"]
-                    filenames.append(fname)
-                except:
-                    pass
-                if output_folder is not None:
-                    link_name = output_folder + '/raw/' + link_name
-                    if os.path.exists(output_folder + '/raw/') == False:
-                        os.makedirs(output_folder + '/raw/')
-                else: 
-                    output_folder = RE.md["userpy_alias_directory"]
-                    link_name = output_folder + '/' + detector_name + '/raw/' + link_name
-                    if os.path.exists(output_folder + '/' + detector_name + '/raw/') == False:
-                        os.makedirs(output_folder + '/' + detector_name + '/raw/')
-                
-                os.symlink(filename, link_name)
-
-            elif detector == 'pilatus800k-2':
-                detector_i = 'maxs'
-                link_name = h.start['filename'] + '_000000_' + detector_name + '.tiff'
-                for name, doc in h.documents():
-                    if name == "resource":
-                        rdoc = doc
-                        break
-                filename = rdoc['root'] + '/' + rdoc['resource_path'] + '/' + rdoc['resource_kwargs']['filename'] + '_000000.tiff'
-                try:
-                    h = db[uid]
-                    fname = h.start["sample_name"]
-                    filenames.append(fname)
-                except:
-                    pass
-                if output_folder is not None:
-                    link_name = output_folder + '/raw/' + link_name
-                    if os.path.exists(output_folder + '/raw/') == False:
-                        os.makedirs(output_folder + '/raw/')
-                else: 
-                    output_folder = RE.md["userpy_alias_directory"]
-                    link_name = output_folder + '/' + detector_name + '/raw/' + link_name
-                    if os.path.exists(output_folder + '/' + detector_name + '/raw/') == False:
-                        os.makedirs(output_folder + '/' + detector_name + '/raw/')
-                
-                os.symlink(filename, link_name)
-
-        filenames.append(link_name)
-    return filenames
-
-def handlefiles_names():
-    """Given a list of uids, return a list of filenames."""
+def handlefiles_names(uid=-1, detector='pilatus800k-1', dry_run=False):
+    """Link every frame of a series run (burst mode) in the current directory; return the link names."""
     # burst mode
-    filenames = []
-    uid = -1
     h = db[uid]
+    detector_name = LinkFarm.DETECTOR_NAMES.get(RunFileIndex.ALIASES.get(detector, detector), detector)
+    files = resource_index.paths(h.start['uid'], detector)
+    pairs = [(files[ii], h.start['filename'] + '_' + f'{ii:06d}' + '_' + detector_name + '.tiff')
+             for ii in range(h.start['measure_series_num_frames'])]
+    link_farm.build(pairs, dry_run=dry_run)
+    return [link_name for filename, link_name in pairs]
 
-    for ii in range(h.start['measure_series_num_frames']):
-        link_name = h.start['filename'] + '_' + f'{ii:06d}' + '_waxs.tiff'
-        for name, doc in h.documents():
-            if name == "resource":
-                rdoc = doc
-                break
-        filename = rdoc['root'] + '/' + rdoc['resource_path'] + '/' + rdoc['resource_kwargs']['filename'] + '_' + f'{ii:06d}' + '.tiff'
-        # try:
-        #     h = db[uid]
-        #     fname = h.start["sample_name"]
-        #     filenames.append(fname)
-        # except:
-        #     pass
-
-        os.symlink(filename, link_name)
-
-        filenames.append(link_name)
-    return filenames
 
 #20251011
 #np.arange(2152960, 2153049+1)
@@ -99,6 +99,10 @@ class SampleTSAXS_Generic(Sample_Generic):
 
 
 class SampleGISAXS_Generic(Sample_Generic):
+
+    # Strategy of the searches in swing(): 'step', 'bisect', 'golden' or 'fit' (see AxisSearch)
+    search_strategy = "step"
+
     def __init__(self, name, base=None, **md):
         super().__init__(name=name, base=base, **md)
         self.naming_scheme = ["name", "extra", "th", "exposure_time"]
@@ -339,6 +343,7 @@ class SampleGISAXS_Generic(Sample_Generic):
 
         ### save the alignment information
         align_time = time.time() - start_time
+        searches = axis_search.since(start_time)
 
         current_data = {'a_sample': self.name,
                         'b_quick_alignment': alignment, 
@@ -347,8 +352,15 @@ class SampleGISAXS_Generic(Sample_Generic):
                         'e_offset_th': sth.position - initial_th, 
                         'f_crazy_offset_y': smy.position - crazy_y,
                         'g_crazy_offset_th': sth.position - crazy_th, 
-                        'h_search_no': align_crazy[1]}
-        
+                        'h_search_no': align_crazy[1],
+                        'i_search_strategy': self.search_strategy,
+                        'j_search_exposures': sum(search['exposures'] for search in searches),
+                        'k_search_time': sum(search['elapsed'] for search in searches),
+                        'l_align_mode': 'step'}
+        self._save_alignment_results(current_data)
+
+    def _save_alignment_results(self, current_data):
+        '''Append one alignment (a dict of columns) to data/alignment_results.csv.'''
         temp_data = pds.DataFrame([current_data])
 
         INT_FILENAME='{}/data/{}.csv'.format(os.path.dirname(__file__) , 'alignment_results.csv')            
@@ -360,6 +372,96 @@ class SampleGISAXS_Generic(Sample_Generic):
         else:
             temp_data.to_csv(INT_FILENAME)
 
+    def align_fly(self, step=0, reflection_angle=0.15, quick=False, fallback=True, verbosity=3):
+        '''Align the sample as align() does, but each step scan (fit_scan,
+        fit_edge) is replaced by a fly sweep plus a fit (fly_fit_plan), with
+        the exposure time and velocity chosen automatically. A stage whose fit
+        is poor is redone as the step scan of align() (unless fallback=False).
+
+        With quick=True, the quick alignment (swing) is tried first, as align()
+        does. The alignment time, and how many stages were flown or stepped,
+        are saved in alignment_results.csv (align_mode 'fly' or 'fly+step').'''
+        start_time = time.time()
+        alignment = 'Not tried'
+        initial_y = smy.position
+        initial_th = sth.position
+        stages = []  # 'fly' or 'step', per stage
+
+        if quick:
+            align_crazy = self.swing(reflection_angle=reflection_angle)
+            alignment = 'Success' if align_crazy[0] else 'Failed'
+        cms.setDirectBeamROI()
+
+        if alignment != 'Success':
+            if step<=4:
+                if verbosity>=4:
+                    print('    align: fitting')
+                self._align_fly_stage(smy, 1.2, 21, 'edge', 'HMi', stages, fallback=fallback, verbosity=verbosity)
+                self._align_fly_stage(sth, 1.5, 21, 'max', 'max', stages, fallback=fallback, verbosity=verbosity)
+
+            if step<=8:
+                self._align_fly_stage(smy, 0.6, 21, 'edge', 'edge', stages, fallback=fallback, verbosity=verbosity)
+                self._align_fly_stage(sth, 0.8, 21, 'COM', 'COM', stages, fallback=fallback, verbosity=verbosity)
+                self.setOrigin(['y', 'th'])
+
+            if step<=9 and reflection_angle is not None:
+                # Final alignment using reflected beam
+                if verbosity>=4:
+                    print('    align: reflected beam')
+                get_beamline().setReflectedBeamROI(total_angle=reflection_angle*2.0)
+
+                self.thabs(reflection_angle)
+
+                # Reflected beam found: more than 50 counts in a 0.5 s exposure (as in align())
+                x_max, y_max, found = self._align_fly_stage(sth, 0.4, 41, 'max', 'max', stages, select_roi=3,
+                                                            min_counts=50, fallback=fallback, verbosity=verbosity)
+                sth_target = x_max-reflection_angle
+
+                if found:
+                    th_target = self._axes['th'].motor_to_cur(sth_target)
+                    self.thsetOrigin(th_target)
+
+            if step<=10:
+                self.thabs(0.0)
+                beam.off()
+
+        current_data = {'a_sample': self.name,
+                        'b_quick_alignment': alignment,
+                        'c_align_time': time.time() - start_time,
+                        'd_offset_y': smy.position - initial_y,
+                        'e_offset_th': sth.position - initial_th,
+                        'l_align_mode': 'fly+step' if 'step' in stages else 'fly',
+                        'm_fly_stages': stages.count('fly'),
+                        'n_step_stages': stages.count('step')}
+        self._save_alignment_results(current_data)
+
+    def _align_fly_stage(self, motor, span, num, model, step_fit, stages, select_roi=4, min_counts=None,
+                         fallback=True, verbosity=3):
+        '''One stage of align_fly: a fly sweep plus a fit; if the fit is poor,
+        the step scan of align() instead (step_fit is the fit_scan fit, or
+        'edge' for fit_edge). Returns (x0, y_max, found): found if the fit is
+        good and y_max is above min_counts, given for the 0.5 s exposures of
+        fit_scan (scaled to the exposure time of the fly frames).'''
+        result = fly_fit(motor, span, num=num, model=model, select_roi=select_roi, verbosity=verbosity)
+        if result['ok'] or not fallback:
+            stages.append('fly')
+            if not result['ok']:
+                return motor.position, (result['y_max'] or 0), False
+            found = min_counts is None or (result['y_max'] or 0) > min_counts * result['exposure_time'] / 0.5
+            return result['x0'], result['y_max'], found
+
+        if verbosity>=3:
+            print('    align: poor fly fit for {}; step scan instead'.format(motor.name))
+        stages.append('step')
+        if step_fit == 'edge':
+            fit_edge(motor, span, num)
+            return motor.position, None, True
+        result = fit_scan(motor, span, num, fit=step_fit)
+        if step_fit == 'max':
+            y_max = result.values['y_max']
+            return result.values['x_max'], y_max, min_counts is None or y_max > min_counts
+        return result.values['x0'], result.values['y0'], True
+
     def swing(self, step=0, reflection_angle=0.12, ROI_size=[10, 180], th_range=0.3, int_threshold=10, verbosity=3):
 
         #setting parameters
@@ -506,11 +608,13 @@ class SampleGISAXS_Generic(Sample_Generic):
             beam.off()
             return False, ii
 
-    def search_plan(self, motor=smy, step_size=1.0, min_step=0.05, intensity=None, target=0.5, detector=None, detector_suffix=None, polarity=+1, verbosity=3):
+    def search_plan(self, motor=smy, step_size=1.0, min_step=0.05, intensity=None, target=0.5, detector=None, detector_suffix=None, polarity=+1, strategy=None, max_exposures=None, verbosity=3):
         '''Moves this axis, searching for a target value.
         
         Parameters
         ----------
+        motor : motor
+            The motor to move
         step_size : float
             The initial step size when moving the axis
         min_step : float
@@ -524,8 +628,9 @@ class SampleGISAXS_Generic(Sample_Generic):
             The beamline detector (and suffix, such as '_stats4_total') to trigger to measure intensity
         polarity : +1 or -1
             Positive motion assumes, e.g. a step-height 'up' (as the axis goes more positive)
+        strategy : 'step', 'bisect', 'golden' or 'fit'
+            See AxisSearch; by default self.search_strategy
         '''
-        print("HERE!!")
         
         if detector is None:
             #detector = gs.DETS[0]
@@ -536,150 +641,16 @@ class SampleGISAXS_Generic(Sample_Generic):
         else:
             value_name = detector.name + detector_suffix
 
-        print(f"detector={detector}")
+        if not get_beamline().beam.is_on():
+            print('WARNING: Experimental shutter is not open.')
 
-        @bpp.stage_decorator([detector])
-        @bpp.run_decorator(md={})
-        def inner_search():
-            nonlocal intensity, target, step_size
+        if strategy is None:
+            strategy = self.search_strategy
 
-            if not get_beamline().beam.is_on():
-                print('WARNING: Experimental shutter is not open.')
-            
-            
-            if intensity is None:
-                intensity = RE.md['beam_intensity_expected']
-
-            # bec.disable_table()
-            
-            
-            # Check current value
-            vv = yield from bps.trigger_and_read([detector, motor])
-            value = vv[value_name]['value']
-            # RE(count([detector]))
-            # value = detector.read()[value_name]['value']
-
-
-            if target == 'max':
-                
-                if verbosity>=5:
-                    print("Performing search on axis '{}' target is 'max'".format(self.name))
-                
-                max_value = value
-                # max_position = self.get_position(verbosity=0)
-                
-                
-                direction = +1*polarity
-                
-                while step_size>=min_step:
-                    if verbosity>=4:
-                        print("        move {} by {} × {}".format(self.name, direction, step_size))
-
-                    #  pos = yield from bps.rd(motor)
-                    yield from bps.mvr(motor, direction*step_size)
-                    # self.move_relative(move_amount=direction*step_size, verbosity=verbosity-2)
-
-                    prev_value = value
-                    yield from bps.trigger_and_read([detector, motor])
-                    # RE(count([detector]))
-                    
-                    value = detector.read()[value_name]['value']
-                    # if verbosity>=3:
-                    #     print("      {} = {:.3f} {}; value : {}".format(self.name, self.get_position(verbosity=0), self.units, value))
-                        
-                    if value>max_value:
-                        max_value = value
-                        # max_position = self.get_position(verbosity=0)
-                        
-                    if value>prev_value:
-                        # Keep going in this direction...
-                        pass
-                    else:
-                        # Switch directions!
-                        direction *= -1
-                        step_size *= 0.5
-                    
-                    
-            elif target == 'min':
-                
-                if verbosity>=5:
-                    print("Performing search on axis '{}' target is 'min'".format(self.name))
-                
-                direction = +1*polarity
-                
-                while step_size>=min_step:
-                    if verbosity>=4:
-                        print("        move {} by {} × {}".format(self.name, direction, step_size))
-
-                    # pos = yield from bps.rd(motor)
-                    yield from bps.mvr(motor, direction*step_size)
-                    # self.move_relative(move_amount=direction*step_size, verbosity=verbosity-2)
-
-                    prev_value = value
-                    yield from bps.trigger_and_read([detector, motor])
-                    # RE(count([detector]))
-                    value = detector.read()[value_name]['value']
-                    if verbosity>=3:
-                        print("      {} = {:.3f} {}; value : {}".format(self.name, self.get_position(verbosity=0), self.units, value))
-                        
-                    if value<prev_value:
-                        # Keep going in this direction...
-                        pass
-                    else:
-                        # Switch directions!
-                        direction *= -1
-                        step_size *= 0.5
-                                    
-            else:
-
-                target_rel = target
-                target = target_rel*intensity
-
-                if verbosity>=5:
-                    print("Performing search on axis '{}' target {} × {} = {}".format(self.name, target_rel, intensity, target))
-                if verbosity>=4:
-                    print("      value : {} ({:.1f}%)".format(value, 100.0*value/intensity))
-                
-                
-                # Determine initial motion direction
-                if value>target:
-                    direction = -1*polarity
-                else:
-                    direction = +1*polarity
-                    
-                while step_size>=min_step:
-                    
-                    if verbosity>=4:
-                        print("        move {} by {} × {}".format(self.name, direction, step_size))
-                    
-                    # pos = yield from bps.rd(motor)
-                    yield from bps.mvr(motor, direction*step_size)
-                    # self.move_relative(move_amount=direction*step_size, verbosity=verbosity-2)
-                    
-                    yield from bps.trigger_and_read([detector, motor])
-                    # RE(count([detector]))
-                    value = detector.read()[value_name]['value']
-                    #if verbosity>=3:
-                    #    print("      {} = {:.3f} {}; value : {} ({:.1f}%)".format(self.name, self.get_position(verbosity=0), self.units, value, 100.0*value/intensity))
-                        
-                    # Determine direction
-                    if value>target:
-                        new_direction = -1.0*polarity
-                    else:
-                        new_direction = +1.0*polarity
-                        
-                    if abs(direction-new_direction)<1e-4:
-                        # Same direction as we've been going...
-                        # ...keep moving this way
-                        pass
-                    else:
-                        # Switch directions!
-                        direction *= -1
-                        step_size *= 0.5
-        
-            # bec.enable_table()
-
-        yield from inner_search()
+        return (yield from axis_search.plan(motor, detector, value_name, target=target, intensity=intensity,
+                                            step_size=step_size, min_step=min_step, polarity=polarity,
+                                            strategy=strategy, name=motor.name, max_exposures=max_exposures,
+                                            verbosity=verbosity, md={'sample_name': self.name}))
 
 
     def _test_align(self, step=0, reflection_angle=0.12, verbosity=3):
@@ -1918,14 +1889,14 @@ class GIBar(PositionalHolder):
 
         return self.measure_setting
 
-    def alignSamples(self, range=None, step=0, align_step=0, x_offset=0, verbosity=3, **md):
+    def alignSamples(self, range=None, step=0, align_step=0, x_offset=0, verbosity=3, order=None, **md):
         """Iterates through the samples on the holder, aligning each one."""
 
         if step <= 0:
             get_beamline().modeAlignment()
 
         if step <= 5:
-            for sample in self.getSamples(range=range):
+            for sample in self.getSamples(range=range, order=self._order(order)):
                 sample.gotoOrigin(["x", "y", "th"])
                 sample.gotoOrigin(["x"])
                 sample.xr(x_offset)
@@ -1938,14 +1909,14 @@ class GIBar(PositionalHolder):
                     print("Sample {} ({})".format(i + 1, sample.name))
                     print(sample.save_state())
 
-    def alignSamplesQuick(self, range=None, step=0, x_offset=0, verbosity=3, **md):
+    def alignSamplesQuick(self, range=None, step=0, x_offset=0, verbosity=3, order=None, **md):
         """Iterates through the samples on the holder, aligning each one."""
 
         if step <= 0:
             get_beamline().modeAlignment()
 
         if step <= 5:
-            for sample in self.getSamples(range=range):
+            for sample in self.getSamples(range=range, order=self._order(order)):
                 sample.gotoOrigin(["x", "y", "th"])
                 sample.gotoOrigin(["x"])
                 sample.xr(x_offset)
@@ -1958,7 +1929,7 @@ class GIBar(PositionalHolder):
                     print("Sample {} ({})".format(i + 1, sample.name))
                     print(sample.save_state())
 
-    def alignSamplesVeryQuick(self, range=None, step=0, x_offset=0, verbosity=3, **md):
+    def alignSamplesVeryQuick(self, range=None, step=0, x_offset=0, verbosity=3, order=None, **md):
         """Iterates through the samples on the holder, aligning each one."""
 
         if step <= 0:
@@ -1968,7 +1939,7 @@ class GIBar(PositionalHolder):
             caput("XF:11BMB-ES{Det:SAXS}:cam1:AcquirePeriod", 0.30)
 
         if step <= 5:
-            for sample in self.getSamples(range=range):
+            for sample in self.getSamples(range=range, order=self._order(order)):
                 sample.gotoOrigin(["x", "y", "th"])
                 sample.gotoOrigin(["x"])
                 sample.xr(x_offset)
@@ -1984,7 +1955,8 @@ class GIBar(PositionalHolder):
                     print("Sample {} ({})".format(i + 1, sample.name))
                     print(sample.save_state())
 
-    def measureSamples(self, range=None, step=0, angles=None, exposure_time=15, x_offset=0, verbosity=3, **md):
+    def measureSamples(self, range=None, step=0, angles=None, exposure_time=15, x_offset=0, verbosity=3, order=None,
+                       **md):
         """Measures all the samples.
 
         If the optional range argument is provided (2-tuple), then only sample
@@ -1995,7 +1967,7 @@ class GIBar(PositionalHolder):
             get_beamline().modeMeasurement()
 
         if step <= 5:
-            for sample in self.getSamples(range=range):
+            for sample in self.getSamples(range=range, order=self._order(order)):
                 if verbosity >= 3:
                     print("Measuring sample {}...".format(sample.name))
 
@@ -2044,15 +2016,18 @@ class GIBar(PositionalHolder):
             if sample.detector == "WAXS":
                 sample.do_WAXS()
 
-    def doSamples(self, range=None, verbosity=3):
+    def doSamples(self, range=None, verbosity=3, order=None):
         # saxs_on()
-        for sample in self.getSamples(range=range):
+        samples = self.getSamples(range=range, order=self._order(order))
+        for sample in samples:
             if verbosity >= 3:
                 print("Doing sample {}...".format(sample.name))
             if "SAXS" in sample.detector or sample.detector == "BOTH":
                 sample.do_SAXS()
 
-        for sample in self.getSamples(range=range):
+        # Along a path, each pass goes back the other way (starting where the previous one ended)
+        serpentine = self._order(order) == "path"
+        for sample in samples[::-1] if serpentine else samples:
             if verbosity >= 3:
                 print("Doing sample {}...".format(sample.name))
             if "SAXS" in sample.detector and "WAXS" in sample.detector:
@@ -2060,7 +2035,7 @@ class GIBar(PositionalHolder):
             elif sample.detector == "BOTH":
                 sample.do_WAXS_only()
 
-        for sample in self.getSamples(range=range):
+        for sample in samples:
             if verbosity >= 3:
                 print("Doing sample {}...".format(sample.name))
             if sample.detector == "WAXS":
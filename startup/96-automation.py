@@ -16,6 +16,73 @@
 ################################################################################
 
 
+##### Robot safety regions and pipelined exchange #####
+# An exchange (return a holder, pick up the next one) used to run every robot
+# move one after the other, going back to the full 'safe' pose in between,
+# with the robot idle while the holder is measured. In pipelined mode
+# (que.runHolders(pipelined=True)):
+#   - during the last sample of a holder, the arm pre-aligns (y, phi) for the
+#     stage approach, which RobotSafetyModel allows alongside a measurement;
+#   - the sample stage moves to the exchange position with all axes together;
+#   - between steps the arm only retracts (x, z) instead of going to the full
+#     'safe' pose, and goes from one garage slot directly to the next.
+# The dead time of every exchange is journaled; que.exchangeReport() compares
+# serial and pipelined exchanges, holder by holder.
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class RobotSafetyModel:
+    """
+    Which robot moves may overlap other motion (a measurement, or the sample
+    stage moving), in terms of the robot's _region:
+      'safe'      : arm retracted in x and z (at their values in _position_safe,
+                    the + end of their travel): it cannot reach the garage or
+                    the stage, whatever y and phi are. The garage and stage
+                    sequences start from here, with y and phi at the safe pose
+                    (or, for a stage pick-up, at the prestageApproach pose)
+      'retracted' : x and z retracted (as 'safe'), but y and phi left where the
+                    last step put them; checkSafe refuses to start a sequence
+                    until sequenceRestorePose has brought them back
+      'parking'   : arm reaching into the garage
+      'stage'     : arm reaching towards the sample stage/stack
+      'undefined' : unknown; nothing may move concurrently
+    A move may overlap other motion only if the arm is in 'safe' or
+    'retracted' and the move keeps it there: only the y and/or phi axes move.
+    """
+
+    CONCURRENT_AXES = ("y", "phi")
+
+    def __init__(self, robot, tolerance=0.5):
+        self.robot = robot
+        self.tolerance = tolerance
+
+    def retracted(self):
+        x_safe, y_safe, z_safe, phi_safe = self.robot._position_safe
+        return (self.robot.xpos(verbosity=0) >= x_safe - self.tolerance
+                and self.robot.zpos(verbosity=0) >= z_safe - self.tolerance)
+
+    def at_pose(self, y, phi):
+        """Whether the arm y and phi are at these values."""
+        return (abs(self.robot.ypos(verbosity=0) - y) <= self.tolerance
+                and abs(self.robot.phipos(verbosity=0) - phi) <= self.tolerance)
+
+    def region(self):
+        """Region from the arm position ('safe'/'retracted' if retracted, else the declared _region)."""
+        if self.retracted():
+            return "retracted" if self.robot._region == "retracted" else "safe"
+        return self.robot._region if self.robot._region in ("parking", "stage") else "undefined"
+
+    def can_overlap(self, axes):
+        """Whether moving these axes (names) may overlap other motion."""
+        return (
+            self.robot._region in ("safe", "retracted")
+            and self.retracted()
+            and all(axis in self.CONCURRENT_AXES for axis in axes)
+        )
+
+
 class SampleExchangeRobot(Stage):
     def __init__(self, name="SampleExchangeRobot", base=None, use_gs=True, **kwargs):
         super().__init__(name=name, base=base, **kwargs)
@@ -25,6 +92,7 @@ class SampleExchangeRobot(Stage):
 
         # The region can be:
         #  'safe' : arm won't collid with anything, it is near the (+,+,+) limit of its travel.
+        #  'retracted' : arm retracted in x and z only (pipelined exchange, see RobotSafetyModel)
         #  'parking' : arm is close to the parking lot (movement may hit a sample)
         #  'stage' : arm is close to the sample stage/stack (movement may collide with stack, on-axis camera, or downstream window)
         #  'undefined' : position is unknown (do not assume it is safe to move!)
@@ -103,6 +171,10 @@ class SampleExchangeRobot(Stage):
         for axis_name, axis in self._axes.items():
             axis._move_settle_max_time = 30.0
 
+        self.safety = RobotSafetyModel(self)
+        self._prestage = None  # Future of the background pre-staging moves
+        self._prestage_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="robot_prestage")
+
     def _set_axes_definitions(self):
         """Internal function which defines the axes for this stage. This is kept
         as a separate function so that it can be over-ridden easily."""
@@ -280,7 +352,116 @@ class SampleExchangeRobot(Stage):
                 print("Robot is NOT moving!")
             return self.moving == False
 
+    def settle(self, devices=None, targets=None, gripper_delay=0, verbosity=3):
+        """Wait for the motors (default: the whole arm) to be at their targets, and
+        stable (see readback_settle in 12-settle.py), then gripper_delay seconds
+        for the pneumatic gripper. Raises RuntimeError if they do not settle:
+        the next step of a sequence must never start while the arm is moving."""
+        if devices is None:
+            devices = [armx, army, armz, armphi]
+        if not readback_settle.wait(devices, targets=targets, verbosity=1 if verbosity >= 1 else 0):
+            raise RuntimeError("Robot: {} did not settle; sequence aborted.".format(
+                ", ".join(device.name for device in (devices if isinstance(devices, (list, tuple)) else [devices]))))
+        if gripper_delay:
+            time.sleep(gripper_delay)
+        return True
+
+    # Pipelined exchange
+    ########################################
+
+    def sequenceRetract(self, verbosity=3):
+        """Retract the arm in x and z only (into the 'retracted' region, see
+        RobotSafetyModel), without going to the full safe pose."""
+        x, y, z, phi = self._position_safe
+        if self._region == "parking":
+            # Out of the garage first, then sideways
+            self.zabs(z, verbosity=verbosity)
+            self.xabs(x, verbosity=verbosity)
+        elif self._region in ("stage", "safe", "retracted"):
+            # Away from the stage first
+            self.xabs(x, verbosity=verbosity)
+            self.zabs(z, verbosity=verbosity)
+        else:
+            print("ERROR: Robot region is '{}'; not retracting.".format(self._region))
+            return False
+        self.settle([armx, armz], verbosity=verbosity)
+        if not self.safety.retracted():
+            print("ERROR: Robot arm did not retract (x = {}, z = {}).".format(
+                self.xpos(verbosity=0), self.zpos(verbosity=0)))
+            return False
+        self._region = "retracted"
+        return True
+
+    def sequenceRestorePose(self, prestaged_ok=False, verbosity=3):
+        """From the 'retracted' region, move y and phi back to the safe pose (x and z
+        are already retracted), so that the next sequence starts from where it
+        was commissioned. prestaged_ok: before a stage pick-up (empty gripper),
+        the prestageApproach pose is kept as well. Nothing to do in other regions."""
+        if self._region != "retracted":
+            return True
+        if not self.safety.retracted():
+            print("ERROR: Robot arm is not retracted (x = {}, z = {}); y and phi not moved.".format(
+                self.xpos(verbosity=0), self.zpos(verbosity=0)))
+            return False
+        x, y, z, phi = self._position_safe
+        x_gripped, y_gripped, z_gripped, phi_gripped = self._position_sample_gripped
+        prestaged = (prestaged_ok and self._sample is None
+                     and self.safety.at_pose(y_gripped - self._delta_y_slot, phi_gripped))
+        if not prestaged and not self.safety.at_pose(y, phi):
+            self.phiabs(phi, verbosity=verbosity)
+            self.yabs(y, verbosity=verbosity)
+            self.settle([army, armphi], targets=[y, phi], verbosity=verbosity)
+        self._region = "safe"
+        return True
+
+    def prestageApproach(self, verbosity=3):
+        """In the background, pre-align the arm (y, phi) for the stage approach of the
+        next returnHolder, if RobotSafetyModel allows it alongside a measurement.
+        Returns the Future (or None if not allowed)."""
+        if self._sample is not None or not self.safety.can_overlap(("y", "phi")):
+            if verbosity >= 3:
+                print("Robot pre-staging skipped (region '{}').".format(self.safety.region()))
+            return None
+        self.waitPrestage()
+        x, y, z, phi = self._position_sample_gripped
+
+        def move():
+            self.phiabs(phi, verbosity=0)
+            self.yabs(y - self._delta_y_slot, verbosity=0)
+
+        self._prestage = self._prestage_executor.submit(move)
+        return self._prestage
+
+    @staticmethod
+    def _require(success, step):
+        """Stop a pipelined exchange when one of its steps was refused (it printed why)."""
+        if not success:
+            raise RuntimeError("Robot: {} failed; exchange aborted.".format(step))
+
+    def waitPrestage(self):
+        """Wait for the background pre-staging moves (if any) to be done."""
+        future, self._prestage = self._prestage, None
+        if future is not None:
+            future.result()  # a failed pre-stage move raises here, before anything else moves
+            self.settle([army, armphi])
+
+    def moveStageExchange(self, verbosity=3):
+        """Move the sample stage to the exchange position, all axes together (the arm must be retracted)."""
+        if not self.safety.retracted():
+            print("ERROR: Robot arm is not retracted; stage not moved.")
+            return False
+        x, y = self._position_stg_exchange  # smx, smy
+        statuses = [smx.set(x), smy.set(y), sth.set(0)]
+        for status in statuses:
+            status.wait()
+        return self.settle([smx, smy, sth], targets=[x, y, 0])
+
     def checkSafe(self, check_stage=True):
+        if self._region == "retracted":
+            print(
+                "ERROR: Robot arm is retracted, but y and phi are not back at the safe pose (run robot.sequenceRestorePose())."
+            )
+            return False
         if self._region != "safe":
             print(
                 "ERROR: Robot arm must start in the 'safe' region of the chamber (current region is '{}'). Move the robot to the safe region (and/or set _region to 'safe').".format(
@@ -461,8 +642,7 @@ class SampleExchangeRobot(Stage):
         smy.move(y)
         sth.move(0)
 
-        while smx.moving == True or smy.moving == True or sth.moving == True:
-            time.sleep(1)
+        self.settle([smx, smy, sth], targets=[x, y, 0])
 
         x, y, z, phi = self._position_sample_gripped
 
@@ -756,8 +936,7 @@ class SampleExchangeRobot(Stage):
         if not success:
             return
         x = self.xpos(verbosity=0)
-        while armx.moving==True:
-            time.sleep(.5)
+        self.settle(armx, verbosity=verbosity)
         y = self.ypos(verbosity=0)
 
         # Lower so that the slot is aligned
@@ -766,8 +945,7 @@ class SampleExchangeRobot(Stage):
         # Move towards parking lot
         self._region = "parking"
         self.zabs(z, verbosity=verbosity)
-        while armz.moving==True:
-            time.sleep(.5)
+        self.settle(armz, verbosity=verbosity)
         # Grip sample
         self.yr(+self._delta_y_slot, verbosity=verbosity)
 
@@ -779,11 +957,9 @@ class SampleExchangeRobot(Stage):
 
         # Move away from parking
         self.zabs(0, verbosity=verbosity)
-        while armz.moving==True:
-            time.sleep(.5)
+        self.settle(armz, verbosity=verbosity)
         self.xabs(0, verbosity=verbosity)
-        while armx.moving==True:
-            time.sleep(.5)
+        self.settle(armx, verbosity=verbosity)
         self.yabs(self._position_safe[1], verbosity=verbosity)
         if gotoSafe == True:
             self.sequenceGotoSafe(verbosity=verbosity)
@@ -862,8 +1038,7 @@ class SampleExchangeRobot(Stage):
         if not success:
             return
         x = self.xpos(verbosity=0)
-        while armx.moving==True:
-            time.sleep(.5)
+        self.settle(armx, verbosity=verbosity)
         y = self.ypos(verbosity=0)
 
         # Hover
@@ -872,8 +1047,7 @@ class SampleExchangeRobot(Stage):
         # Move towards parking lot
         self._region = "parking"
         self.zabs(z, verbosity=verbosity)
-        while armz.moving==True:
-            time.sleep(.5)
+        self.settle(armz, verbosity=verbosity)
         # Deposit sample
         self.yr(-self._delta_y_hover, verbosity=verbosity)
         self.yr(-self._delta_y_slot, verbosity=verbosity)
@@ -883,11 +1057,9 @@ class SampleExchangeRobot(Stage):
 
         # Move away from parking
         self.zabs(0, verbosity=verbosity)
-        while armz.moving==True:
-            time.sleep(.5)
+        self.settle(armz, verbosity=verbosity)
         self.xabs(0, verbosity=verbosity)
-        while armx.moving==True:
-            time.sleep(.5)
+        self.settle(armx, verbosity=verbosity)
         if gotoSafe == True:
             self.sequenceGotoSafe(verbosity=verbosity)
 
@@ -1096,9 +1268,10 @@ class SampleExchangeRobot(Stage):
         self.zabs(-60)
 
 
-    def pickupHolder(self, slot, gotoSafe=True, verbosity=3):
+    def pickupHolder(self, slot, gotoSafe=True, verbosity=3, pipelined=False):
         # picking up the holer from Garage
         # shelf_num, spot_num: slot number of the holder
+        # pipelined: only retract the arm between steps (see RobotSafetyModel)
         [shelf_num, spot_num] = slot
         if verbosity >= 3:
             print("picking up from garage ({}, {})".format(shelf_num, spot_num))
@@ -1109,10 +1282,19 @@ class SampleExchangeRobot(Stage):
             )
             return
 
-        self.sequenceGetSampleFromGarage(shelf_num, spot_num, gotoSafe=gotoSafe, verbosity=verbosity)
-        time.sleep(1)
+        self.waitPrestage()
+        self._require(self.sequenceRestorePose(verbosity=verbosity), "return to the safe pose")
+        if pipelined:
+            self.sequenceGetSampleFromGarage(shelf_num, spot_num, gotoSafe=False, verbosity=verbosity)
+            self._require(self.sequenceRetract(verbosity=verbosity), "retract from the garage")
+            self._require(self.sequenceRestorePose(verbosity=verbosity), "return to the safe pose")
+        else:
+            self.sequenceGetSampleFromGarage(shelf_num, spot_num, gotoSafe=gotoSafe, verbosity=verbosity)
+        self.settle(gripper_delay=1, verbosity=verbosity)
         # always go back to safe position from or to the stage
-        self.sequencePutSampleOntoStage(verbosity=verbosity)
+        self.sequencePutSampleOntoStage(gotoSafe=not pipelined, verbosity=verbosity)
+        if pipelined:
+            self._require(self.sequenceRetract(verbosity=verbosity), "retract from the stage")
 
     def _pickupHolder(self, slot, gotoSafe=True, verbosity=3):
         # picking up the holer from Garage
@@ -1128,22 +1310,35 @@ class SampleExchangeRobot(Stage):
             return
 
         yield from self.sequenceGetSampleFromGarage(shelf_num, spot_num, gotoSafe=gotoSafe, verbosity=verbosity)
-        time.sleep(1)
+        self.settle(gripper_delay=1, verbosity=verbosity)
         # always go back to safe position from or to the stage
         yield from self.sequencePutSampleOntoStage(verbosity=verbosity)
 
-    def returnHolder(self, slot, gotoSafe=True, verbosity=3):
+    def returnHolder(self, slot, gotoSafe=True, verbosity=3, pipelined=False):
         # returning the holer back to Garage
         # shelf_num, spot_num: slot number of the holder
+        # pipelined: stage axes together, and only retract the arm between steps (see RobotSafetyModel)
         [shelf_num, spot_num] = slot
         if verbosity >= 3:
             print("returning back to garage ({}, {})".format(shelf_num, spot_num))
 
-        # always go back to safe position from or to the stage
-        self.sequenceGetSampleFromStage(verbosity=verbosity)
-        time.sleep(1)
+        self.waitPrestage()
+        if pipelined:
+            self._require(self.moveStageExchange(verbosity=verbosity), "stage move to the exchange position")
+            self._require(self.sequenceRestorePose(prestaged_ok=True, verbosity=verbosity), "return to the safe pose")
+            self.sequenceGetSampleFromStage(gotoSafe=False, verbosity=verbosity)
+            self._require(self.sequenceRetract(verbosity=verbosity), "retract from the stage")
+            self._require(self.sequenceRestorePose(verbosity=verbosity), "return to the safe pose")
+        else:
+            self._require(self.sequenceRestorePose(verbosity=verbosity), "return to the safe pose")
+            # always go back to safe position from or to the stage
+            self.sequenceGetSampleFromStage(verbosity=verbosity)
+        self.settle(gripper_delay=1, verbosity=verbosity)
         # only this one need options NOT to return robot to the default position
-        self.sequencePutSampleInGarage(shelf_num, spot_num, gotoSafe=gotoSafe, verbosity=verbosity)
+        self.sequencePutSampleInGarage(shelf_num, spot_num, gotoSafe=gotoSafe and not pipelined, verbosity=verbosity)
+        if pipelined:
+            # Ready to go to the next garage slot directly
+            self._require(self.sequenceRetract(verbosity=verbosity), "retract from the garage")
 
 
     def _returnHolder(self, slot, gotoSafe=True, verbosity=3):
@@ -1155,7 +1350,7 @@ class SampleExchangeRobot(Stage):
 
         # always go back to safe position from or to the stage
         yield from self.sequenceGetSampleFromStage(verbosity=verbosity)
-        time.sleep(1)
+        self.settle(gripper_delay=1, verbosity=verbosity)
         # only this one need options NOT to return robot to the default position
         yield from self.sequencePutSampleInGarage(shelf_num, spot_num, gotoSafe=gotoSafe, verbosity=verbosity)
 
@@ -1195,17 +1390,17 @@ class SampleExchangeRobot(Stage):
                 print("Run test garage ({}, {})".format(shelf_num, spot_num))
 
             self.sequenceGetSampleFromGarage(shelf_num, spot_num, verbosity=verbosity)
-            time.sleep(2)
+            self.settle(gripper_delay=2, verbosity=verbosity)
             self.sequencePutSampleOntoStage(verbosity=verbosity)
 
             hol.listSamples()
-            time.sleep(2)
+            self.settle(gripper_delay=2, verbosity=verbosity)
             hol.doSamples()
 
             self.sequenceGetSampleFromStage(verbosity=verbosity)
-            time.sleep(2)
+            self.settle(gripper_delay=2, verbosity=verbosity)
             self.sequencePutSampleInGarage(shelf_num, spot_num, verbosity=verbosity)
-            time.sleep(2)
+            self.settle(gripper_delay=2, verbosity=verbosity)
 
     def run_test(self, verbosity=3):
         if not self.checkSafe():
@@ -1218,17 +1413,17 @@ class SampleExchangeRobot(Stage):
 
             self.sequenceGetSampleFromGarage(shelf_num, spot_num, verbosity=verbosity)
             print("out of garage")
-            time.sleep(2)
+            self.settle(gripper_delay=2, verbosity=verbosity)
             self.sequencePutSampleOntoStage(verbosity=verbosity)
 
             hol.listSamples()
-            time.sleep(2)
+            self.settle(gripper_delay=2, verbosity=verbosity)
             hol.doSamples()
 
             self.sequenceGetSampleFromStage(verbosity=verbosity)
-            time.sleep(2)
+            self.settle(gripper_delay=2, verbosity=verbosity)
             self.sequencePutSampleInGarage(shelf_num, spot_num, gotoSafe=False, verbosity=verbosity)
-            time.sleep(2)
+            self.settle(gripper_delay=2, verbosity=verbosity)
 
         self.sequenceGotoSafe(verbosity=verbosity)
 
@@ -1261,6 +1456,125 @@ class SampleExchangeRobot(Stage):
 
 
 # class Queue(object):
+##### Queue checkpoint journal #####
+# runSequence/runHolders write a record to the journal after every sample
+# (holder, sample number, uids of the runs, timing, alignment), so that after
+# a crash or a beam dump que.resume() picks up at the first sample that is not
+# done. The journal is append-only JSON lines: one write + fsync per sample,
+# whatever the length of the queue, and a record torn by a crash is ignored.
+#
+#   que.runHolders()             journals to que.journal.path(run_id), one file per run
+#   que.resume()                 continue the last run where it stopped
+#   que.resume(run_id)           continue an older unfinished run
+#   que.journal.progress()       what is done / left in the last run
+
+import json
+import os
+import uuid
+
+
+class QueueJournal:
+
+    def __init__(self, directory=None):
+        self._directory = directory  # None: data/queue_journal/ next to the startup files
+
+    @property
+    def directory(self):
+        return _QUEUE_JOURNAL_DIR if self._directory is None else self._directory
+
+    def path(self, run_id):
+        # One file per run: a run goes on in the same file whatever happens to RE.md meanwhile
+        return os.path.join(self.directory, "queue_journal_{}.jsonl".format(run_id))
+
+    def write(self, record):
+        record = dict(record, time=time.time())
+        line = json.dumps(record, default=str) + "\n"
+        path = self.path(record["run_id"])
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # A single O_APPEND write per record: records never interleave, and a crash can only tear the last one
+        fd = os.open(path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            size = os.fstat(fd).st_size
+            if size and os.pread(fd, 1, size - 1) != b"\n":
+                line = "\n" + line  # after a torn record: start on a line of our own
+            os.write(fd, line.encode())
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        return record
+
+    def _paths(self):
+        if not os.path.isdir(self.directory):
+            return []
+        return [os.path.join(self.directory, name) for name in os.listdir(self.directory)
+                if name.startswith("queue_journal_") and name.endswith(".jsonl")]
+
+    def records(self, run_id=None):
+        """Records of one run, or of every run."""
+        for path in ([self.path(run_id)] if run_id is not None else self._paths()):
+            if not os.path.exists(path):
+                continue
+            with open(path) as fin:
+                for line in fin:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        # Record torn by a crash mid-write
+                        continue
+
+    def run(self, run_id):
+        """
+        {'begin': record, 'done': {(slot, sample_number)}, 'samples': [record, ...],
+        'finished': bool} of a run (None if its begin record is not in the journal).
+        """
+        run = None
+        for record in self.records(run_id):
+            if record["event"] == "begin":
+                run = {"begin": record, "done": set(), "samples": [], "finished": False}
+            elif run is None:
+                continue
+            elif record["event"] == "sample":
+                run["samples"].append(record)
+                if record["status"] == "done":
+                    run["done"].add((record["slot"], record["sample_number"]))
+            elif record["event"] == "end":
+                run["finished"] = True
+        return run
+
+    def runs(self):
+        """Every run in the journal (see run()), oldest first."""
+        runs = [self.run(os.path.basename(path)[len("queue_journal_"):-len(".jsonl")]) for path in self._paths()]
+        return sorted((run for run in runs if run is not None), key=lambda run: run["begin"]["time"])
+
+    def last_run(self):
+        """The last run started (see run()); None if there is none."""
+        runs = self.runs()
+        return runs[-1] if runs else None
+
+    def unfinished_runs(self):
+        return [run for run in self.runs() if not run["finished"]]
+
+    def progress(self, run_id=None, verbosity=3):
+        """(done, left) units of a run (default: the last one)."""
+        run = self.last_run() if run_id is None else self.run(run_id)
+        if run is None:
+            if verbosity >= 3:
+                print("No run {}in {}".format("" if run_id is None else run_id + " ", self.directory))
+            return [], []
+        done, left = [], []
+        for seq, slot, holder_name, sample_numbers in run["begin"]["plan"]:
+            for sample_number in [None] if sample_numbers is None else sample_numbers:
+                (done if (slot, sample_number) in run["done"] else left).append((slot, holder_name, sample_number))
+        if verbosity >= 3:
+            print("Run {} ({}): {} done, {} left{}".format(
+                run["begin"]["run_id"], run["begin"]["mode"], len(done), len(left),
+                "" if not left else "; next: holder {} (slot {}), sample {}".format(left[0][1], left[0][0], left[0][2])))
+        return done, left
+
+
+_QUEUE_JOURNAL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "queue_journal")
+
+
 class Queue(CoordinateSystem):
     """
     Holds the current state of the sample queue, allowing samples settings
@@ -1285,6 +1599,7 @@ class Queue(CoordinateSystem):
         )
         self.status = None  # status of the current robot, including 'onStage', 'onRobot', 'inGarage'
         self._sequence = {}  # the current holder on the stage
+        self.journal = QueueJournal()  # checkpoints of runSequence/runHolders, for resume()
 
         self.reset_clock()
 
@@ -1655,10 +1970,11 @@ class Queue(CoordinateSystem):
             if error_signal == True:
                 input(" Please ctrl+c and correct the errors.")
 
-    def returnHolder(self, holder="current", gotoSafe=True, force=False):
+    def returnHolder(self, holder="current", gotoSafe=True, force=False, pipelined=False):
         """return the holder from stage back to garage.
         holder = None:  retrun to default position
         holder = [2 ,3]:  return to specific garage position
+        pipelined: see SampleExchangeRobot.returnHolder
         """
         if type(holder) == list or type(holder) == int:
             holder = self.getHolder(holder)
@@ -1671,10 +1987,10 @@ class Queue(CoordinateSystem):
 
         if self.status == "onStage":
             if holder == "current":
-                robot.returnHolder(self._current.slot_pos, gotoSafe=gotoSafe)
+                robot.returnHolder(self._current.slot_pos, gotoSafe=gotoSafe, pipelined=pipelined)
             else:
                 if self._current == holder:
-                    robot.returnHolder(holder.slot_pos, gotoSafe=gotoSafe)
+                    robot.returnHolder(holder.slot_pos, gotoSafe=gotoSafe, pipelined=pipelined)
                 else:
                     # TODO:
                     for hol in sorted(self._holders.items()):
@@ -1692,14 +2008,15 @@ class Queue(CoordinateSystem):
         else:
             print("There is no holder on the stage")
 
-    def pickupHolder(self, holder, force=False, gotoSafe=True, slack=False):
-        """pick up the holder from garage to stage."""
+    def pickupHolder(self, holder, force=False, gotoSafe=True, slack=False, pipelined=False):
+        """pick up the holder from garage to stage.
+        pipelined: see SampleExchangeRobot.pickupHolder"""
         # holder = self.getHolder(slot, verbosity=0)
         # checkt the status
         self.checkStatus()
 
         if self.status == "inGarage" and self._current == None:
-            robot.pickupHolder(holder.slot_pos, gotoSafe=gotoSafe)
+            robot.pickupHolder(holder.slot_pos, gotoSafe=gotoSafe, pipelined=pipelined)
             self._current = holder
             self.status = "onStage"
             post_to_slack(
@@ -1720,8 +2037,8 @@ class Queue(CoordinateSystem):
                 return self._current
             if force == True:
                 print("Remove the current holder from the stage")
-                self.returnHolder()
-                robot.pickupHolder(holder.slot_pos, gotoSafe=gotoSafe)
+                self.returnHolder(pipelined=pipelined)
+                robot.pickupHolder(holder.slot_pos, gotoSafe=gotoSafe, pipelined=pipelined)
                 self._current = holder
                 self.status = "onStage"
                 post_to_slack(
@@ -1766,10 +2083,12 @@ class Queue(CoordinateSystem):
             for seq, holder in sorted(self._sequence.items()):
                 print("Sequence NO. {} ======>  {} at Garage {}".format(seq, holder.name, holder.slot_number))
 
-    def runSequence(self, startSample=None, endSample=None, gotoSafeForce=True, currentSample=False):
+    def runSequence(self, startSample=None, endSample=None, gotoSafeForce=True, currentSample=False, pipelined=False):
         """run the sequence of the holders in garage. It allows to start from a given sample.
         startSample: [holder, sample], like [[2, 3], 2]
         endSample: [holder, sample], like [[2, 3], 2]
+        pipelined: overlap the robot moves that allow it with the measurements (see RobotSafetyModel)
+        Every sample done is recorded in self.journal; see resume().
         """
         self.setSequence()
         # The startSample and endSample have to be a standard list with 2 items, like [holder, sample]
@@ -1813,52 +2132,32 @@ class Queue(CoordinateSystem):
             if startSample[1] > endSample[1]:
                 return print("The start sample is listed after the last one in the holder. Please double-check")
 
-        # start the sequence
+        # the samples to run, holder by holder
+        plan = []
         for seq, holder in sorted(self._sequence.items()):
-            # determine when the robot moves back to safe position. #TODO: test gotoSafe
-            if gotoSafeForce == True:
-                gotoSafe = True
-            elif holder.slot_number < endHolder.slot_number:
-                gotoSafe = False
-            else:
-                gotoSafe = True
-
-            if holder.sequence_number == startHolder.sequence_number:
-                # double-check self._current #TODO:pickupHolder
-                if self._current == None or self._current.slot_number != startHolder.slot_number:
-                    self.pickupHolder(holder, force=True, gotoSafe=gotoSafe)
-                # self._current.doSamples()
-                for sample_number, sample in sorted(self._current._samples.items()):
-                    if sample_number >= int(startSample[1]):
-                        print("working the the sample {} on holder {}".format(sample.name, holder.name))
-                        self._currentSample = [holder, sample_number]
-                        sample.do()  # run the sample
-                        # self._currentSample = []
-            elif (
-                holder.sequence_number > startHolder.sequence_number
-                and holder.sequence_number < endHolder.sequence_number
+            if (
+                holder.sequence_number < startHolder.sequence_number
+                or holder.sequence_number > endHolder.sequence_number
             ):
-                self.pickupHolder(holder, force=True, gotoSafe=gotoSafe)
-                # self._current.doSamples()
-                for sample_number, sample in sorted(self._current._samples.items()):
-                    print("working the the sample {} on holder {}".format(sample.name, holder.name))
-                    self._currentSample = [holder, sample_number]
-                    sample.do()  # run the sample
+                continue
+            sample_numbers = sorted(holder._samples)
+            if holder.sequence_number == startHolder.sequence_number:
+                sample_numbers = [n for n in sample_numbers if n >= int(startSample[1])]
             if holder.sequence_number == endHolder.sequence_number:
-                self.pickupHolder(holder, force=True, gotoSafe=gotoSafe)
-                for sample_number, sample in sorted(self._current._samples.items()):
-                    if int(sample_number) <= int(endSample[1]):
-                        print("working the the sample {} on holder {}".format(sample.name, holder.name))
-                        self._currentSample = [holder, sample_number]
-                        sample.do()  # run the sample
+                sample_numbers = [n for n in sample_numbers if int(n) <= int(endSample[1])]
+            plan.append((holder, sample_numbers))
+
+        return self._runPlan(plan, "sequence", {"gotoSafeForce": gotoSafeForce, "slack": False, "pipelined": pipelined})
 
     def runHolder(self, holder, slack=False):
         """run a single holder with multiple samples."""
         hol = self.pickupHolder(holder, force=True, slack=slack)
         hol.doSamples()
 
-    def runHolders(self, startHolder=None, endHolder=None, gotoSafeForce=False, slack=False):
-        """run a single holder with multiple samples."""
+    def runHolders(self, startHolder=None, endHolder=None, gotoSafeForce=False, slack=False, pipelined=False):
+        """run a single holder with multiple samples.
+        pipelined: overlap the robot moves that allow it with the measurements (see RobotSafetyModel)
+        Every sample done is recorded in self.journal; see resume()."""
         if startHolder == None:
             startHolder = min(self._sequence.items())[-1]
         elif (
@@ -1875,11 +2174,9 @@ class Queue(CoordinateSystem):
         else:
             endHolder = endHolder
 
-        if abs(gatex.position + 95) > 100:
-        #100 to 1
-            print("The gate is not OPEN. Please double-check the setting. ")
-            input()
+        self._checkGate()
 
+        plan = []
         for seq, holder in sorted(self._sequence.items()):
             # determine when the robot moves back to safe position. #TODO: test gotoSafe
             # if gotoSafeForce == False:
@@ -1893,10 +2190,202 @@ class Queue(CoordinateSystem):
                 holder.sequence_number >= startHolder.sequence_number
                 and holder.sequence_number <= endHolder.sequence_number
             ):
-                self.pickupHolder(holder, force=True, slack=slack)
                 # post_to_slack(text='holder <<<{}>>> is onStage for measurements'.format(que._current.name), slack=slack)
                 # self.pickupHolder(holder, force=True, gotoSafe=gotoSafe)
+                plan.append((holder, self._holderSampleNumbers(holder)))
+
+        return self._runPlan(plan, "holders", {"gotoSafeForce": True, "slack": slack, "pipelined": pipelined})
+
+    def _checkGate(self):
+        if abs(gatex.position + 95) > 100:
+        #100 to 1
+            print("The gate is not OPEN. Please double-check the setting. ")
+            input()
+
+    @staticmethod
+    def _holderSampleNumbers(holder):
+        """Sample numbers in the order holder.doSamples() does them, or None if the
+        holder has its own doSamples() (which is then run, and journaled, as a whole)."""
+        if type(holder).doSamples is not Holder.doSamples:
+            return None
+        numbers = {id(sample): number for number, sample in holder._samples.items()}
+        return [numbers[id(sample)] for sample in holder.getSamples(order=holder._order(None), verbosity=0)]
+
+    # Checkpointed execution
+    ########################################
+
+    def _runPlan(self, plan, mode, options, run_id=None, done=(), verbosity=3):
+        """Run [(holder, [sample_number, ...] or None for holder.doSamples()), ...],
+        journaling every sample; the (slot, sample_number) in done are skipped."""
+        if run_id is None:
+            run_id = str(uuid.uuid4())
+            self._journal({
+                "event": "begin", "run_id": run_id, "mode": mode, "options": options,
+                "data_session": RE.md.get("data_session"),
+                "plan": [[holder.sequence_number, holder.slot_number, holder.name, sample_numbers]
+                         for holder, sample_numbers in plan],
+            })
+        else:
+            self._journal({"event": "resume", "run_id": run_id, "done": len(done)})
+
+        done = set(done)
+        pipelined = options.get("pipelined", False)
+        todo = []
+        for holder, sample_numbers in plan:
+            units = [n for n in ([None] if sample_numbers is None else sample_numbers)
+                     if (holder.slot_number, n) not in done]
+            if units:
+                todo.append((holder, units))
+            elif verbosity >= 3:
+                print("Holder {} already done".format(holder.name))
+
+        endHolder = plan[-1][0] if plan else None
+        for ii, (holder, units) in enumerate(todo):
+            # determine when the robot moves back to safe position. #TODO: test gotoSafe
+            gotoSafe = options.get("gotoSafeForce", True) or holder.slot_number >= endHolder.slot_number
+            previous = self._current
+            start_time = time.time()
+            self.pickupHolder(holder, force=True, gotoSafe=gotoSafe, slack=options.get("slack", False),
+                              pipelined=pipelined)
+            if self._current is not holder:
+                print("ERROR: holder {} could not be loaded; stopping (que.resume() continues from here).".format(
+                    holder.name))
+                self._journal({"event": "stopped", "run_id": run_id, "slot": holder.slot_number})
+                return run_id
+            if previous is not holder:
+                self._journal({"event": "exchange", "run_id": run_id, "from": getattr(previous, "name", None),
+                               "to": holder.name, "slot": holder.slot_number, "pipelined": pipelined,
+                               "dead_time": time.time() - start_time})
+
+            for jj, sample_number in enumerate(units):
+                if pipelined and jj == len(units) - 1 and ii < len(todo) - 1:
+                    # Last sample before an exchange: the robot gets ready meanwhile
+                    robot.prestageApproach()
+                try:
+                    self._runSample(run_id, holder, sample_number)
+                except BaseException:
+                    # Never leave the pre-staging moves running after a failed sample
+                    try:
+                        robot.waitPrestage()
+                    except Exception as ex:
+                        print("ERROR: robot pre-staging failed too ({})".format(repr(ex)))
+                    raise
+
+        self._journal({"event": "end", "run_id": run_id})
+        return run_id
+
+    def _runSample(self, run_id, holder, sample_number):
+        record = {"event": "sample", "run_id": run_id, "holder": holder.name, "slot": holder.slot_number,
+                  "sequence_number": holder.sequence_number, "sample_number": sample_number, "uids": []}
+        token = RE.subscribe(lambda name, doc: record["uids"].append(doc["uid"]), "start")
+        start_time = time.time()
+        try:
+            if sample_number is None:
+                print("working the the samples of holder {}".format(holder.name))
+                self._currentSample = [holder, None]
                 holder.doSamples()
+            else:
+                sample = holder._samples[sample_number]
+                record["sample"] = sample.name
+                print("working the the sample {} on holder {}".format(sample.name, holder.name))
+                self._currentSample = [holder, sample_number]
+                sample.do()  # run the sample
+            record["status"] = "done"
+        except BaseException as ex:  # including a KeyboardInterrupt: the sample is not done
+            record["status"] = "failed"
+            record["error"] = repr(ex)
+            raise
+        finally:
+            RE.unsubscribe(token)
+            record["start_time"] = start_time
+            record["elapsed"] = time.time() - start_time
+            record["alignment"] = self._alignment(holder, sample_number)
+            self._journal(record)
+
+    @staticmethod
+    def _alignment(holder, sample_number):
+        def outcome(sample):
+            return {"aligned": getattr(sample, "alignDone", None), "origin": sample.save_state()["origin"]}
+
+        if sample_number is None:
+            return {str(number): outcome(sample) for number, sample in holder._samples.items()}
+        return outcome(holder._samples[sample_number])
+
+    def _journal(self, record):
+        try:
+            self.journal.write(record)
+        except OSError as ex:
+            # Never stop the measurements for the journal; but resume() will not know about this record
+            print("WARNING: could not write to the queue journal {} ({})".format(
+                self.journal.path(record["run_id"]), ex))
+
+    def exchangeReport(self, verbosity=3):
+        """Dead time of the holder exchanges in the journal (serial vs pipelined), per holder."""
+        times = {}  # holder name: {'serial': [s, ...], 'pipelined': [s, ...]}
+        for record in self.journal.records():
+            if record["event"] == "exchange":
+                mode = "pipelined" if record["pipelined"] else "serial"
+                times.setdefault(record["to"], {"serial": [], "pipelined": []})[mode].append(record["dead_time"])
+
+        def mean(values):
+            return np.mean(values) if values else np.nan
+
+        rows = []
+        for name, values in times.items():
+            rows.append({"holder": name, "serial": mean(values["serial"]), "pipelined": mean(values["pipelined"]),
+                         "count": len(values["serial"]) + len(values["pipelined"])})
+        if verbosity >= 3:
+            print("{:30s} {:>6s} {:>14s} {:>14s} {:>10s}".format(
+                "holder", "count", "serial (s)", "pipelined (s)", "saved (s)"))
+            for row in rows:
+                print("{holder:30s} {count:6d} {serial:14.1f} {pipelined:14.1f} {saved:10.1f}".format(
+                    saved=row["serial"] - row["pipelined"], **row))
+        return rows
+
+    def resume(self, run_id=None, verbosity=3):
+        """Continue the last run of runSequence/runHolders recorded in the journal
+        (or run_id; e.g. after a crash or a beam dump): the samples already done
+        are skipped, and it goes on from the first one that is not (a sample that
+        failed or was interrupted is measured again). The queue must be defined
+        as it was (same holders in the same slots)."""
+        run = self.journal.last_run() if run_id is None else self.journal.run(run_id)
+        if run is None:
+            print("Nothing to resume: no run {}in {}".format("" if run_id is None else run_id + " ",
+                                                           self.journal.directory))
+            return None
+        older = [other for other in self.journal.unfinished_runs()
+                 if other["begin"]["run_id"] != run["begin"]["run_id"]]
+        if older:
+            print("WARNING: {} other unfinished run(s) in the journal; que.resume(run_id) to continue one:".format(
+                len(older)))
+            for other in older:
+                print("  {} ({}, started {}, {} samples done)".format(
+                    other["begin"]["run_id"], other["begin"]["mode"],
+                    time.strftime("%Y-%m-%d %H:%M", time.localtime(other["begin"]["time"])), len(other["done"])))
+        if run["finished"]:
+            print("The run {} is finished; nothing to resume.".format(run["begin"]["run_id"]))
+            return None
+
+        self.setSequence()
+        plan = []
+        for seq, slot, holder_name, sample_numbers in run["begin"]["plan"]:
+            holder = self._holders.get(slot)
+            if holder is None or holder.name != holder_name:
+                print("ERROR: holder {} is not in slot {} anymore. Define the queue as it was, then resume.".format(
+                    holder_name, slot))
+                return None
+            missing = [n for n in sample_numbers or [] if n not in holder._samples]
+            if missing:
+                print("ERROR: samples {} are not on holder {} anymore.".format(missing, holder_name))
+                return None
+            plan.append((holder, sample_numbers))
+
+        if verbosity >= 3:
+            self.journal.progress(run["begin"]["run_id"])
+        if run["begin"]["mode"] == "holders":
+            self._checkGate()
+        return self._runPlan(plan, run["begin"]["mode"], run["begin"]["options"], run_id=run["begin"]["run_id"],
+                             done=run["done"], verbosity=verbosity)
 
     # This setting is for individual holder. Each sample could set its own setting when adding into holder
     def exposure_setting(
@@ -32,6 +32,7 @@ TODO:
 #tags_default = ['CFN Soft-Bio']
 
 import asyncio
+import contextlib
 from datetime import datetime
 import pickle
 import os
@@ -247,81 +248,47 @@ class Sample(SampleTSAXS):
         if interval is None:
             interval = np.max(self.exposure_time, exposure_time) +10
 
-        async_run(self._measure_tensile_archiver, 
-                  exposure_time = exposure_time,
-                  interval = interval,
-                  reset_clock = reset_clock,
-                  stepNo=stepNo,
-                  output_file=output_file, 
-                  *args, **kwargs)
-
-    async def _measure_tensile_archiver(self, 
-                                        exposure_time=None,
-                                        interval=None,
-                                        reset_clock=True,
-                                        stepNo=0, 
-                                        output_file=None, 
-                                        *args, **kwargs):
-        """
-        Orchestrate Linkam control/archiver and Bluesky measurement as async tasks.
-        Both tasks share an asyncio.Event for robust stopping.
-
-        If either the Linkam archiver or Bluesky measurement task fails or raises an exception,
-        the exception is caught, the Linkam heater is turned off, the Linkam stage is stopped, the stop event is sent
-        and any remaining tasks are awaited with exceptions suppressed.
-
-        Parameters
-        ----------
-        stepNo : int, optional
-            The step number for the Linkam archiver process (default: 0).
-        output_file : str or None, optional
-            Path to the output CSV file for archiver data. If None, a default filename is generated.
-        *args
-            Additional positional arguments passed to the Bluesky measurement function.
-        **kwargs
-            Additional keyword arguments passed to the Bluesky measurement function.
-        """
-
         if output_file is None:
             now = datetime.now().strftime("%Y%m%d-%H-%M-%S")
             output_file = RE.md["userpy_alias_directory"] + '/'+ self.name + '_linkam_archiver_' + now + '.csv'
 
-        stop_evt = asyncio.Event()
-
-        async def linkam_archiver_task():
-            await LTensile.run_and_archive(output_file=output_file, stepNo=stepNo, verbose=True, stop_event=stop_evt)
-            stop_evt.set()  # Signal to stop Bluesky when Linkam/archiver is done   
-
-        # Start Linkam/archiver and Bluesky measurement as async tasks
-        linkam_task = asyncio.create_task(linkam_archiver_task())
-        bluesky_task = asyncio.create_task(self.measureTimeSeries_async(
-            exposure_time=exposure_time,
-            interval=interval,
-            reset_clock=reset_clock,
-            stop_event=stop_evt,
-            linkam_task=linkam_task,
-            *args, **kwargs
-        ))
+        # Linkam steps + archiver run on the background event loop (async_loop),
+        # concurrently with the Bluesky measurements below in this thread.
+        # They share an asyncio.Event for robust stopping.
+        stop_evt = async_loop.create_event()
+        linkam_task = async_loop.submit(
+            LTensile.run_and_archive(output_file=output_file, stepNo=stepNo, verbose=True, stop_event=stop_evt),
+            name='LTensile.run_and_archive')
 
         try:
-            await asyncio.gather(linkam_task, bluesky_task)
+            self.measureTimeSeries_concurrent(exposure_time=exposure_time,
+                                              interval=interval,
+                                              reset_clock=reset_clock,
+                                              stop_event=stop_evt,
+                                              linkam_task=linkam_task,
+                                              *args, **kwargs)
         except KeyboardInterrupt:
             print("\n[LINKAM] Interrupted by user! Turning off heater and saving archiver data...")
             LTensile.off()
             LTensile.stop()
-            stop_evt.set()
-            await asyncio.gather(linkam_task, bluesky_task, return_exceptions=True)
-
-    async def measureTimeSeries_async(self, 
-                                      maxTime=60*60*24, 
-                                      exposure_time=None, 
-                                      interval=None, 
-                                      reset_clock=True, 
-                                      stop_event=None, 
-                                      linkam_task=None, 
-                                      *args, **kwargs):
+            raise
+        finally:
+            # Stop the Linkam steps (if still running) and wait for the archiver data to be saved
+            async_loop.set_event(stop_evt)
+            with contextlib.suppress(Exception):
+                linkam_task.result()
+
+    def measureTimeSeries_concurrent(self, 
+                                     maxTime=60*60*24, 
+                                     exposure_time=None, 
+                                     interval=None, 
+                                     reset_clock=True, 
+                                     stop_event=None, 
+                                     linkam_task=None, 
+                                     *args, **kwargs):
         """
-        Asynchronously performs a time series measurement using a detector, with periodic intervals and optional external stop conditions.
+        Performs a time series measurement using a detector, with periodic intervals and optional external stop conditions,
+        while the Linkam/archiver task runs on the background event loop.
 
         Parameters
         ----------
@@ -335,8 +302,8 @@ class Sample(SampleTSAXS):
             If True, resets the internal clock before starting the measurement (default: True).
         stop_event : threading.Event or asyncio.Event, optional
             External event to signal stopping the measurement early.
-        linkam_task : asyncio.Task, optional
-            Async task representing Linkam/archiver process; measurement stops when this task is done.
+        linkam_task : concurrent.futures.Future, optional
+            Future of the Linkam/archiver task (see async_loop.submit); measurement stops when this task is done.
         *args, **kwargs
             Additional arguments passed to the `measure` method.
 
@@ -344,7 +311,7 @@ class Sample(SampleTSAXS):
         -----
         - The method triggers the detector at regular intervals using the specified exposure time.
         - Periodically checks for external stop requests and completion of the Linkam/archiver task.
-        - Uses asynchronous sleep to maintain compatibility with async event loops.
+        - Sleeps in short steps so that stop requests are handled promptly.
         - Prints status messages at each measurement and when stopping conditions are met.
         """
         if reset_clock:
@@ -388,11 +355,10 @@ class Sample(SampleTSAXS):
 
             t1 += interval
             sleep_time = t1 - time.time()
-            # Use asyncio.sleep for async compatibility
             while sleep_time > 0:
                 # Check every 0.2s for stop or Linkam/archiver completion
                 check_time = min(0.2, sleep_time)
-                await asyncio.sleep(check_time)
+                time.sleep(check_time)
                 sleep_time -= check_time
                 if stop_event and stop_event.is_set():
                     print("[Bluesky] External stop requested during sleep.")